@@ -7,11 +7,32 @@ Provides:
 - triage_config: paths, model settings
 - triage_schema: data schemas (policy chunks, triage result)
 - embedding_provider: MiniLM/Azure embedding wrapper
+- embedding_cache: content-addressed on-disk embedding cache for index builds
+- embedding_batcher: micro-batching of concurrent embed_query calls
+- query_cache: LRU (optionally persisted) cache of query embeddings
 - policy_ingestion: load + chunk policy documents
-- policy_index: build & save/load vectorized knowledge base
-- policy_retriever: embedding-based retrieval
+- policy_index: build & save/load vectorized knowledge base (mmap or npz format)
+- policy_manifest: per-file manifest driving incremental index rebuilds
+- policy_retriever: embedding-based retrieval (hot-reloads new index versions)
+- retrieval_kernel: normalized dot-product scoring + argpartition top-k
+- policy_filters: precomputed row ranges for metadata-filtered search
+- lexical_index: BM25 inverted index (CSR postings) for hybrid search
+- result_cache: LRU cache of search results, invalidated per index version
+- reranker: optional latency-budgeted cross-encoder second stage
+- ann_index: optional IVF approximate nearest-neighbour index (NumPy)
 - triage_prompt: build grounded prompt from templates
-- triage_llm: call LLM to get structured JSON triage result
-- triage_service: one-stop triage_incident() API
+- policy_digest: offline extractive digests (rules, severity criteria) per chunk
+- token_budget: token counting + packing chunks into the prompt budget
+- llm_client: shared, pooled AzureOpenAI clients (sync + per-event-loop async)
+- llm_resilience: per-attempt deadlines, jittered retries, hedging, circuit breaker
+- llm_stub_server: local OpenAI-compatible stand-in for offline load/latency tests
+- triage_llm: call LLM to get structured JSON triage result (optionally streamed)
+- streaming_json: incremental parser emitting top-level JSON fields as they complete
+- triage_service: one-stop triage_incident() API (+ triage_incident_async)
+- semantic_cache: reuse recent triage results for near-duplicate incidents
+- bulk_triage: triage a JSONL/CSV backlog with checkpoint/resume
+- triage_metrics: per-stage timing spans, histograms, Prometheus/JSONL export
 - audit_log: JSONL audit log (long-term memory)
+- audit_writer: background group-commit JSONL writer with rotation + gzip
+- benchmark: end-to-end benchmark on synthetic policy corpora (JSON report)
 """
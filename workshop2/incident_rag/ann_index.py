@@ -0,0 +1,131 @@
+# workshop2/incident_rag/ann_index.py
+
+from __future__ import annotations
+
+import os
+from pathlib import Path
+from typing import Tuple
+
+import numpy as np
+
+from .retrieval_kernel import normalize_rows as _normalize_rows, top_k_rows
+
+IVF_INDEX_NAME = "policy_ivf.npz"
+
+
+class IVFIndex:
+    """
+    Inverted-file (IVF) approximate nearest-neighbour index in NumPy.
+
+    Build: spherical k-means splits the (normalized) embeddings into
+    nlist clusters; each row is stored in the list of its closest centroid
+    (CSR layout: list_offsets + list_rows).
+
+    Search: score the query against the centroids, open the nprobe best
+    lists and compute exact cosine similarity only for their rows.
+    More probes = higher recall, more latency.
+    """
+
+    def __init__(
+        self,
+        centroids: np.ndarray,
+        list_offsets: np.ndarray,
+        list_rows: np.ndarray,
+    ) -> None:
+        self.centroids = centroids          # (nlist, D), L2-normalized
+        self.list_offsets = list_offsets    # (nlist + 1,), rows of list i are
+        self.list_rows = list_rows          # list_rows[offsets[i]:offsets[i+1]]
+
+    @property
+    def nlist(self) -> int:
+        return int(self.centroids.shape[0])
+
+    @classmethod
+    def build(
+        cls,
+        embeddings: np.ndarray,
+        nlist: int = 0,
+        n_iter: int = 10,
+        seed: int = 0,
+        batch_size: int = 65_536,
+    ) -> "IVFIndex":
+        n = embeddings.shape[0]
+        if nlist <= 0:
+            nlist = int(np.sqrt(n))  # common rule of thumb
+        nlist = max(1, min(nlist, n))
+        rng = np.random.default_rng(seed)
+
+        # Train centroids on a sample (~64 points per list is plenty)
+        sample_size = min(n, nlist * 64)
+        sample_rows = np.sort(rng.choice(n, size=sample_size, replace=False))
+        sample = _normalize_rows(embeddings[sample_rows])
+        centroids = sample[rng.choice(sample_size, size=nlist, replace=False)].copy()
+
+        for _ in range(n_iter):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            counts = np.bincount(assign, minlength=nlist)
+            empty = counts == 0
+            if empty.any():
+                # Re-seed empty clusters with random sample points
+                sums[empty] = sample[rng.choice(sample_size, size=int(empty.sum()))]
+            centroids = _normalize_rows(sums)
+
+        # Assign every row, in batches to bound memory
+        assign = np.empty(n, dtype=np.int32)
+        for start in range(0, n, batch_size):
+            block = _normalize_rows(embeddings[start:start + batch_size])
+            assign[start:start + batch_size] = np.argmax(block @ centroids.T, axis=1)
+
+        list_rows = np.argsort(assign, kind="stable").astype(np.int64)
+        list_offsets = np.zeros(nlist + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assign, minlength=nlist), out=list_offsets[1:])
+        return cls(centroids.astype(np.float32), list_offsets, list_rows)
+
+    def candidate_rows(self, q_vec: np.ndarray, nprobe: int) -> np.ndarray:
+        """Row ids stored in the nprobe lists closest to the query."""
+        nprobe = max(1, min(nprobe, self.nlist))
+        centroid_scores = self.centroids @ q_vec
+        if nprobe < self.nlist:
+            probe = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        else:
+            probe = np.arange(self.nlist)
+        return np.concatenate(
+            [self.list_rows[self.list_offsets[i]:self.list_offsets[i + 1]] for i in probe]
+        )
+
+    def search(
+        self,
+        embeddings: np.ndarray,
+        q_vec: np.ndarray,
+        top_k: int,
+        nprobe: int,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return (row indices, cosine scores) of the top_k hits, best first.
+        embeddings must be L2-normalized (as stored by policy_index).
+        """
+        q = _normalize_rows(q_vec.reshape(-1))
+        rows = np.sort(self.candidate_rows(q, nprobe))  # sorted = friendlier memory access
+        if rows.size == 0:
+            return rows, np.zeros(0, dtype=np.float32)
+
+        scores = embeddings[rows] @ q
+        best = top_k_rows(scores, top_k)
+        return rows[best], scores[best]
+
+    def save(self, path: Path) -> None:
+        tmp_path = path.with_name(f"{path.stem}.tmp.npz")
+        np.savez(
+            tmp_path,
+            centroids=self.centroids,
+            list_offsets=self.list_offsets,
+            list_rows=self.list_rows,
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "IVFIndex":
+        with np.load(path) as npz:
+            return cls(npz["centroids"], npz["list_offsets"], npz["list_rows"])
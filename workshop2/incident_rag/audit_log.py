@@ -2,25 +2,66 @@
 
 from __future__ import annotations
 
+import asyncio
 import json
+import threading
 from datetime import datetime
 from typing import Any, Dict, List
 
-from .triage_config import LOGS_DIR
+from .audit_writer import get_jsonl_writer
+from .triage_config import AUDIT_BUFFERED, LOGS_DIR
 from .triage_schema import PolicyChunkSchema
 
 LOG_PATH = LOGS_DIR / "triage_log.jsonl"
 
+# Keeps lines whole when several threads append at once (unbuffered mode)
+_write_lock = threading.Lock()
+
 
 def append_triage_record(
     incident_text: str,
     policy_chunks: List[PolicyChunkSchema],
     llm_result: Dict[str, Any],
+    retrieval: Dict[str, Any] | None = None,
+    semantic_cache: Dict[str, Any] | None = None,
+    trace_id: str | None = None,
+    timings_ms: Dict[str, float] | None = None,
+    retrieved_ids: List[str] | None = None,
 ) -> None:
     """
     Append one triage record to triage_log.jsonl.
     This is our long-term memory / audit log.
+    With AUDIT_BUFFERED the line is only queued; the background writer
+    appends it within AUDIT_FLUSH_INTERVAL_SECONDS (flush_jsonl_writers()
+    waits for it).
+    retrieval: optional retrieval details (e.g. reranker timing).
+    semantic_cache: set when the result was reused from the semantic cache.
+    trace_id / timings_ms: the request's trace (see triage_metrics) and
+    its per-stage durations, to join the audit log with exported spans.
+    retrieved_ids: ids of all retrieved chunks, before the prompt budget
+    dropped any (policy_chunks holds only those sent to the LLM); the
+    semantic cache is keyed on them.
     """
+    line = _record_line(
+        incident_text, policy_chunks, llm_result,
+        retrieval, semantic_cache, trace_id, timings_ms, retrieved_ids,
+    )
+    if AUDIT_BUFFERED:
+        get_jsonl_writer(LOG_PATH).write(line)
+    else:
+        _append_line(line)
+
+
+def _record_line(
+    incident_text: str,
+    policy_chunks: List[PolicyChunkSchema],
+    llm_result: Dict[str, Any],
+    retrieval: Dict[str, Any] | None = None,
+    semantic_cache: Dict[str, Any] | None = None,
+    trace_id: str | None = None,
+    timings_ms: Dict[str, float] | None = None,
+    retrieved_ids: List[str] | None = None,
+) -> str:
     record = {
         "timestamp": datetime.utcnow().isoformat() + "Z",
         "incident_text": incident_text,
@@ -35,7 +76,42 @@ def append_triage_record(
         "triage_data": llm_result.get("data"),
         "usage": llm_result.get("usage"),
     }
+    if retrieval is not None:
+        record["retrieval"] = retrieval
+    if semantic_cache is not None:
+        record["semantic_cache"] = semantic_cache
+    if trace_id is not None:
+        record["trace_id"] = trace_id
+    if timings_ms is not None:
+        record["timings_ms"] = timings_ms
+    if retrieved_ids is not None:
+        record["retrieved_ids"] = retrieved_ids
+
+    return json.dumps(record) + "\n"
+
 
+def _append_line(line: str) -> None:
     LOGS_DIR.mkdir(parents=True, exist_ok=True)
-    with LOG_PATH.open("a", encoding="utf-8") as f:
-        f.write(json.dumps(record) + "\n")
+    with _write_lock:
+        with LOG_PATH.open("a", encoding="utf-8") as f:
+            f.write(line)
+
+
+async def append_triage_record_async(
+    incident_text: str,
+    policy_chunks: List[PolicyChunkSchema],
+    llm_result: Dict[str, Any],
+    **kwargs: Any,
+) -> None:
+    """
+    append_triage_record without blocking the event loop: file I/O, or a
+    put on a full AUDIT_QUEUE_MAX queue (the writer is behind or the disk
+    is failing), waits in a worker thread.
+    """
+    line = _record_line(incident_text, policy_chunks, llm_result, **kwargs)
+    if AUDIT_BUFFERED:
+        writer = get_jsonl_writer(LOG_PATH)
+        if not writer.try_write(line):
+            await asyncio.to_thread(writer.write, line)
+        return
+    await asyncio.to_thread(_append_line, line)
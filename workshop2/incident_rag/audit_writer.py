@@ -0,0 +1,286 @@
+# workshop2/incident_rag/audit_writer.py
+
+from __future__ import annotations
+
+import atexit
+import gzip
+import os
+import queue
+import shutil
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List
+
+from .triage_config import (
+    AUDIT_FLUSH_INTERVAL_SECONDS,
+    AUDIT_MAX_BATCH,
+    AUDIT_QUEUE_MAX,
+    AUDIT_FSYNC,
+    AUDIT_FSYNC_INTERVAL_SECONDS,
+    AUDIT_ROTATE_MAX_BYTES,
+    AUDIT_ROTATE_DAILY,
+    AUDIT_COMPRESS_ROTATED,
+)
+
+_STOP = object()
+_ERROR_REPORT_SECONDS = 30.0  # while writes keep failing, repeat the error at most this often
+
+
+def _utc_day(ts: float | None = None) -> str:
+    return datetime.fromtimestamp(ts if ts is not None else time.time(), timezone.utc).strftime("%Y-%m-%d")
+
+
+class BufferedJsonlWriter:
+    """
+    Group-commit appender for one JSONL file.
+
+    write(line) only puts the line on a queue; a background thread takes
+    everything that queued up (up to max_batch lines, waiting at most
+    flush_interval for the first one), appends it with one write() call
+    and fsyncs according to fsync:
+      "batch"    - after every batch (a crash loses at most the queue),
+      "interval" - at most every fsync_interval seconds,
+      "never"    - leave it to the OS.
+    Before a batch, the file is rotated if it reached rotate_max_bytes or
+    the UTC day changed: it is renamed to <stem>-<timestamp>.jsonl and
+    gzipped to .jsonl.gz (compress=True). Producers block only if the
+    writer falls max_queue lines behind. If a write fails, the same batch
+    is retried and nothing new is taken from the queue until it succeeds,
+    so a failing disk backs up into the queue and blocks producers instead
+    of growing memory. close() drains the queue; after close, a batch that
+    still fails is dropped.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        flush_interval: float = AUDIT_FLUSH_INTERVAL_SECONDS,
+        max_batch: int = AUDIT_MAX_BATCH,
+        max_queue: int = AUDIT_QUEUE_MAX,
+        fsync: str = AUDIT_FSYNC,
+        fsync_interval: float = AUDIT_FSYNC_INTERVAL_SECONDS,
+        rotate_max_bytes: int = AUDIT_ROTATE_MAX_BYTES,
+        rotate_daily: bool = AUDIT_ROTATE_DAILY,
+        compress: bool = AUDIT_COMPRESS_ROTATED,
+    ) -> None:
+        if fsync not in ("batch", "interval", "never"):
+            raise ValueError(f"Unknown fsync policy: {fsync!r}")
+        self.path = Path(path)
+        self.flush_interval = flush_interval
+        self.max_batch = max(1, max_batch)
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.rotate_max_bytes = rotate_max_bytes
+        self.rotate_daily = rotate_daily
+        self.compress = compress
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max(0, max_queue))
+        self._file = None
+        self._day: str | None = None
+        self._last_fsync = 0.0
+        self._closed = False
+        self._wake = threading.Event()  # cuts the retry backoff short on close()
+        self._failures = 0  # consecutive failed writes
+        self._last_error_report = 0.0
+        self._stats = {"lines": 0, "batches": 0, "fsyncs": 0, "rotations": 0, "errors": 0}
+        self._thread = threading.Thread(
+            target=self._run, name=f"jsonl-writer-{self.path.name}", daemon=True
+        )
+        self._thread.start()
+
+    def write(self, line: str) -> None:
+        """Queue one line (must end with a newline)."""
+        if self._closed:
+            raise RuntimeError(f"Writer for {self.path} is closed")
+        self._queue.put(line)
+
+    def try_write(self, line: str) -> bool:
+        """Queue one line without blocking; False if the queue is full."""
+        if self._closed:
+            raise RuntimeError(f"Writer for {self.path} is closed")
+        try:
+            self._queue.put_nowait(line)
+        except queue.Full:
+            return False
+        return True
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """
+        Block until every queued line is written (and fsynced per policy).
+        Returns False if timeout ran out first (e.g. the disk keeps failing).
+        """
+        q = self._queue
+        with q.all_tasks_done:
+            return q.all_tasks_done.wait_for(lambda: not q.unfinished_tasks, timeout)
+
+    def close(self) -> None:
+        """Write everything still queued, fsync and stop the thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def stats(self) -> Dict[str, int]:
+        return {**self._stats, "queued": self._queue.qsize()}
+
+    # --- writer thread ---
+
+    def _run(self) -> None:
+        pending: List[str] = []  # taken from the queue, not yet written
+        stop = False
+        while pending or not stop:
+            if not pending:
+                # New lines are taken only once the previous batch is on disk
+                pending, stop = self._next_batch()
+                if not pending:
+                    continue
+            try:
+                self._write_batch(pending)
+            except OSError as exc:
+                self._close_file()
+                self._report_error(exc, len(pending))
+                if not self._closed:
+                    self._wake.wait(min(1.0, self.flush_interval * 5))
+                    continue
+                print(f"Audit writer: dropped {len(pending)} lines for {self.path} at shutdown")
+            else:
+                if self._failures:
+                    print(f"Audit writer: writing {self.path} recovered after {self._failures} failed attempts")
+                    self._failures = 0
+            for _ in pending:
+                self._queue.task_done()
+            pending = []
+        try:
+            self._close_file(sync=True)
+        finally:
+            self._queue.task_done()  # the _STOP marker
+
+    def _report_error(self, exc: OSError, lines: int) -> None:
+        self._stats["errors"] += 1
+        self._failures += 1
+        now = time.monotonic()
+        if self._failures == 1 or now - self._last_error_report >= _ERROR_REPORT_SECONDS:
+            self._last_error_report = now
+            print(
+                f"Audit writer: writing {self.path} failed ({exc}); holding {lines} lines, "
+                f"{self._queue.qsize()} queued, {self._failures} failed attempts so far, will retry"
+            )
+
+    def _next_batch(self) -> tuple:
+        batch: List[str] = []
+        try:
+            item = self._queue.get(timeout=self.flush_interval)
+        except queue.Empty:
+            return batch, False
+        while True:
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+            if len(batch) >= self.max_batch:
+                return batch, False
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return batch, False
+
+    def _open(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        existing = self.path.exists() and self.path.stat().st_size > 0
+        self._day = _utc_day(self.path.stat().st_mtime) if existing else _utc_day()
+        self._file = self.path.open("a", encoding="utf-8")
+
+    def _close_file(self, sync: bool = False) -> None:
+        f, self._file = self._file, None
+        if f is None:
+            return
+        try:
+            f.flush()
+            if sync and self.fsync != "never":
+                os.fsync(f.fileno())
+        finally:
+            f.close()
+
+    def _write_batch(self, lines: List[str]) -> None:
+        if self._file is None:
+            self._open()
+        if self._should_rotate():
+            self._rotate()
+            self._open()
+        self._file.write("".join(lines))
+        self._file.flush()
+        now = time.monotonic()
+        if self.fsync == "batch" or (
+            self.fsync == "interval" and now - self._last_fsync >= self.fsync_interval
+        ):
+            os.fsync(self._file.fileno())
+            self._last_fsync = now
+            self._stats["fsyncs"] += 1
+        self._stats["lines"] += len(lines)
+        self._stats["batches"] += 1
+
+    def _should_rotate(self) -> bool:
+        size = self._file.tell()
+        if size == 0:
+            return False
+        if self.rotate_max_bytes > 0 and size >= self.rotate_max_bytes:
+            return True
+        return self.rotate_daily and self._day != _utc_day()
+
+    def _rotate(self) -> None:
+        self._close_file(sync=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        segment = self.path.with_name(f"{self.path.stem}-{stamp}{self.path.suffix}")
+        n = 1
+        while segment.exists() or segment.with_name(segment.name + ".gz").exists():
+            segment = self.path.with_name(f"{self.path.stem}-{stamp}-{n:03d}{self.path.suffix}")
+            n += 1
+        os.replace(self.path, segment)
+        self._stats["rotations"] += 1
+        if self.compress:
+            gz_path = segment.with_name(segment.name + ".gz")
+            tmp_path = gz_path.with_name(gz_path.name + ".tmp")
+            with segment.open("rb") as src, gzip.open(tmp_path, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.replace(tmp_path, gz_path)
+            segment.unlink()
+
+
+_writers: Dict[Path, BufferedJsonlWriter] = {}
+_writers_lock = threading.Lock()
+
+
+def get_jsonl_writer(path: Path) -> BufferedJsonlWriter:
+    """Process-wide writer per file (created on first use)."""
+    key = Path(path).resolve()
+    with _writers_lock:
+        writer = _writers.get(key)
+        if writer is None:
+            writer = _writers[key] = BufferedJsonlWriter(key)
+    return writer
+
+
+def flush_jsonl_writers(timeout: float | None = None) -> bool:
+    """Wait until every queued line of every writer is on disk (False on timeout)."""
+    with _writers_lock:
+        writers = list(_writers.values())
+    deadline = None if timeout is None else time.monotonic() + timeout
+    flushed = True
+    for writer in writers:
+        remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+        flushed = writer.flush(remaining) and flushed
+    return flushed
+
+
+def close_jsonl_writers() -> None:
+    """Drain and close all writers (registered with atexit)."""
+    with _writers_lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for writer in writers:
+        writer.close()
+
+
+atexit.register(close_jsonl_writers)
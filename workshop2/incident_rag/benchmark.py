@@ -0,0 +1,391 @@
+# workshop2/incident_rag/benchmark.py
+#
+# End-to-end benchmark on synthetic policy corpora:
+#
+#   python -m workshop2.incident_rag.benchmark --sizes 100 1000 10000 --out bench.json
+#   python -m workshop2.incident_rag.benchmark --sizes 100000 1000000 --embedder hash --out big.json
+#   python -m workshop2.incident_rag.benchmark --compare before.json after.json
+#
+# Each corpus size runs in a fresh subprocess (own index + log dirs, own
+# peak RSS). Stages timed: corpus ingestion, embedding, index save, index
+# load, embed_query, search_policies, prompt building, (stub) LLM call,
+# audit logging and triage_incident end-to-end. The LLM is always a stub:
+# "inline" answers in-process via llm_stub_server.build_reply, "server"
+# goes through the real client to a local llm_stub_server.
+# --embedder hash replaces MiniLM with deterministic random vectors, so
+# the large sizes measure the rest of the pipeline in minutes, not hours.
+# The on-disk embedding cache is off by default: a synthetic corpus is
+# always a cold miss, so the embed stage would mostly time writing (and
+# evicting) one .npy file per chunk. --embedding-cache includes that cost;
+# it never applies to --embedder hash, whose vectors must not be cached
+# under the real model's name.
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+BENCHMARK_SIZES = (100, 1_000, 10_000)
+BENCHMARK_QUERIES = 200
+BENCHMARK_CHUNKS_PER_FILE = 1_000
+HASH_EMBEDDING_DIM = 384
+
+# Vocabulary for the synthetic corpus, in the style of data/policies/*.txt
+_AREAS = ["Incident", "Alerting", "Access", "Backup", "Change", "Network", "Database",
+          "Security", "Audit", "Payments", "Identity", "Storage", "Monitoring", "Release"]
+_SYSTEMS = ["payment gateway", "customer portal", "VPN", "email service", "core database",
+            "build pipeline", "identity provider", "object storage", "message queue",
+            "reporting API", "mobile app backend", "DNS", "load balancer", "HR system"]
+_SYMPTOMS = ["is down", "returns errors", "is slow", "times out intermittently",
+             "shows degraded performance", "is unavailable for all users",
+             "rejects logins", "reports disk full", "leaks data", "fails health checks"]
+_RULES = [
+    "The triage service must assign severity {sev} when the {system} {symptom}.",
+    "Teams should notify the on-call engineer within {n} minutes for {sev} incidents.",
+    "Escalate to the crisis list if more than {n} users are affected.",
+    "Do not send email alerts for {sev} tickets unless the {system} is customer facing.",
+    "Log every {sev} decision in the audit log with the policy reference.",
+    "Review {system} incidents within {n} hours and record the outcome.",
+]
+_BULLETS = [
+    "Record the ticket_id, severity and timestamp.",
+    "Page the {system} on-call rotation.",
+    "Attach the last {n} minutes of logs.",
+    "Notify the service owner and the incident manager.",
+    "Open a bridge call for {sev} incidents.",
+    "Update the status page within {n} minutes.",
+]
+_SEVERITIES = ["NORMAL", "ALERT", "CRISIS"]
+
+
+def _fill(template: str, rng: random.Random) -> str:
+    return template.format(
+        sev=rng.choice(_SEVERITIES),
+        system=rng.choice(_SYSTEMS),
+        symptom=rng.choice(_SYMPTOMS),
+        n=rng.choice([5, 10, 15, 30, 60, 100, 500]),
+    )
+
+
+def _policy_blocks(rng: random.Random, n_blocks: int, title: str) -> List[str]:
+    """n_blocks paragraph blocks (= chunks after splitting on blank lines)."""
+    blocks = [f"{title}\nVersion: {rng.randint(1, 5)}.0\nOwner: IT Service Management"]
+    section = 0
+    while len(blocks) < n_blocks:
+        kind = rng.random()
+        if kind < 0.2:
+            section += 1
+            blocks.append(f"Section {section}: {rng.choice(_AREAS)} {rng.choice(['Rules', 'Escalation', 'Logging', 'Scope'])}")
+        elif kind < 0.6:
+            blocks.append(" ".join(_fill(rng.choice(_RULES), rng) for _ in range(rng.randint(1, 3))))
+        else:
+            lines = [f"- For severity {rng.choice(_SEVERITIES)}:"]
+            lines += ["  - " + _fill(rng.choice(_BULLETS), rng) for _ in range(rng.randint(2, 4))]
+            blocks.append("\n".join(lines))
+    return blocks[:n_blocks]
+
+
+def generate_policy_corpus(
+    out_dir: Path,
+    n_chunks: int,
+    seed: int = 0,
+    chunks_per_file: int = BENCHMARK_CHUNKS_PER_FILE,
+) -> int:
+    """Write policy .txt files that chunk into exactly n_chunks chunks. Returns the file count."""
+    rng = random.Random(seed)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    n_files = 0
+    remaining = n_chunks
+    while remaining > 0:
+        n = min(chunks_per_file, remaining)
+        area = rng.choice(_AREAS)
+        title = f"{area} Policy {n_files + 1}"
+        path = out_dir / f"{area}_Policy_{n_files + 1:05d}.txt"
+        path.write_text("\n\n".join(_policy_blocks(rng, n, title)) + "\n", encoding="utf-8")
+        n_files += 1
+        remaining -= n
+    return n_files
+
+
+def generate_incidents(n: int, seed: int = 1) -> List[str]:
+    rng = random.Random(seed)
+    return [
+        f"{rng.choice(_SYSTEMS).capitalize()} {rng.choice(_SYMPTOMS)} since "
+        f"{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}; about {rng.choice([3, 40, 800, 12000])} "
+        f"users affected (ticket {rng.randrange(10**6):06d})."
+        for _ in range(n)
+    ]
+
+
+class HashEmbedder:
+    """Stand-in for SentenceTransformer: deterministic unit vectors per text."""
+
+    def __init__(self, dim: int = HASH_EMBEDDING_DIM) -> None:
+        self.dim = dim
+
+    def encode(self, texts: List[str], convert_to_numpy: bool = True, **kwargs: Any) -> np.ndarray:
+        out = np.empty((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+            out[i] = np.random.default_rng(seed).standard_normal(self.dim, dtype=np.float32)
+        return out / np.linalg.norm(out, axis=1, keepdims=True)
+
+
+def summarize(samples_s: List[float], items: int | None = None) -> Dict[str, Any]:
+    """Latency percentiles (ms) and throughput for one stage."""
+    arr = np.asarray(samples_s, dtype=np.float64) * 1000
+    total_s = float(arr.sum()) / 1000
+    n_items = items if items is not None else len(arr)
+    return {
+        "count": len(arr),
+        "total_s": round(total_s, 4),
+        "throughput_per_s": round(n_items / total_s, 2) if total_s > 0 else None,
+        "p50_ms": round(float(np.percentile(arr, 50)), 3),
+        "p90_ms": round(float(np.percentile(arr, 90)), 3),
+        "p99_ms": round(float(np.percentile(arr, 99)), 3),
+        "max_ms": round(float(arr.max()), 3),
+    }
+
+
+def peak_rss_mb() -> float | None:
+    try:
+        import resource
+    except ImportError:  # Windows
+        try:
+            import psutil
+        except ImportError:
+            return None
+        info = psutil.Process().memory_info()
+        return round(getattr(info, "peak_wset", info.rss) / 2**20, 1)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (2**20 if sys.platform == "darwin" else 2**10), 1)
+
+
+def _timed(fn: Callable[[], Any]) -> tuple:
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def run_single(n_chunks: int, work_dir: Path, args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Benchmark one corpus size in this process. TRIAGE_INDEX_DIR and
+    TRIAGE_LOGS_DIR must already point into work_dir (set by the parent).
+    """
+    from . import embedding_provider, policy_retriever, triage_service
+    from .audit_log import append_triage_record
+    from .embedding_provider import embed_query, embed_texts
+    from .llm_stub_server import build_reply, start_stub_server
+    from .policy_index import build_policy_chunks, save_policy_index
+    from .triage_config import INDEX_DIR
+    from .triage_prompt import build_triage_messages
+
+    if args.embedder == "hash":
+        embedding_provider._embedding_model = HashEmbedder()
+
+    stub_server = None
+    if args.llm == "server":
+        stub_server = start_stub_server(port=int(os.environ["TRIAGE_LLM_STUB_URL"].rsplit(":", 1)[1]))
+    else:
+        def call_stub_llm(messages: List[Dict[str, Any]], *a: Any, **kw: Any) -> Dict[str, Any]:
+            content, _ = build_reply({"messages": messages})
+            return {"data": json.loads(content), "usage": {"prompt_tokens": None}}
+        triage_service.call_triage_llm = call_stub_llm
+
+    stages: Dict[str, Dict[str, Any]] = {}
+    policies_dir = work_dir / "policies"
+
+    n_files, t = _timed(lambda: generate_policy_corpus(policies_dir, n_chunks, seed=args.seed))
+    stages["corpus_generation"] = summarize([t], n_chunks)
+
+    chunks, t = _timed(lambda: build_policy_chunks(policies_dir))
+    stages["ingest"] = summarize([t], len(chunks))
+
+    texts = [c.text for c in chunks]
+    use_cache = args.embedding_cache and args.embedder != "hash"
+    embeddings, t = _timed(lambda: embed_texts(texts, use_cache=use_cache))
+    stages["embed"] = summarize([t], len(texts))
+
+    version, t = _timed(lambda: save_policy_index(chunks, embeddings, index_dir=INDEX_DIR))
+    stages["index_save"] = summarize([t], len(chunks))
+    index_bytes = sum(p.stat().st_size for p in (INDEX_DIR / "versions" / version).rglob("*") if p.is_file())
+    del chunks, embeddings, texts
+
+    _, t = _timed(policy_retriever.get_policy_index)
+    stages["index_load"] = summarize([t], n_chunks)
+
+    queries = generate_incidents(args.queries, seed=args.seed + 1)
+    embed_s, search_s, prompt_s, llm_s, audit_s = [], [], [], [], []
+    for q in queries:
+        _, t = _timed(lambda: embed_query(q))
+        embed_s.append(t)
+        # query embedding is cached now: this is retrieval only
+        results, t = _timed(lambda: policy_retriever.search_policies(q, top_k=3))
+        search_s.append(t)
+        found = [c for c, _ in results]
+        messages, t = _timed(lambda: build_triage_messages(q, found))
+        prompt_s.append(t)
+        llm_result, t = _timed(lambda: triage_service.call_triage_llm(messages))
+        llm_s.append(t)
+        _, t = _timed(lambda: append_triage_record(q, found, llm_result))
+        audit_s.append(t)
+    stages["embed_query"] = summarize(embed_s)
+    stages["search_policies"] = summarize(search_s)
+    stages["prompt_build"] = summarize(prompt_s)
+    stages["llm_stub"] = summarize(llm_s)
+    stages["audit_log"] = summarize(audit_s)
+
+    # Fresh incidents: nothing cached, the full request path
+    triage_s = []
+    for q in generate_incidents(args.queries, seed=args.seed + 2):
+        _, t = _timed(lambda: triage_service.triage_incident(q))
+        triage_s.append(t)
+    stages["triage_incident"] = summarize(triage_s)
+
+    if stub_server is not None:
+        stub_server.shutdown()
+    return {
+        "chunks": n_chunks,
+        "files": n_files,
+        "index_bytes": index_bytes,
+        "stages": stages,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def _git_commit() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+            cwd=Path(__file__).resolve().parent, timeout=10,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    """Run every size in its own subprocess and collect the results."""
+    report: Dict[str, Any] = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "embedder": args.embedder,
+            "embedding_cache": args.embedding_cache and args.embedder != "hash",
+            "llm": args.llm,
+            "queries": args.queries,
+            "seed": args.seed,
+        },
+        "results": [],
+    }
+    for n in args.sizes:
+        with tempfile.TemporaryDirectory(prefix=f"rag-bench-{n}-") as tmp:
+            work_dir = Path(tmp)
+            result_file = work_dir / "result.json"
+            env = dict(os.environ)
+            env["TRIAGE_INDEX_DIR"] = str(work_dir / "index")
+            env["TRIAGE_LOGS_DIR"] = str(work_dir / "logs")
+            if args.llm == "server":
+                env["TRIAGE_LLM_BACKEND"] = "stub"
+                env["TRIAGE_LLM_STUB_URL"] = f"http://127.0.0.1:{args.stub_port}"
+            cmd = [
+                sys.executable, "-m", "workshop2.incident_rag.benchmark",
+                "--single", str(n), "--work-dir", str(work_dir), "--result-file", str(result_file),
+                "--embedder", args.embedder, "--llm", args.llm,
+                "--queries", str(args.queries), "--seed", str(args.seed),
+            ] + (["--embedding-cache"] if args.embedding_cache else [])
+            print(f"=== Benchmarking {n} chunks ===")
+            log_path = work_dir / "run.log"
+            with log_path.open("w", encoding="utf-8") as log:
+                proc = subprocess.run(cmd, env=env, stdout=log, stderr=subprocess.STDOUT)
+            if proc.returncode != 0:
+                print(log_path.read_text(encoding="utf-8")[-2000:])
+                report["results"].append({"chunks": n, "error": f"exit code {proc.returncode}"})
+                continue
+            result = json.loads(result_file.read_text(encoding="utf-8"))
+            report["results"].append(result)
+            print_result(result)
+    return report
+
+
+def print_result(result: Dict[str, Any]) -> None:
+    print(f"{result['chunks']} chunks, {result['files']} files, "
+          f"index {result['index_bytes'] / 2**20:.1f} MiB, peak RSS {result['peak_rss_mb']} MiB")
+    for name, s in result["stages"].items():
+        print(f"  {name:<18} p50 {s['p50_ms']:>10.3f} ms  p99 {s['p99_ms']:>10.3f} ms  "
+              f"{s['throughput_per_s'] or 0:>12.1f} /s")
+
+
+def compare_reports(old: Dict[str, Any], new: Dict[str, Any]) -> None:
+    """Print p50/p99 ratios (new / old) per size and stage."""
+    old_by_size = {r["chunks"]: r for r in old["results"] if "stages" in r}
+    print(f"old {old['meta'].get('git_commit')} -> new {new['meta'].get('git_commit')}")
+    for r in new["results"]:
+        base = old_by_size.get(r["chunks"])
+        if base is None or "stages" not in r:
+            continue
+        print(f"{r['chunks']} chunks (peak RSS {base['peak_rss_mb']} -> {r['peak_rss_mb']} MiB)")
+        for name, s in r["stages"].items():
+            b = base["stages"].get(name)
+            if not b or not b["p50_ms"] or not b["p99_ms"]:
+                continue
+            print(f"  {name:<18} p50 x{s['p50_ms'] / b['p50_ms']:.2f}  p99 x{s['p99_ms'] / b['p99_ms']:.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark indexing + triage on synthetic policy corpora.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(BENCHMARK_SIZES), help="corpus sizes in chunks")
+    parser.add_argument("--queries", type=int, default=BENCHMARK_QUERIES, help="incidents per timed stage")
+    parser.add_argument("--embedder", choices=["model", "hash"], default="model",
+                        help="model = MiniLM, hash = deterministic random vectors (fast)")
+    parser.add_argument("--llm", choices=["inline", "server"], default="inline",
+                        help="inline = in-process stub, server = real client -> local stub server")
+    parser.add_argument("--stub-port", type=int, default=8089)
+    parser.add_argument("--embedding-cache", action="store_true",
+                        help="embed through the on-disk cache (cold; ignored with --embedder hash)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", type=Path, default=None, help="write the JSON report here")
+    parser.add_argument("--compare", type=Path, nargs=2, metavar=("OLD", "NEW"), help="compare two reports")
+    # internal: one size in this process
+    parser.add_argument("--single", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--work-dir", type=Path, help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        old, new = (json.loads(p.read_text(encoding="utf-8")) for p in args.compare)
+        compare_reports(old, new)
+        return
+    if args.single is not None:
+        result = run_single(args.single, args.work_dir, args)
+        args.result_file.write_text(json.dumps(result), encoding="utf-8")
+        return
+
+    report = run_benchmark(args)
+    text = json.dumps(report, indent=2)
+    if args.out is not None:
+        args.out.write_text(text, encoding="utf-8")
+        print(f"Benchmark report written to {args.out}")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
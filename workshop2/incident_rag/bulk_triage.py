@@ -0,0 +1,215 @@
+# workshop2/incident_rag/bulk_triage.py
+#
+# Triage a whole backlog of incidents from a file:
+#
+#   python -m workshop2.incident_rag.bulk_triage incidents.jsonl results.jsonl --concurrency 16
+#
+# Input: .jsonl (one object per line), .csv (header row) or plain text
+# (one incident per line). The results file doubles as the checkpoint:
+# re-running the same command skips incidents that already succeeded and
+# retries the ones that failed.
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import csv
+import json
+import os
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Set, Tuple
+
+from .policy_retriever import search_policies_batch
+from .triage_service import triage_incident_async
+from .llm_client import aclose_async_llm_client
+from .triage_config import (
+    BULK_BATCH_SIZE,
+    BULK_CONCURRENCY,
+    RERANK_CANDIDATES,
+    RERANK_ENABLED,
+)
+
+# Tried in order when --text-field is not given
+TEXT_FIELDS = ("incident_text", "incident", "text", "description")
+ID_FIELDS = ("id", "incident_id", "ticket_id")
+
+
+def _pick(record: Dict[str, Any], fields: Tuple[str, ...]) -> Any:
+    for name in fields:
+        if record.get(name) not in (None, ""):
+            return record[name]
+    return None
+
+
+def iter_incidents(path: Path, text_field: str | None = None) -> Iterator[Tuple[str, str]]:
+    """
+    Stream (incident_id, incident_text) pairs without loading the whole file.
+    Lines that are not JSON objects, or have no incident text, are skipped
+    with a message so one bad line does not stop (or re-stop) a resumed run.
+    """
+    text_fields = (text_field,) if text_field else TEXT_FIELDS
+    with path.open("r", encoding="utf-8", newline="") as f:
+        if path.suffix.lower() == ".csv":
+            rows: Iterator[Tuple[int, Any]] = enumerate(csv.DictReader(f), start=2)
+        else:
+            rows = enumerate(f, start=1)
+
+        for line_no, row in rows:
+            if isinstance(row, str):
+                row = row.strip()
+                if not row:
+                    continue
+                if path.suffix.lower() in (".jsonl", ".json"):
+                    try:
+                        row = json.loads(row)
+                    except json.JSONDecodeError as exc:
+                        print(f"Skipping {path.name}:{line_no}: invalid JSON ({exc})")
+                        continue
+                    if not isinstance(row, dict):
+                        print(f"Skipping {path.name}:{line_no}: not a JSON object")
+                        continue
+                else:
+                    row = {"incident_text": row}
+            text = _pick(row, text_fields)
+            if text is None:
+                print(f"Skipping {path.name}:{line_no}: no incident text")
+                continue
+            incident_id = _pick(row, ID_FIELDS)
+            yield (str(incident_id) if incident_id is not None else f"line-{line_no}", str(text))
+
+
+def load_completed_ids(results_path: Path) -> Set[str]:
+    """Ids whose latest result line is a success (a torn last line is ignored)."""
+    done: Set[str] = set()
+    if not results_path.exists():
+        return done
+    with results_path.open("r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if rec.get("status") == "ok":
+                done.add(rec.get("id"))
+            else:
+                done.discard(rec.get("id"))
+    return done
+
+
+def _batched(items: Iterator[Tuple[str, str]], size: int) -> Iterator[List[Tuple[str, str]]]:
+    batch: List[Tuple[str, str]] = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def bulk_triage_async(
+    input_path: Path,
+    results_path: Path,
+    concurrency: int = BULK_CONCURRENCY,
+    batch_size: int = BULK_BATCH_SIZE,
+    text_field: str | None = None,
+    top_k: int = 3,
+    **triage_kwargs: Any,
+) -> Dict[str, int]:
+    """
+    Triage every incident in input_path, appending one JSON line per
+    incident to results_path as soon as it finishes.
+
+    Each batch is embedded + retrieved in one search_policies_batch call
+    (filling the query/result caches), then its LLM calls run with at most
+    `concurrency` in flight while the next batch is being prepared.
+    """
+    done = load_completed_ids(results_path)
+    if done:
+        print(f"Resuming: {len(done)} incidents already triaged in {results_path}")
+    stats = {"ok": 0, "error": 0, "skipped": 0}
+    concurrency = max(1, concurrency)
+    rerank = RERANK_ENABLED if triage_kwargs.get("rerank") is None else triage_kwargs["rerank"]
+    prefetch_k = max(top_k, RERANK_CANDIDATES) if rerank else top_k
+
+    results_path.parent.mkdir(parents=True, exist_ok=True)
+    if results_path.exists() and results_path.stat().st_size > 0:
+        with results_path.open("rb") as f:
+            f.seek(-1, os.SEEK_END)
+            torn = f.read(1) != b"\n"
+    else:
+        torn = False
+
+    with results_path.open("a", encoding="utf-8") as out:
+        if torn:
+            out.write("\n")  # previous run died mid-line
+
+        async def _run(incident_id: str, text: str) -> None:
+            try:
+                triage = await triage_incident_async(text, top_k=top_k, **triage_kwargs)
+                rec = {"id": incident_id, "status": "ok", "result": asdict(triage)}
+            except Exception as exc:  # one bad incident must not stop the run
+                rec = {"id": incident_id, "status": "error", "error": f"{type(exc).__name__}: {exc}"}
+            out.write(json.dumps(rec) + "\n")
+            out.flush()
+            stats[rec["status"]] += 1
+
+        pending: Set[asyncio.Task] = set()
+        for batch in _batched(iter_incidents(input_path, text_field), max(1, batch_size)):
+            todo = [(i, t) for i, t in batch if i not in done]
+            stats["skipped"] += len(batch) - len(todo)
+            if not todo:
+                continue
+
+            await asyncio.to_thread(search_policies_batch, [t for _, t in todo], prefetch_k)
+            for incident_id, text in todo:
+                while len(pending) >= concurrency:
+                    _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                pending.add(asyncio.create_task(_run(incident_id, text)))
+
+            os.fsync(out.fileno())  # checkpoint: finished results are on disk
+            print(f"Triaged {stats['ok']} ok / {stats['error']} failed "
+                  f"({stats['skipped']} skipped, {len(pending)} in flight)")
+
+        if pending:
+            await asyncio.wait(pending)
+        os.fsync(out.fileno())
+
+    print(f"Bulk triage finished: {stats}")
+    return stats
+
+
+def bulk_triage(input_path: Path, results_path: Path, **kwargs: Any) -> Dict[str, int]:
+    """Synchronous entry point for bulk_triage_async."""
+    async def _run() -> Dict[str, int]:
+        try:
+            return await bulk_triage_async(input_path, results_path, **kwargs)
+        finally:
+            await aclose_async_llm_client()
+
+    return asyncio.run(_run())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Bulk-triage incidents from a JSONL/CSV/text file.")
+    parser.add_argument("input", type=Path, help="incidents file (.jsonl, .csv or .txt)")
+    parser.add_argument("results", type=Path, help="results JSONL (also the resume checkpoint)")
+    parser.add_argument("--concurrency", type=int, default=BULK_CONCURRENCY, help="max LLM calls in flight")
+    parser.add_argument("--batch-size", type=int, default=BULK_BATCH_SIZE, help="incidents embedded/retrieved per batch")
+    parser.add_argument("--text-field", default=None, help="JSON/CSV field holding the incident text")
+    parser.add_argument("--top-k", type=int, default=3)
+    args = parser.parse_args()
+
+    bulk_triage(
+        args.input,
+        args.results,
+        concurrency=args.concurrency,
+        batch_size=args.batch_size,
+        text_field=args.text_field,
+        top_k=args.top_k,
+    )
+
+
+if __name__ == "__main__":
+    main()
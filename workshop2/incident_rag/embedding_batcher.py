@@ -0,0 +1,109 @@
+# workshop2/incident_rag/embedding_batcher.py
+
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+
+
+class QueryBatcher:
+    """
+    Coalesce concurrent single-query embedding calls into one batch.
+
+    Callers block in embed(text). A background thread takes the first
+    waiting query, keeps collecting more for up to window_ms (or until
+    max_batch_size queries), runs ONE encode call for the whole batch
+    and hands each caller its own row.
+
+    A lone caller is never delayed: the thread only waits for more
+    queries while other callers are known to be in flight.
+    """
+
+    def __init__(
+        self,
+        encode_fn: Callable[[List[str]], np.ndarray],
+        window_ms: float = 3.0,
+        max_batch_size: int = 32,
+    ) -> None:
+        self._encode_fn = encode_fn
+        self._window_s = window_ms / 1000.0
+        self._max_batch_size = max(1, max_batch_size)
+        self._queue: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._thread: threading.Thread | None = None
+        self.batches = 0
+        self.queries = 0
+
+    def _ensure_started(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="query-embedding-batcher", daemon=True
+                )
+                self._thread.start()
+
+    def embed(self, text: str) -> np.ndarray:
+        """Embed one query (shape (D,)); blocks until its batch is done."""
+        self._ensure_started()
+        future: Future = Future()
+        with self._lock:
+            self._in_flight += 1
+        try:
+            self._queue.put((text, future))
+            return future.result()
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def _collect_batch(self) -> List[Tuple[str, Future]]:
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self._window_s
+        while len(batch) < self._max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+            with self._lock:
+                others_waiting = self._in_flight > len(batch)
+            remaining = deadline - time.perf_counter()
+            if not others_waiting or remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect_batch()
+            unique_texts = list(dict.fromkeys(text for text, _ in batch))
+            try:
+                vecs = self._encode_fn(unique_texts)
+            except BaseException as exc:  # hand the error to every caller
+                for _, future in batch:
+                    future.set_exception(exc)
+                continue
+
+            rows = {text: vecs[i] for i, text in enumerate(unique_texts)}
+            for text, future in batch:
+                future.set_result(rows[text])
+
+            with self._lock:
+                self.batches += 1
+                self.queries += len(batch)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "queries": self.queries,
+                "avg_batch_size": (self.queries / self.batches) if self.batches else 0.0,
+            }
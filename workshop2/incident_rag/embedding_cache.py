@@ -0,0 +1,156 @@
+# workshop2/incident_rag/embedding_cache.py
+
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+# Keys are sha256 hex, so entries spread evenly over 256 shard folders
+_SHARDS = 256
+_MIN_SAMPLE_PER_SHARD = 100  # below max_entries = _SHARDS * this, always prune exactly
+
+
+def _model_slug(model_name: str) -> str:
+    """Turn a model name into a safe folder name."""
+    return model_name.replace("/", "--").replace("\\", "--")
+
+
+class EmbeddingCache:
+    """
+    Content-addressed on-disk cache of text embeddings.
+
+    Each vector is stored as one .npy file named after
+    sha256(model name + text), so a chunk is only embedded again when
+    its text (or the model) changes. When the cache grows beyond
+    max_entries, the least recently used files are deleted; the full
+    directory walk for that only runs when one shard suggests the cache
+    is close to full.
+    """
+
+    def __init__(self, cache_dir: Path, model_name: str, max_entries: int) -> None:
+        self.model_name = model_name
+        self.cache_dir = cache_dir / _model_slug(model_name)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def key(self, text: str) -> str:
+        payload = f"{self.model_name}\n{text}".encode("utf-8")
+        return hashlib.sha256(payload).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        # Shard by the first two hex chars to keep folders small
+        return self.cache_dir / key[:2] / f"{key}.npy"
+
+    def get(self, text: str) -> np.ndarray | None:
+        """Return the cached vector for text, or None on a miss."""
+        path = self._path(self.key(text))
+        try:
+            vec = np.load(path)
+        except (OSError, ValueError):
+            return None
+        try:
+            os.utime(path)  # mark as recently used (eviction order)
+        except OSError:
+            pass
+        return vec
+
+    def put(self, text: str, vec: np.ndarray) -> None:
+        """Store one vector (written to a temp file, then renamed)."""
+        path = self._path(self.key(text))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.stem}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with tmp_path.open("wb") as f:
+            np.save(f, np.asarray(vec, dtype=np.float32))
+        os.replace(tmp_path, path)
+
+    def embed(
+        self,
+        texts: List[str],
+        encode_fn: Callable[[List[str]], np.ndarray],
+    ) -> np.ndarray:
+        """
+        Embed texts, calling encode_fn only for texts not in the cache.
+        Returns a 2D array with one row per input text (same order).
+        """
+        if not texts:
+            return encode_fn(texts)
+
+        found: Dict[str, np.ndarray] = {}
+        missing: List[str] = []
+        for text in dict.fromkeys(texts):  # unique, order-preserving
+            vec = self.get(text)
+            if vec is None:
+                missing.append(text)
+            else:
+                found[text] = vec
+
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(missing)
+
+        if missing:
+            new_vecs = np.asarray(encode_fn(missing), dtype=np.float32)
+            for text, vec in zip(missing, new_vecs):
+                self.put(text, vec)
+                found[text] = vec
+            if self._may_be_full(self.key(missing[0])):
+                self.prune()
+
+        return np.stack([found[t] for t in texts]).astype(np.float32, copy=False)
+
+    def _may_be_full(self, key: str) -> bool:
+        """Estimate the size from key's shard folder (x 256) instead of walking them all."""
+        if self.max_entries < _SHARDS * _MIN_SAMPLE_PER_SHARD:
+            return True
+        try:
+            in_shard = sum(1 for e in os.scandir(self.cache_dir / key[:2]) if e.name.endswith(".npy"))
+        except OSError:
+            return True
+        return in_shard * _SHARDS >= 0.9 * self.max_entries  # margin for uneven shards
+
+    def prune(self) -> int:
+        """Evict least recently used entries beyond max_entries."""
+        if not self.cache_dir.exists():
+            return 0
+        entries = []
+        for shard in os.scandir(self.cache_dir):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(".npy"):
+                    entries.append((entry.stat().st_mtime, entry.path))
+
+        excess = len(entries) - self.max_entries
+        if excess <= 0:
+            return 0
+
+        entries.sort()
+        removed = 0
+        for _, path in entries[:excess]:
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+        with self._lock:
+            self.evictions += removed
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss/eviction counters since this process started."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            }
@@ -1,12 +1,33 @@
 # workshop2/incident_rag/embedding_provider.py
 
+import threading
 from typing import List
 import numpy as np
 from sentence_transformers import SentenceTransformer
 
-from .triage_config import EMBEDDING_MODEL_NAME, EMBEDDING_MODEL_DIR
+from .triage_config import (
+    EMBEDDING_MODEL_NAME,
+    EMBEDDING_MODEL_DIR,
+    EMBEDDING_CACHE_ENABLED,
+    EMBEDDING_CACHE_DIR,
+    EMBEDDING_CACHE_MAX_ENTRIES,
+    EMBEDDING_BATCHING_ENABLED,
+    EMBEDDING_BATCH_WINDOW_MS,
+    EMBEDDING_BATCH_MAX_SIZE,
+    QUERY_CACHE_ENABLED,
+    QUERY_CACHE_MAX_ENTRIES,
+    QUERY_CACHE_PATH,
+)
+from .embedding_cache import EmbeddingCache
+from .embedding_batcher import QueryBatcher
+from .query_cache import QueryEmbeddingCache, normalize_query
+from .triage_metrics import span
 
 _embedding_model: SentenceTransformer | None = None
+_embedding_cache: EmbeddingCache | None = None
+_query_batcher: QueryBatcher | None = None
+_query_cache: QueryEmbeddingCache | None = None
+_model_lock = threading.Lock()
 
 
 def get_embedding_model() -> SentenceTransformer:
@@ -15,24 +36,112 @@ def get_embedding_model() -> SentenceTransformer:
     Reuses the same model folder as workshop2/rag_demo/data/models/.
     """
     global _embedding_model
-    if _embedding_model is None:
-        print(f"Loading MiniLM embedding model from: {EMBEDDING_MODEL_DIR}")
-        EMBEDDING_MODEL_DIR.mkdir(parents=True, exist_ok=True)
-        _embedding_model = SentenceTransformer(
+    with _model_lock:
+        if _embedding_model is None:
+            print(f"Loading MiniLM embedding model from: {EMBEDDING_MODEL_DIR}")
+            EMBEDDING_MODEL_DIR.mkdir(parents=True, exist_ok=True)
+            _embedding_model = SentenceTransformer(
+                EMBEDDING_MODEL_NAME,
+                cache_folder=str(EMBEDDING_MODEL_DIR),
+            )
+    return _embedding_model
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Return the process-wide on-disk embedding cache."""
+    global _embedding_cache
+    if _embedding_cache is None:
+        _embedding_cache = EmbeddingCache(
+            EMBEDDING_CACHE_DIR,
             EMBEDDING_MODEL_NAME,
-            cache_folder=str(EMBEDDING_MODEL_DIR),
+            EMBEDDING_CACHE_MAX_ENTRIES,
         )
-    return _embedding_model
+    return _embedding_cache
+
+
+def get_query_batcher() -> QueryBatcher:
+    """Return the process-wide micro-batcher used by embed_query."""
+    global _query_batcher
+    with _model_lock:
+        if _query_batcher is None:
+            _query_batcher = QueryBatcher(
+                _encode,
+                window_ms=EMBEDDING_BATCH_WINDOW_MS,
+                max_batch_size=EMBEDDING_BATCH_MAX_SIZE,
+            )
+    return _query_batcher
 
 
-def embed_texts(texts: List[str]) -> np.ndarray:
-    """Embed a list of texts into a 2D numpy array: shape (N, D)."""
+def get_query_cache() -> QueryEmbeddingCache:
+    """Return the process-wide LRU cache of query embeddings."""
+    global _query_cache
+    with _model_lock:
+        if _query_cache is None:
+            _query_cache = QueryEmbeddingCache(
+                QUERY_CACHE_MAX_ENTRIES,
+                EMBEDDING_MODEL_NAME,
+                persist_path=QUERY_CACHE_PATH,
+            )
+    return _query_cache
+
+
+def _encode(texts: List[str]) -> np.ndarray:
     model = get_embedding_model()
     return model.encode(texts, convert_to_numpy=True)
 
 
+def embed_texts(texts: List[str], use_cache: bool = EMBEDDING_CACHE_ENABLED) -> np.ndarray:
+    """
+    Embed a list of texts into a 2D numpy array: shape (N, D).
+    With the cache on, only texts not embedded before hit the model.
+    """
+    if not use_cache:
+        return _encode(texts)
+    return get_embedding_cache().embed(texts, _encode)
+
+
 def embed_query(text: str) -> np.ndarray:
-    """Embed a single query text into a 1D numpy array: shape (D,)."""
-    model = get_embedding_model()
-    vec = model.encode([text], convert_to_numpy=True)
-    return vec[0]
+    """
+    Embed a single query text into a 1D numpy array: shape (D,).
+    Repeated queries are served from the query cache; concurrent
+    cache misses are coalesced into one batched encode call.
+    """
+    with span("embed_query"):
+        return _embed_query(text)
+
+
+def _embed_query(text: str) -> np.ndarray:
+    if QUERY_CACHE_ENABLED:
+        cached = get_query_cache().get(text)
+        if cached is not None:
+            return cached
+        text = normalize_query(text)
+
+    if EMBEDDING_BATCHING_ENABLED:
+        vec = get_query_batcher().embed(text)
+    else:
+        model = get_embedding_model()
+        vec = model.encode([text], convert_to_numpy=True)[0]
+
+    if QUERY_CACHE_ENABLED:
+        get_query_cache().put(text, vec)
+    return vec
+
+
+def embed_queries(texts: List[str]) -> np.ndarray:
+    """
+    Embed many queries at once into a 2D numpy array: shape (Q, D).
+    Cached queries are reused; all misses go through ONE encode call.
+    """
+    if not QUERY_CACHE_ENABLED:
+        return _encode(texts)
+
+    cache = get_query_cache()
+    rows: List[np.ndarray | None] = [cache.get(t) for t in texts]
+    missing = list(dict.fromkeys(normalize_query(t) for t, r in zip(texts, rows) if r is None))
+    if missing:
+        new_vecs = dict(zip(missing, _encode(missing)))
+        for text, vec in new_vecs.items():
+            cache.put(text, vec)
+        rows = [r if r is not None else new_vecs[normalize_query(t)] for t, r in zip(texts, rows)]
+    return np.stack(rows)
@@ -0,0 +1,176 @@
+# workshop2/incident_rag/lexical_index.py
+
+from __future__ import annotations
+
+import os
+import re
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from .triage_schema import PolicyChunkSchema
+
+BM25_INDEX_NAME = "policy_bm25.npz"
+
+# Keeps hostnames, error codes and versions together ("db-01.prod", "err_502", "v2.3"),
+# and also indexes their alphanumeric parts ("db", "01", "prod").
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[._\-:/][a-z0-9]+)*")
+_PART_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    tokens: List[str] = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        tokens.append(token)
+        parts = _PART_RE.findall(token)
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+
+class BM25Index:
+    """
+    Sparse inverted index for BM25 keyword scoring, built at index time.
+
+    Postings are stored in CSR layout: the rows containing term i are
+    post_rows[offsets[i]:offsets[i+1]], with their term frequencies in
+    post_tfs. A query only touches the postings of its own terms.
+    """
+
+    def __init__(
+        self,
+        terms: List[str],
+        offsets: np.ndarray,
+        post_rows: np.ndarray,
+        post_tfs: np.ndarray,
+        doc_lengths: np.ndarray,
+        k1: float = 1.2,
+        b: float = 0.75,
+    ) -> None:
+        self.term_ids: Dict[str, int] = {t: i for i, t in enumerate(terms)}
+        self.offsets = offsets          # (T + 1,)
+        self.post_rows = post_rows      # (P,) chunk row ids
+        self.post_tfs = post_tfs        # (P,) term frequency in that chunk
+        self.doc_lengths = doc_lengths  # (N,) tokens per chunk
+        self.k1 = k1
+        self.b = b
+        n = doc_lengths.shape[0]
+        avgdl = float(doc_lengths.mean()) if n else 1.0
+        df = np.diff(offsets).astype(np.float32)
+        self.idf = np.log1p((n - df + 0.5) / (df + 0.5)).astype(np.float32)
+        # Per-chunk length normalization, precomputed once
+        self.norm = (k1 * (1.0 - b + b * doc_lengths / max(avgdl, 1e-9))).astype(np.float32)
+
+    @classmethod
+    def from_chunks(cls, chunks: List[PolicyChunkSchema]) -> "BM25Index":
+        vocab: Dict[str, int] = {}
+        term_rows: List[int] = []
+        term_ids: List[int] = []
+        doc_lengths = np.zeros(len(chunks), dtype=np.float32)
+        for row, c in enumerate(chunks):
+            tokens = tokenize(f"{c.section_path}\n{c.text}")
+            doc_lengths[row] = len(tokens)
+            for token in tokens:
+                term_ids.append(vocab.setdefault(token, len(vocab)))
+                term_rows.append(row)
+
+        ids = np.asarray(term_ids, dtype=np.int64)
+        rows = np.asarray(term_rows, dtype=np.int64)
+        # Count (term, row) pairs; sorting by the combined key groups postings by term
+        keys, tfs = np.unique(ids * max(len(chunks), 1) + rows, return_counts=True)
+        post_terms = keys // max(len(chunks), 1)
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(post_terms, minlength=len(vocab)), out=offsets[1:])
+        return cls(
+            list(vocab),
+            offsets,
+            (keys % max(len(chunks), 1)).astype(np.int32),
+            tfs.astype(np.float32),
+            doc_lengths,
+        )
+
+    def search(
+        self,
+        query: str,
+        top_k: int,
+        allowed: slice | np.ndarray | None = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return (row indices, BM25 scores) of the top_k chunks, best first.
+        allowed (from PolicyRowIndex.select_rows) restricts the candidate rows.
+        """
+        ids = sorted({self.term_ids[t] for t in tokenize(query) if t in self.term_ids})
+        if not ids:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        rows = np.concatenate([self.post_rows[self.offsets[i]:self.offsets[i + 1]] for i in ids])
+        tfs = np.concatenate([self.post_tfs[self.offsets[i]:self.offsets[i + 1]] for i in ids])
+        idf = np.repeat(self.idf[ids], np.diff(self.offsets)[ids])
+        contrib = idf * tfs * (self.k1 + 1.0) / (tfs + self.norm[rows])
+
+        if allowed is not None and not (isinstance(allowed, slice) and allowed == slice(None)):
+            if isinstance(allowed, slice):
+                keep = (rows >= (allowed.start or 0)) & (rows < (allowed.stop or len(self.norm)))
+            else:
+                keep = np.isin(rows, allowed)
+            rows, contrib = rows[keep], contrib[keep]
+            if rows.size == 0:
+                return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        # Sum contributions per chunk over the touched postings only
+        uniq, inverse = np.unique(rows, return_inverse=True)
+        scores = np.bincount(inverse, weights=contrib).astype(np.float32)
+        k = min(top_k, uniq.size)
+        best = np.argpartition(-scores, k - 1)[:k] if k < uniq.size else np.arange(uniq.size)
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return uniq[best].astype(np.int64), scores[best]
+
+    def save(self, index_dir: Path) -> None:
+        path = index_dir / BM25_INDEX_NAME
+        tmp_path = path.with_name(f"{path.stem}.tmp.npz")
+        np.savez(
+            tmp_path,
+            terms=np.array(list(self.term_ids), dtype=str),
+            offsets=self.offsets,
+            post_rows=self.post_rows,
+            post_tfs=self.post_tfs,
+            doc_lengths=self.doc_lengths,
+            params=np.array([self.k1, self.b], dtype=np.float32),
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, index_dir: Path) -> "BM25Index | None":
+        path = index_dir / BM25_INDEX_NAME
+        if not path.exists():
+            return None
+        with np.load(path) as npz:
+            k1, b = (float(x) for x in npz["params"])
+            return cls(
+                npz["terms"].tolist(),
+                npz["offsets"],
+                npz["post_rows"],
+                npz["post_tfs"],
+                npz["doc_lengths"],
+                k1=k1,
+                b=b,
+            )
+
+
+def reciprocal_rank_fusion(
+    ranked_lists: List[np.ndarray],
+    k: int = 60,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Fuse several rankings of row ids: score(row) = sum 1 / (k + rank).
+    Returns (rows, fused scores), best first.
+    """
+    rows = np.concatenate(ranked_lists) if ranked_lists else np.zeros(0, dtype=np.int64)
+    if rows.size == 0:
+        return rows.astype(np.int64), np.zeros(0, dtype=np.float32)
+    ranks = np.concatenate([np.arange(len(r), dtype=np.float32) for r in ranked_lists])
+    uniq, inverse = np.unique(rows, return_inverse=True)
+    fused = np.bincount(inverse, weights=1.0 / (k + 1.0 + ranks)).astype(np.float32)
+    order = np.argsort(-fused, kind="stable")
+    return uniq[order].astype(np.int64), fused[order]
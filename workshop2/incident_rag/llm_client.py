@@ -0,0 +1,100 @@
+# workshop2/incident_rag/llm_client.py
+
+from __future__ import annotations
+
+import asyncio
+import atexit
+import threading
+import weakref
+
+import httpx
+from openai import AsyncAzureOpenAI, AzureOpenAI
+from common.bc_config import get_api_credentials
+
+from .triage_config import (
+    LLM_BACKEND,
+    LLM_STUB_URL,
+    LLM_STUB_API_VERSION,
+    LLM_POOL_MAX_CONNECTIONS,
+    LLM_POOL_MAX_KEEPALIVE,
+    LLM_KEEPALIVE_EXPIRY_SECONDS,
+    LLM_CONNECT_TIMEOUT_SECONDS,
+    LLM_TIMEOUT_SECONDS,
+)
+
+# One sync client per process (httpx.Client is thread-safe), and one async
+# client per event loop (an httpx.AsyncClient pool belongs to the loop that
+# opened its connections). Both keep TLS connections alive between calls.
+_sync_client: AzureOpenAI | None = None
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncAzureOpenAI]" = (
+    weakref.WeakKeyDictionary()
+)
+_client_lock = threading.Lock()
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=LLM_POOL_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_POOL_MAX_KEEPALIVE,
+        keepalive_expiry=LLM_KEEPALIVE_EXPIRY_SECONDS,
+    )
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(LLM_TIMEOUT_SECONDS, connect=LLM_CONNECT_TIMEOUT_SECONDS)
+
+
+def _credentials() -> dict:
+    if LLM_BACKEND == "stub":
+        return {"azure_endpoint": LLM_STUB_URL, "api_key": "stub", "api_version": LLM_STUB_API_VERSION}
+    return get_api_credentials()
+
+
+def get_llm_client() -> AzureOpenAI:
+    """Process-wide AzureOpenAI client with a shared keep-alive connection pool."""
+    global _sync_client
+    with _client_lock:
+        if _sync_client is None:
+            _sync_client = AzureOpenAI(
+                **_credentials(),
+                timeout=_timeout(),
+                max_retries=0,  # retries are done by llm_resilience
+                http_client=httpx.Client(limits=_limits(), timeout=_timeout()),
+            )
+    return _sync_client
+
+
+def get_async_llm_client() -> AsyncAzureOpenAI:
+    """AsyncAzureOpenAI client for the running event loop (created on first use)."""
+    loop = asyncio.get_running_loop()
+    with _client_lock:
+        client = _async_clients.get(loop)
+        if client is None:
+            client = AsyncAzureOpenAI(
+                **_credentials(),
+                timeout=_timeout(),
+                max_retries=0,
+                http_client=httpx.AsyncClient(limits=_limits(), timeout=_timeout()),
+            )
+            _async_clients[loop] = client
+    return client
+
+
+def close_llm_client() -> None:
+    """Close the shared sync client and its connections."""
+    global _sync_client
+    with _client_lock:
+        client, _sync_client = _sync_client, None
+    if client is not None:
+        client.close()
+
+
+async def aclose_async_llm_client() -> None:
+    """Close the running loop's async client (call before the loop shuts down)."""
+    with _client_lock:
+        client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.close()
+
+
+atexit.register(close_llm_client)
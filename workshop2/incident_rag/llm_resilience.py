@@ -0,0 +1,334 @@
+# workshop2/incident_rag/llm_resilience.py
+
+from __future__ import annotations
+
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Awaitable, Callable, Dict, Tuple, TypeVar
+
+from openai import APIConnectionError, APIStatusError, APITimeoutError
+
+from .triage_config import (
+    LLM_ATTEMPT_TIMEOUT_SECONDS,
+    LLM_MAX_RETRIES,
+    LLM_RETRY_BACKOFF_SECONDS,
+    LLM_RETRY_BACKOFF_MAX_SECONDS,
+    LLM_HEDGE_ENABLED,
+    LLM_HEDGE_QUANTILE,
+    LLM_HEDGE_DEFAULT_DELAY_SECONDS,
+    LLM_HEDGE_MIN_DELAY_SECONDS,
+    LLM_HEDGE_MIN_SAMPLES,
+    LLM_BREAKER_FAILURE_THRESHOLD,
+    LLM_BREAKER_RESET_SECONDS,
+)
+
+T = TypeVar("T")
+
+# HTTP statuses worth another attempt (timeouts, throttling, server errors)
+RETRYABLE_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised without calling the LLM while the circuit breaker is open."""
+
+
+def is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, (APITimeoutError, APIConnectionError, TimeoutError, ConnectionError)):
+        return True
+    if isinstance(exc, APIStatusError):
+        return exc.status_code in RETRYABLE_STATUSES
+    return False
+
+
+class CircuitBreaker:
+    """
+    closed -> open after failure_threshold consecutive failures;
+    open -> half_open after reset_seconds, letting one probe call through;
+    the probe's outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float) -> None:
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self) -> None:
+        with self._lock:
+            if self.state == "open":
+                wait_s = self.opened_at + self.reset_seconds - time.monotonic()
+                if wait_s > 0:
+                    raise CircuitOpenError(f"LLM circuit open (retry in {wait_s:.1f}s)")
+                self.state = "half_open"
+                self._probe_in_flight = False
+            if self.state == "half_open":
+                if self._probe_in_flight:
+                    raise CircuitOpenError("LLM circuit half-open (probe in flight)")
+                self._probe_in_flight = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def release(self) -> None:
+        """The call ended without a backend outcome; let the next probe through."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    print(f"LLM circuit breaker opened after {self.failures} failures")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+
+class LatencyTracker:
+    """Recent successful call latencies, for the hedging delay."""
+
+    def __init__(self, window: int = 200) -> None:
+        self._samples: deque = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def quantile(self, q: float, min_samples: int) -> float | None:
+        with self._lock:
+            if len(self._samples) < max(1, min_samples):
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class ResilientCaller:
+    """
+    Runs one LLM request with:
+    - a deadline per attempt (passed to the request as its timeout),
+    - up to max_retries jittered exponential-backoff retries on retryable errors,
+    - optional hedging: if the request is slower than the recent p95, send a
+      duplicate and take whichever answers first (costs extra tokens),
+    - a circuit breaker that fails fast while the backend keeps failing.
+
+    call()/call_async() return (result, stats); stats counts attempts,
+    retries, hedges and hedge_wins for the audit log.
+    """
+
+    def __init__(
+        self,
+        breaker: CircuitBreaker,
+        attempt_timeout: float = LLM_ATTEMPT_TIMEOUT_SECONDS,
+        max_retries: int = LLM_MAX_RETRIES,
+        backoff: float = LLM_RETRY_BACKOFF_SECONDS,
+        backoff_max: float = LLM_RETRY_BACKOFF_MAX_SECONDS,
+        hedge: bool = LLM_HEDGE_ENABLED,
+    ) -> None:
+        self.breaker = breaker
+        self.attempt_timeout = attempt_timeout
+        self.max_retries = max(0, max_retries)
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.hedge = hedge
+        self.latency = LatencyTracker()
+        self._executor: ThreadPoolExecutor | None = None
+        self._executor_lock = threading.Lock()
+
+    def hedge_delay(self) -> float:
+        p = self.latency.quantile(LLM_HEDGE_QUANTILE, LLM_HEDGE_MIN_SAMPLES)
+        if p is None:
+            return LLM_HEDGE_DEFAULT_DELAY_SECONDS
+        return max(LLM_HEDGE_MIN_DELAY_SECONDS, p)
+
+    def _backoff_seconds(self, retry: int) -> float:
+        # "Full jitter": spreads retries from many callers over the window
+        return random.uniform(0, min(self.backoff_max, self.backoff * 2 ** (retry - 1)))
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(thread_name_prefix="llm-hedge")
+        return self._executor
+
+    def call(
+        self,
+        request: Callable[[float], T],
+        hedge: bool | None = None,
+        retry_if: Callable[[BaseException], bool] | None = None,
+    ) -> Tuple[T, Dict[str, Any]]:
+        """request(timeout_seconds) performs one attempt."""
+        hedge = self.hedge if hedge is None else hedge
+        stats = {"attempts": 0, "retries": 0, "hedges": 0, "hedge_wins": 0}
+        for retry in range(self.max_retries + 1):
+            if retry:
+                stats["retries"] += 1
+                time.sleep(self._backoff_seconds(retry))
+            self.breaker.before_call()
+            try:
+                if hedge:
+                    result = self._hedged(request, stats)
+                else:
+                    stats["attempts"] += 1
+                    start = time.perf_counter()
+                    result = request(self.attempt_timeout)
+                    self.latency.add(time.perf_counter() - start)
+            except Exception as exc:
+                if not self._handle_failure(exc, retry, retry_if):
+                    raise
+                continue
+            self.breaker.record_success()
+            return result, stats
+        raise AssertionError("unreachable")
+
+    def _hedged(self, request: Callable[[float], T], stats: Dict[str, int]) -> T:
+        pool = self._get_executor()
+        starts: Dict[Future, float] = {}
+
+        def submit() -> None:
+            stats["attempts"] += 1
+            future = pool.submit(request, self.attempt_timeout)
+            starts[future] = time.perf_counter()
+
+        submit()
+        done, pending = wait(set(starts), timeout=self.hedge_delay())
+        if not done:
+            stats["hedges"] += 1
+            submit()
+            pending = set(starts)
+
+        deadline = max(starts.values()) + self.attempt_timeout
+        error: BaseException | None = None
+        while True:
+            for future in done:
+                if future.exception() is None:
+                    self.latency.add(time.perf_counter() - starts[future])
+                    if len(starts) > 1 and future is not next(iter(starts)):
+                        stats["hedge_wins"] += 1
+                    return future.result()
+                error = error or future.exception()
+            if not pending:
+                raise error  # every request failed
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                raise TimeoutError(f"LLM request exceeded {self.attempt_timeout}s")
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+
+    async def call_async(
+        self,
+        request: Callable[[float], Awaitable[T]],
+        hedge: bool | None = None,
+        retry_if: Callable[[BaseException], bool] | None = None,
+        bound_attempt: bool = True,
+    ) -> Tuple[T, Dict[str, Any]]:
+        """
+        Async version of call(); a losing hedge is cancelled.
+        Each attempt is cancelled after attempt_timeout unless bound_attempt
+        is False: then the request enforces its timeout itself (a stream
+        bounds only the wait for its first chunk, like the sync client).
+        """
+        hedge = self.hedge if hedge is None else hedge
+        stats = {"attempts": 0, "retries": 0, "hedges": 0, "hedge_wins": 0}
+        for retry in range(self.max_retries + 1):
+            if retry:
+                stats["retries"] += 1
+                await asyncio.sleep(self._backoff_seconds(retry))
+            self.breaker.before_call()
+            try:
+                if hedge:
+                    result = await self._hedged_async(request, stats, bound_attempt)
+                else:
+                    stats["attempts"] += 1
+                    start = time.perf_counter()
+                    result = await self._attempt_async(request, bound_attempt)
+                    self.latency.add(time.perf_counter() - start)
+            except Exception as exc:
+                if not self._handle_failure(exc, retry, retry_if):
+                    raise
+                continue
+            self.breaker.record_success()
+            return result, stats
+        raise AssertionError("unreachable")
+
+    def _attempt_async(self, request: Callable[[float], Awaitable[T]], bound: bool) -> Awaitable[T]:
+        attempt = request(self.attempt_timeout)
+        return asyncio.wait_for(attempt, self.attempt_timeout) if bound else attempt
+
+    async def _hedged_async(
+        self, request: Callable[[float], Awaitable[T]], stats: Dict[str, int], bound: bool = True
+    ) -> T:
+        starts: Dict[asyncio.Task, float] = {}
+
+        def submit() -> None:
+            stats["attempts"] += 1
+            task = asyncio.ensure_future(self._attempt_async(request, bound))
+            starts[task] = time.perf_counter()
+
+        submit()
+        try:
+            done, pending = await asyncio.wait(set(starts), timeout=self.hedge_delay())
+            if not done:
+                stats["hedges"] += 1
+                submit()
+                pending = set(starts)
+            error: BaseException | None = None
+            while True:
+                for task in done:
+                    if task.exception() is None:
+                        self.latency.add(time.perf_counter() - starts[task])
+                        if len(starts) > 1 and task is not next(iter(starts)):
+                            stats["hedge_wins"] += 1
+                        return task.result()
+                    error = error or task.exception()
+                if not pending:
+                    raise error
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in starts:
+                task.cancel()
+
+    def _handle_failure(
+        self,
+        exc: BaseException,
+        retry: int,
+        retry_if: Callable[[BaseException], bool] | None,
+    ) -> bool:
+        """Record the outcome; True if another attempt should be made."""
+        if isinstance(exc, asyncio.TimeoutError):
+            exc = TimeoutError(str(exc))
+        if not is_retryable(exc):
+            if isinstance(exc, APIStatusError):
+                self.breaker.record_success()  # the backend answered; the request was bad
+            else:
+                self.breaker.release()  # e.g. a caller callback failed; says nothing about the backend
+            return False
+        self.breaker.record_failure()
+        if retry_if is not None and not retry_if(exc):
+            return False
+        return retry < self.max_retries
+
+
+_llm_caller: ResilientCaller | None = None
+_llm_caller_lock = threading.Lock()
+
+
+def get_llm_caller() -> ResilientCaller:
+    """Process-wide caller, so breaker state and latency stats are shared."""
+    global _llm_caller
+    with _llm_caller_lock:
+        if _llm_caller is None:
+            _llm_caller = ResilientCaller(
+                CircuitBreaker(LLM_BREAKER_FAILURE_THRESHOLD, LLM_BREAKER_RESET_SECONDS)
+            )
+    return _llm_caller
@@ -0,0 +1,296 @@
+# workshop2/incident_rag/llm_stub_server.py
+#
+# Local stand-in for the Azure OpenAI chat-completions endpoint, for load
+# and latency tests without spending quota:
+#
+#   python -m workshop2.incident_rag.llm_stub_server --port 8089 --latency-ms 800 --error-rate 0.02
+#   TRIAGE_LLM_BACKEND=stub python -m workshop2.incident_rag.bulk_triage incidents.jsonl results.jsonl
+#
+# Answers are deterministic for a given prompt: schema-valid triage JSON
+# (severity from keywords in the incident), an escalate_crisis tool call
+# for CRISIS incidents when the request offers that tool, and
+# {"answer", "sources"} for the rag_demo librarian prompt. Latency
+# (log-normal), error rate and reported token usage are configurable.
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Tuple
+
+from .token_budget import count_tokens
+from .triage_config import (
+    LLM_STUB_HOST,
+    LLM_STUB_PORT,
+    LLM_STUB_LATENCY_MS,
+    LLM_STUB_LATENCY_SIGMA,
+    LLM_STUB_ERROR_RATE,
+)
+
+_CRISIS_RE = re.compile(
+    r"\b(outage|down|breach|ransomware|data loss|leak\w*|compromis\w*|all users|"
+    r"production|cannot (?:log ?in|access)|unavailable|security incident)\b",
+    re.IGNORECASE,
+)
+_ALERT_RE = re.compile(
+    r"\b(degraded|slow|error\w*|fail\w*|intermittent|timeout\w*|warning|"
+    r"high (?:cpu|memory|latency)|disk (?:full|space)|phishing)\b",
+    re.IGNORECASE,
+)
+_POLICY_HEADER_RE = re.compile(r"^\[([^\]/|]+?) / ([^\]|]+?)(?: \| ref: ([^\]]+))?\]$", re.MULTILINE)
+_PAGE_RE = re.compile(r"\(page (\d+)\)")
+
+_ACTIONS = {
+    "CRISIS": [
+        "Page the on-call incident commander",
+        "Open a major-incident bridge and notify stakeholders",
+        "Contain the impact (isolate affected systems)",
+    ],
+    "ALERT": [
+        "Notify the owning team's on-call engineer",
+        "Collect logs and metrics for the affected service",
+    ],
+    "NORMAL": ["Create a ticket in the team queue"],
+}
+_NEXT_STEPS = {
+    "CRISIS": ["Post-incident review within 48 hours", "Update the runbook"],
+    "ALERT": ["Monitor until metrics are back to baseline", "Review alert thresholds"],
+    "NORMAL": ["Handle within the normal SLA"],
+}
+_HOURS = {"CRISIS": 8.0, "ALERT": 4.0, "NORMAL": 1.0}
+
+
+@dataclass
+class StubSettings:
+    latency_ms: float = LLM_STUB_LATENCY_MS         # median response time
+    latency_sigma: float = LLM_STUB_LATENCY_SIGMA   # log-normal spread (0 = constant)
+    error_rate: float = LLM_STUB_ERROR_RATE         # fraction of 429/500/503 answers
+    completion_tokens: int = 0                      # report this many instead of counting (0 = count)
+    seed: int = 0
+
+
+def _incident_text(messages: List[Dict[str, Any]]) -> str:
+    user = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+    if "[INCIDENT_DESCRIPTION]" in user:
+        user = user.split("[INCIDENT_DESCRIPTION]", 1)[1].split("Your tasks:", 1)[0]
+    return user.strip()
+
+
+def classify_severity(incident_text: str) -> str:
+    if _CRISIS_RE.search(incident_text):
+        return "CRISIS"
+    if _ALERT_RE.search(incident_text):
+        return "ALERT"
+    return "NORMAL"
+
+
+def triage_answer(messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+    user = next((m.get("content") or "" for m in messages if m.get("role") == "user"), "")
+    incident = _incident_text(messages)
+    severity = classify_severity(incident)
+    refs = [ref or f"{doc.strip()}#{section.strip()}" for doc, section, ref in _POLICY_HEADER_RE.findall(user)]
+    summary = re.split(r"(?<=[.!?])\s", " ".join(incident.split()), maxsplit=1)[0][:240]
+    return {
+        "summary": summary or "No incident description provided.",
+        "severity": severity,
+        "actions_now": list(_ACTIONS[severity]),
+        "next_steps": list(_NEXT_STEPS[severity]),
+        "estimated_time_hours": _HOURS[severity],
+        "requires_policy_update": not refs,
+        "policy_refs": refs[:3],
+    }
+
+
+def librarian_answer(messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+    user = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+    pages = sorted({int(p) for p in _PAGE_RE.findall(user)})
+    return {"answer": "Stub answer based on the book snippets.", "sources": pages[:3]}
+
+
+def build_reply(body: Dict[str, Any]) -> Tuple[str | None, List[Dict[str, Any]] | None]:
+    """(content, tool_calls) for one chat-completions request."""
+    messages = body.get("messages") or []
+    system = next((m.get("content") or "" for m in messages if m.get("role") == "system"), "")
+    if "librarian" in system.lower():
+        return json.dumps(librarian_answer(messages)), None
+
+    answer = triage_answer(messages)
+    tool_names = {t.get("function", {}).get("name") for t in body.get("tools") or []}
+    already_called = any(m.get("role") == "tool" for m in messages)
+    if (
+        "escalate_crisis" in tool_names
+        and body.get("tool_choice") != "none"
+        and answer["severity"] == "CRISIS"
+        and not already_called
+    ):
+        call_id = "call_" + hashlib.sha1(json.dumps(messages).encode()).hexdigest()[:12]
+        arguments = {"summary": answer["summary"], "severity": "CRISIS", "actions": answer["actions_now"]}
+        return None, [{
+            "id": call_id,
+            "type": "function",
+            "function": {"name": "escalate_crisis", "arguments": json.dumps(arguments)},
+        }]
+    return json.dumps(answer), None
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real endpoint
+    settings: StubSettings
+    rng: random.Random
+    rng_lock: threading.Lock
+
+    def log_message(self, format: str, *args: Any) -> None:  # quiet under load
+        pass
+
+    def _draw(self) -> Tuple[float, float]:
+        with self.rng_lock:
+            noise = self.rng.gauss(0.0, 1.0)
+            roll = self.rng.random()
+        s = self.settings
+        latency = s.latency_ms / 1000 * math.exp(s.latency_sigma * noise)
+        return latency, roll
+
+    def _send_json(self, status: int, payload: Dict[str, Any], headers: Dict[str, str] | None = None) -> None:
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _chunk(self, data: str) -> None:
+        raw = data.encode("utf-8")
+        self.wfile.write(f"{len(raw):x}\r\n".encode() + raw + b"\r\n")
+        self.wfile.flush()
+
+    def do_POST(self) -> None:
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        if not self.path.split("?", 1)[0].endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"unknown path {self.path}", "code": "404"}})
+            return
+
+        latency, roll = self._draw()
+        if roll < self.settings.error_rate:
+            time.sleep(latency / 4)
+            status = (429, 500, 503)[int(roll / self.settings.error_rate * 3) % 3]
+            headers = {"Retry-After": "1"} if status == 429 else None
+            self._send_json(status, {"error": {"message": "stub: injected failure", "code": str(status)}}, headers)
+            return
+
+        content, tool_calls = build_reply(body)
+        prompt_tokens = sum(count_tokens(m.get("content") or "") for m in body.get("messages") or [])
+        completion_tokens = self.settings.completion_tokens or count_tokens(
+            content if content is not None else json.dumps(tool_calls)
+        )
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        base = {"id": "chatcmpl-stub", "created": int(time.time()), "model": body.get("model") or "stub"}
+        finish = "tool_calls" if tool_calls else "stop"
+
+        if not body.get("stream"):
+            time.sleep(latency)
+            message = {"role": "assistant", "content": content}
+            if tool_calls:
+                message["tool_calls"] = tool_calls
+            self._send_json(200, {
+                **base,
+                "object": "chat.completion",
+                "choices": [{"index": 0, "message": message, "finish_reason": finish}],
+                "usage": usage,
+            })
+            return
+
+        # Server-sent events: ~30% of the latency before the first token,
+        # the rest spread over the content
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        pieces = [content[i:i + 16] for i in range(0, len(content or ""), 16)] or [""]
+        time.sleep(latency * 0.3)
+        for i, piece in enumerate(pieces):
+            delta: Dict[str, Any] = {"content": piece}
+            if i == 0:
+                delta["role"] = "assistant"
+                if tool_calls:
+                    delta["tool_calls"] = [{"index": 0, **tool_calls[0]}]
+            chunk = {**base, "object": "chat.completion.chunk",
+                     "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+            self._chunk(f"data: {json.dumps(chunk)}\n\n")
+            time.sleep(latency * 0.7 / len(pieces))
+        last = {**base, "object": "chat.completion.chunk",
+                "choices": [{"index": 0, "delta": {}, "finish_reason": finish}]}
+        self._chunk(f"data: {json.dumps(last)}\n\n")
+        if (body.get("stream_options") or {}).get("include_usage"):
+            self._chunk(f"data: {json.dumps({**base, 'object': 'chat.completion.chunk', 'choices': [], 'usage': usage})}\n\n")
+        self._chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+
+def make_stub_server(
+    host: str = LLM_STUB_HOST,
+    port: int = LLM_STUB_PORT,
+    settings: StubSettings | None = None,
+) -> ThreadingHTTPServer:
+    """Build (not start) a server; port=0 picks a free port (server.server_port)."""
+    settings = settings or StubSettings()
+    handler = type("StubHandler", (_StubHandler,), {
+        "settings": settings,
+        "rng": random.Random(settings.seed),
+        "rng_lock": threading.Lock(),
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_stub_server(**kwargs: Any) -> ThreadingHTTPServer:
+    """Run a stub server in a background thread (for benchmarks); call .shutdown() when done."""
+    server = make_stub_server(**kwargs)
+    threading.Thread(target=server.serve_forever, name="llm-stub", daemon=True).start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible stand-in for the triage LLM.")
+    parser.add_argument("--host", default=LLM_STUB_HOST)
+    parser.add_argument("--port", type=int, default=LLM_STUB_PORT)
+    parser.add_argument("--latency-ms", type=float, default=LLM_STUB_LATENCY_MS, help="median latency")
+    parser.add_argument("--latency-sigma", type=float, default=LLM_STUB_LATENCY_SIGMA, help="log-normal sigma")
+    parser.add_argument("--error-rate", type=float, default=LLM_STUB_ERROR_RATE, help="fraction of 429/500/503")
+    parser.add_argument("--completion-tokens", type=int, default=0, help="fixed completion tokens (0 = count)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    settings = StubSettings(
+        latency_ms=args.latency_ms,
+        latency_sigma=args.latency_sigma,
+        error_rate=args.error_rate,
+        completion_tokens=args.completion_tokens,
+        seed=args.seed,
+    )
+    server = make_stub_server(args.host, args.port, settings)
+    print(f"LLM stub listening on http://{args.host}:{server.server_port} ({settings})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+# workshop2/incident_rag/policy_digest.py
+
+from __future__ import annotations
+
+import json
+import os
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List
+
+from .triage_config import DIGEST_MAX_CHARS
+from .triage_schema import PolicyChunkSchema
+
+DIGESTS_NAME = "policy_digests.json"
+DIGEST_VERSION = 1
+
+# Words that mark a sentence as a rule, threshold or severity criterion
+_RULE_RE = re.compile(
+    r"\b(must|shall|should|required?|requires|never|always|do not|only|at least|"
+    r"at most|within|immediately|escalat\w*|notify|notif\w*|page|alert\w*|log\w*|"
+    r"severity|sla|p[0-4])\b",
+    re.IGNORECASE,
+)
+_SEVERITY_RE = re.compile(r"\b(NORMAL|ALERT|CRISIS|P[0-4])\b")
+_NUMBER_RE = re.compile(r"\d")
+_BULLET_RE = re.compile(r"^(\s*)(?:[-*•]|\d+[.)])\s+(.*)$")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+# Illustrations are the first thing a digest can lose
+_EXAMPLE_RE = re.compile(r"^(example|examples|e\.g\.|for example|for instance)\b", re.IGNORECASE)
+_EXAMPLE_INTRO_RE = re.compile(r"\b(such as|for example|e\.g\.|for instance):$", re.IGNORECASE)
+
+# Keep sending the full text unless the digest is clearly shorter
+MAX_DIGEST_RATIO = 0.8
+
+
+@dataclass
+class _Unit:
+    indent: int
+    text: str
+    is_intro: bool  # "For severity ALERT:" style line introducing a list
+    score: float = 0.0
+
+
+def _split_units(text: str) -> List[_Unit]:
+    """Bullets stay whole; paragraph text is split into sentences."""
+    units: List[_Unit] = []
+    paragraph: List[str] = []
+
+    def flush() -> None:
+        if paragraph:
+            for sentence in _SENTENCE_RE.split(" ".join(paragraph)):
+                sentence = sentence.strip()
+                if sentence:
+                    units.append(_Unit(0, sentence, sentence.endswith(":")))
+            paragraph.clear()
+
+    for line in text.splitlines():
+        if not line.strip():
+            flush()
+            continue
+        bullet = _BULLET_RE.match(line)
+        if bullet:
+            flush()
+            body = bullet.group(2).strip()
+            units.append(_Unit(len(bullet.group(1)) + 1, body, body.endswith(":")))
+        else:
+            paragraph.append(line.strip())
+    flush()
+    return units
+
+
+def _rule_score(text: str) -> float:
+    if _EXAMPLE_RE.match(text):
+        return 0.0
+    score = 2.0 * len(_SEVERITY_RE.findall(text))
+    score += 1.0 * len(_RULE_RE.findall(text))
+    score += 0.5 if _NUMBER_RE.search(text) else 0.0
+    return score
+
+
+def digest_policy_text(text: str, max_chars: int = DIGEST_MAX_CHARS) -> str:
+    """
+    Extractive digest of one policy section: keep rule-like sentences and
+    bullets (modal verbs, severities, thresholds, escalation), plus the
+    intro lines of the lists they belong to, in original order.
+    Lowest-scoring units are dropped until the digest fits max_chars.
+    """
+    units = _split_units(text)
+    if not units:
+        return ""
+    for u in units:
+        u.score = _rule_score(u.text)
+    keep = [u.score > 0 for u in units]
+
+    # Items listed under a rule-bearing intro ("Severity CRISIS:") are its
+    # criteria: keep them, except examples
+    for i, u in enumerate(units):
+        if not u.is_intro or u.score <= 0:
+            continue
+        j = i + 1
+        while j < len(units) and units[j].indent > u.indent:
+            if not _EXAMPLE_RE.match(units[j].text):
+                keep[j] = True
+                units[j].score = max(units[j].score, 0.5)
+            j += 1
+
+    # ...while items under "such as:" are examples
+    for i, u in enumerate(units):
+        if u.is_intro and _EXAMPLE_INTRO_RE.search(u.text):
+            j = i + 1
+            while j < len(units) and units[j].indent > u.indent:
+                keep[j] = False
+                j += 1
+
+    # A chunk that starts with a list continues the previous chunk's intro
+    # (chunks are paragraphs): keep the whole list, except examples
+    j = 0
+    while j < len(units) and units[j].indent > 0:
+        keep[j] = keep[j] or not _EXAMPLE_RE.match(units[j].text)
+        j += 1
+
+    # Keep an intro line if any of its list items is kept (it gives them context)
+    for i in reversed(range(len(units))):
+        if not units[i].is_intro or keep[i]:
+            continue
+        j = i + 1
+        while j < len(units) and units[j].indent > units[i].indent:
+            if keep[j]:
+                keep[i] = True
+                break
+            j += 1
+
+    if not any(keep):
+        keep[0] = True  # nothing rule-like: the first sentence says what it is about
+
+    def render(flags: List[bool]) -> str:
+        lines = []
+        for u, k in zip(units, flags):
+            if k:
+                lines.append(("  " * max(u.indent - 1, 0) + "- " + u.text) if u.indent else u.text)
+        return "\n".join(lines)
+
+    digest = render(keep)
+    # Over budget: drop the weakest non-intro units first
+    for i in sorted(
+        (i for i, k in enumerate(keep) if k and not units[i].is_intro),
+        key=lambda i: units[i].score,
+    ):
+        if len(digest) <= max_chars or sum(keep) <= 1:
+            break
+        keep[i] = False
+        digest = render(keep)
+    return digest
+
+
+def build_digests(chunks: List[PolicyChunkSchema]) -> None:
+    """
+    Offline step of the index build: attach a digest to every chunk.
+    Chunks that are already short keep digest=None (sent in full).
+    """
+    for c in chunks:
+        digest = digest_policy_text(c.text)
+        c.digest = digest if len(digest) <= MAX_DIGEST_RATIO * len(c.text) else None
+
+
+def save_digests(chunks: List[PolicyChunkSchema], index_dir: Path) -> None:
+    path = index_dir / DIGESTS_NAME
+    data = {"version": DIGEST_VERSION, "digests": [c.digest for c in chunks]}
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+def load_digests(chunks: List[PolicyChunkSchema], index_dir: Path) -> bool:
+    """
+    Attach stored digests to loaded chunks (left as None for older indexes).
+    Returns False if there were no usable stored digests.
+    """
+    path = index_dir / DIGESTS_NAME
+    if not path.exists():
+        return False
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except ValueError:
+        return False
+    digests = data.get("digests") or []
+    if data.get("version") != DIGEST_VERSION or len(digests) != len(chunks):
+        return False
+    for c, digest in zip(chunks, digests):
+        c.digest = digest
+    return True
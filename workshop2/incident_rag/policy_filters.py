@@ -0,0 +1,136 @@
+# workshop2/incident_rag/policy_filters.py
+
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Tuple
+
+import numpy as np
+
+from .triage_schema import PolicyChunkSchema
+
+ROW_INDEX_NAME = "policy_row_index.npz"
+
+# Chunk attributes that search_policies(filters=...) understands
+FILTER_FIELDS = ("document_name", "section_path")
+
+
+@dataclass
+class PolicyRowIndex:
+    """
+    Precomputed row lookup for metadata filters, built at index time.
+
+    - doc_ranges: document_name -> list of [start, end) row ranges
+      (chunks of one file are contiguous, so usually a single range)
+    - section_rows: section_path -> sorted array of row ids
+    """
+    doc_ranges: Dict[str, List[Tuple[int, int]]]
+    section_rows: Dict[str, np.ndarray]
+
+    @classmethod
+    def from_chunks(cls, chunks: List[PolicyChunkSchema]) -> "PolicyRowIndex":
+        doc_ranges: Dict[str, List[Tuple[int, int]]] = {}
+        section_lists: Dict[str, List[int]] = {}
+        for row, c in enumerate(chunks):
+            ranges = doc_ranges.setdefault(c.document_name, [])
+            if ranges and ranges[-1][1] == row:
+                ranges[-1] = (ranges[-1][0], row + 1)
+            else:
+                ranges.append((row, row + 1))
+            section_lists.setdefault(c.section_path, []).append(row)
+        section_rows = {k: np.asarray(v, dtype=np.int64) for k, v in section_lists.items()}
+        return cls(doc_ranges, section_rows)
+
+    def save(self, index_dir: Path) -> None:
+        doc_names = list(self.doc_ranges)
+        section_names = list(self.section_rows)
+        doc_counts = [len(self.doc_ranges[d]) for d in doc_names]
+        section_counts = [len(self.section_rows[s]) for s in section_names]
+        path = index_dir / ROW_INDEX_NAME
+        tmp_path = path.with_name(f"{path.stem}.tmp.npz")
+        np.savez(
+            tmp_path,
+            doc_names=np.array(doc_names, dtype=str),
+            doc_offsets=np.concatenate([[0], np.cumsum(doc_counts)]).astype(np.int64),
+            doc_ranges=np.array(
+                [r for d in doc_names for r in self.doc_ranges[d]], dtype=np.int64
+            ).reshape(-1, 2),
+            section_names=np.array(section_names, dtype=str),
+            section_offsets=np.concatenate([[0], np.cumsum(section_counts)]).astype(np.int64),
+            section_rows=(
+                np.concatenate([self.section_rows[s] for s in section_names])
+                if section_names else np.zeros(0, dtype=np.int64)
+            ),
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, index_dir: Path) -> "PolicyRowIndex | None":
+        path = index_dir / ROW_INDEX_NAME
+        if not path.exists():
+            return None
+        with np.load(path) as npz:
+            doc_offsets, doc_ranges = npz["doc_offsets"], npz["doc_ranges"]
+            section_offsets, section_rows = npz["section_offsets"], npz["section_rows"]
+            docs = {
+                str(name): [tuple(map(int, r)) for r in doc_ranges[doc_offsets[i]:doc_offsets[i + 1]]]
+                for i, name in enumerate(npz["doc_names"])
+            }
+            sections = {
+                str(name): section_rows[section_offsets[i]:section_offsets[i + 1]]
+                for i, name in enumerate(npz["section_names"])
+            }
+        return cls(docs, sections)
+
+    def select_rows(self, filters: Dict[str, Any]) -> slice | np.ndarray:
+        """
+        Rows matching the filters, e.g.
+            {"document_name": "Alerting_and_Notification_Policy.txt"}
+            {"document_name": [...], "section_path": "Section 2"}
+        A list means "any of these"; different fields are combined with AND.
+        Returns a slice when the result is one contiguous range (no copy).
+        """
+        unknown = set(filters) - set(FILTER_FIELDS)
+        if unknown:
+            raise ValueError(f"Unsupported policy filter(s): {sorted(unknown)}")
+
+        ranges: List[Tuple[int, int]] | None = None
+
+        if filters.get("document_name") is not None:
+            ranges = sorted(
+                r for name in _as_list(filters["document_name"])
+                for r in self.doc_ranges.get(name, [])
+            )
+
+        if filters.get("section_path") is not None:
+            parts = [self.section_rows.get(s) for s in _as_list(filters["section_path"])]
+            parts = [p for p in parts if p is not None]
+            rows = np.unique(np.concatenate(parts)) if parts else np.zeros(0, dtype=np.int64)
+            if ranges is not None:
+                rows = rows[_in_ranges(rows, ranges)]
+            return rows
+
+        if ranges is None:
+            return slice(None)
+        if len(ranges) == 1:
+            return slice(*ranges[0])
+        return _ranges_to_rows(ranges)
+
+
+def _in_ranges(rows: np.ndarray, ranges: List[Tuple[int, int]]) -> np.ndarray:
+    mask = np.zeros(len(rows), dtype=bool)
+    for start, end in ranges:
+        mask |= (rows >= start) & (rows < end)
+    return mask
+
+
+def _ranges_to_rows(ranges: List[Tuple[int, int]]) -> np.ndarray:
+    if not ranges:
+        return np.zeros(0, dtype=np.int64)
+    return np.concatenate([np.arange(start, end, dtype=np.int64) for start, end in ranges])
+
+
+def _as_list(value: str | Iterable[str]) -> List[str]:
+    return [value] if isinstance(value, str) else list(value)
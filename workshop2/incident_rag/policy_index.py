@@ -3,44 +3,94 @@
 from __future__ import annotations
 
 import json
+import os
+import shutil
+import uuid
+from datetime import datetime
 from pathlib import Path
-from typing import List, Tuple
+from typing import Dict, List, Tuple
 
 import numpy as np
 
-from .triage_config import POLICIES_DIR, INDEX_DIR
+from .triage_config import (
+    POLICIES_DIR,
+    INDEX_DIR,
+    EMBEDDING_CACHE_ENABLED,
+    POLICY_INDEX_FORMAT,
+    RETRIEVAL_BACKEND,
+    ANN_MIN_ROWS,
+    IVF_NLIST,
+    INDEX_KEEP_VERSIONS,
+)
 from .triage_schema import PolicyChunkSchema
 from .policy_ingestion import load_raw_policy_text, chunk_policy_text
-from .embedding_provider import embed_texts
+from .embedding_provider import embed_texts, get_embedding_cache
+from .ann_index import IVFIndex, IVF_INDEX_NAME
+from .policy_filters import PolicyRowIndex
+from .lexical_index import BM25Index
+from .token_budget import load_token_counts, save_token_counts
+from .policy_digest import build_digests, load_digests, save_digests
+from .retrieval_kernel import normalize_rows
+from .policy_manifest import (
+    ManifestEntry,
+    diff_policy_files,
+    list_policy_files,
+    load_manifest,
+    save_manifest,
+)
 
 
-CHUNKS_JSON_PATH = INDEX_DIR / "policy_chunks.json"
-EMBEDDINGS_NPZ_PATH = INDEX_DIR / "policy_embeddings.npz" # NumPy compressed archive format
+# Original format: pretty-printed JSON + compressed .npz
+CHUNKS_JSON_NAME = "policy_chunks.json"
+EMBEDDINGS_NPZ_NAME = "policy_embeddings.npz"  # NumPy compressed archive format
 
+# Memory-mapped format: raw float32 .npy + compact metadata + one text blob
+EMBEDDINGS_NPY_NAME = "policy_embeddings.npy"
+CHUNKS_META_NAME = "policy_chunks_meta.json"
+CHUNK_TEXTS_NAME = "policy_texts.bin"
+MMAP_FORMAT_VERSION = "mmap-v1"
 
-def build_policy_chunks() -> List[PolicyChunkSchema]:
+# Versioned layout: INDEX_DIR/versions/<id>/... + INDEX_DIR/CURRENT = "<id>"
+VERSIONS_DIR_NAME = "versions"
+CURRENT_POINTER_NAME = "CURRENT"
+
+# Legacy (unversioned) location, still readable
+CHUNKS_JSON_PATH = INDEX_DIR / CHUNKS_JSON_NAME
+EMBEDDINGS_NPZ_PATH = INDEX_DIR / EMBEDDINGS_NPZ_NAME
+
+
+def _chunk_policy_file(path: Path) -> List[PolicyChunkSchema]:
+    doc_name = path.name
+    print(f"Processing policy: {doc_name}")
+    text = load_raw_policy_text(path)
+    return chunk_policy_text(doc_name, text)
+
+
+def build_policy_chunks(policies_dir: Path = POLICIES_DIR) -> List[PolicyChunkSchema]:
     """Load all policy files and chunk them into PolicyChunkSchema objects."""
     chunks: List[PolicyChunkSchema] = []
 
-    for path in sorted(POLICIES_DIR.glob("*")):
-        if not path.is_file():
-            continue
-        doc_name = path.name
-        print(f"Processing policy: {doc_name}")
-        text = load_raw_policy_text(path)
-        doc_chunks = chunk_policy_text(doc_name, text)
-        chunks.extend(doc_chunks)
+    for path in list_policy_files(policies_dir):
+        chunks.extend(_chunk_policy_file(path))
 
     print(f"Total chunks built: {len(chunks)}")
     return chunks
 
 
-def save_policy_index(
+def _write_atomic(path: Path, data: bytes) -> None:
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+
+
+def _save_npz_index(
     chunks: List[PolicyChunkSchema],
     embeddings: np.ndarray,
+    index_dir: Path,
 ) -> None:
-    """Save chunks metadata + embeddings to disk."""
-    INDEX_DIR.mkdir(parents=True, exist_ok=True)
+    """Original format: pretty-printed JSON + compressed .npz."""
+    chunks_path = index_dir / CHUNKS_JSON_NAME
+    embeddings_path = index_dir / EMBEDDINGS_NPZ_NAME
 
     # Save chunk metadata
     serializable = [
@@ -52,22 +102,172 @@ def save_policy_index(
         }
         for c in chunks
     ]
-    CHUNKS_JSON_PATH.write_text(json.dumps(serializable, indent=2), encoding="utf-8")
+    chunks_path.write_text(json.dumps(serializable, indent=2), encoding="utf-8")
 
     # Save embeddings separately: Creates a compressed .npz file (smaller on disk).
-    np.savez_compressed(EMBEDDINGS_NPZ_PATH, embeddings=embeddings)
-    print(f"Saved chunks to {CHUNKS_JSON_PATH}")
-    print(f"Saved embeddings to {EMBEDDINGS_NPZ_PATH}")
+    np.savez_compressed(embeddings_path, embeddings=embeddings)
+    print(f"Saved chunks to {chunks_path}")
+    print(f"Saved embeddings to {embeddings_path}")
 
 
-def load_policy_index() -> Tuple[List[PolicyChunkSchema], np.ndarray]:
-    """Load chunk metadata + embeddings from disk."""
-    if not CHUNKS_JSON_PATH.exists() or not EMBEDDINGS_NPZ_PATH.exists():
-        raise FileNotFoundError(
-            "Policy index not found. Run the index build (Ex04) first."
-        )
+def _save_mmap_index(
+    chunks: List[PolicyChunkSchema],
+    embeddings: np.ndarray,
+    index_dir: Path,
+) -> None:
+    """
+    Memory-mappable format:
+    - policy_embeddings.npy: raw float32 (N, D) L2-normalized matrix, no compression
+    - policy_texts.bin: all chunk texts concatenated as UTF-8
+    - policy_chunks_meta.json: compact rows [id, document, section, start, end]
+      where start/end are byte offsets of the chunk text in the blob
+    The metadata file is written last, so a half-written index is never loaded.
+    """
+    matrix = np.ascontiguousarray(normalize_rows(embeddings))
+    npy_path = index_dir / EMBEDDINGS_NPY_NAME
+    tmp_npy_path = npy_path.with_name(npy_path.name + ".tmp")
+    with tmp_npy_path.open("wb") as f:
+        np.save(f, matrix)
+    os.replace(tmp_npy_path, npy_path)
+
+    blob = bytearray()
+    rows = []
+    for c in chunks:
+        start = len(blob)
+        blob.extend(c.text.encode("utf-8"))
+        rows.append([c.id, c.document_name, c.section_path, start, len(blob)])
+    _write_atomic(index_dir / CHUNK_TEXTS_NAME, bytes(blob))
+
+    meta = {
+        "format": MMAP_FORMAT_VERSION,
+        "count": int(matrix.shape[0]),
+        "dim": int(matrix.shape[1]) if matrix.ndim == 2 else 0,
+        "normalized": True,
+        "rows": rows,
+    }
+    _write_atomic(
+        index_dir / CHUNKS_META_NAME,
+        json.dumps(meta, separators=(",", ":")).encode("utf-8"),
+    )
+    print(f"Saved {len(chunks)} chunks + embeddings (mmap format) to {index_dir}")
+
+
+def read_current_version(index_dir: Path = INDEX_DIR) -> str | None:
+    """Return the published index version id, or None (legacy/no index)."""
+    try:
+        version = (index_dir / CURRENT_POINTER_NAME).read_text(encoding="utf-8").strip()
+    except OSError:
+        return None
+    return version or None
+
+
+def resolve_index_dir(index_dir: Path = INDEX_DIR) -> Path:
+    """Folder holding the files of the current version (legacy: index_dir itself)."""
+    version = read_current_version(index_dir)
+    if version is None:
+        return index_dir
+    return index_dir / VERSIONS_DIR_NAME / version
+
+
+def _publish_version(index_dir: Path, version: str) -> None:
+    """Atomically point CURRENT at a fully written version folder."""
+    _write_atomic(index_dir / CURRENT_POINTER_NAME, version.encode("utf-8"))
+
+
+def _prune_versions(index_dir: Path, keep: int) -> None:
+    versions_dir = index_dir / VERSIONS_DIR_NAME
+    current = read_current_version(index_dir)
+    # Version ids start with a UTC timestamp, so name order = age order
+    old = sorted(p for p in versions_dir.iterdir() if p.is_dir() and p.name != current)
+    for path in old[:max(len(old) - (keep - 1), 0)]:
+        # Processes still reading an old version keep their open file
+        # handles/maps; on Windows the delete may fail and is retried next build.
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def save_policy_index(
+    chunks: List[PolicyChunkSchema],
+    embeddings: np.ndarray,
+    index_dir: Path = INDEX_DIR,
+    index_format: str = POLICY_INDEX_FORMAT,
+    manifest: List[ManifestEntry] | None = None,
+    digests_built: bool = False,
+) -> str:
+    """
+    Save chunks metadata + embeddings to disk as a new index version.
+    The version only becomes visible (CURRENT) once all its files,
+    including the optional manifest, are written. Returns the version id.
+    digests_built=True: the chunks already carry their digests, so they are
+    saved as they are. Token counts already on the chunks are never recounted.
+    """
+    version = f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')}-{uuid.uuid4().hex[:6]}"
+    version_dir = index_dir / VERSIONS_DIR_NAME / version
+    version_dir.mkdir(parents=True, exist_ok=True)
+
+    if index_format == "mmap":
+        _save_mmap_index(chunks, embeddings, version_dir)
+    elif index_format == "npz":
+        _save_npz_index(chunks, embeddings, version_dir)
+    else:
+        raise ValueError(f"Unknown policy index format: {index_format!r}")
+    save_ann_index(embeddings, version_dir)
+    PolicyRowIndex.from_chunks(chunks).save(version_dir)
+    BM25Index.from_chunks(chunks).save(version_dir)
+    if not digests_built:
+        build_digests(chunks)
+    save_digests(chunks, version_dir)
+    save_token_counts(chunks, version_dir)
+    if manifest is not None:
+        save_manifest(manifest, version_dir)
+
+    _publish_version(index_dir, version)
+    _prune_versions(index_dir, max(1, INDEX_KEEP_VERSIONS))
+    print(f"Published policy index version {version}")
+    return version
+
+
+def save_ann_index(embeddings: np.ndarray, version_dir: Path) -> None:
+    """
+    Build + save the IVF index when RETRIEVAL_BACKEND is "ivf" and the
+    index is large enough.
+    """
+    ann_path = version_dir / IVF_INDEX_NAME
+    if RETRIEVAL_BACKEND != "ivf" or embeddings.shape[0] < ANN_MIN_ROWS:
+        return
+    print(f"Building IVF index for {embeddings.shape[0]} chunks...")
+    ivf = IVFIndex.build(embeddings, nlist=IVF_NLIST)
+    ivf.save(ann_path)
+    print(f"Saved IVF index ({ivf.nlist} lists) to {ann_path}")
+
+
+def load_ann_index(index_dir: Path = INDEX_DIR) -> IVFIndex | None:
+    """Load the IVF index, or None if exact search should be used."""
+    ann_path = resolve_index_dir(index_dir) / IVF_INDEX_NAME
+    if RETRIEVAL_BACKEND != "ivf" or not ann_path.exists():
+        return None
+    return IVFIndex.load(ann_path)
+
+
+def load_policy_row_index(
+    chunks: List[PolicyChunkSchema],
+    index_dir: Path = INDEX_DIR,
+) -> PolicyRowIndex:
+    """Load the metadata-filter row index (rebuilt from chunks for older versions)."""
+    row_index = PolicyRowIndex.load(resolve_index_dir(index_dir))
+    return row_index if row_index is not None else PolicyRowIndex.from_chunks(chunks)
+
+
+def load_bm25_index(
+    chunks: List[PolicyChunkSchema],
+    index_dir: Path = INDEX_DIR,
+) -> BM25Index:
+    """Load the BM25 inverted index (rebuilt from chunks for older versions)."""
+    bm25 = BM25Index.load(resolve_index_dir(index_dir))
+    return bm25 if bm25 is not None else BM25Index.from_chunks(chunks)
+
 
-    data = json.loads(CHUNKS_JSON_PATH.read_text(encoding="utf-8"))
+def _load_npz_index(index_dir: Path) -> Tuple[List[PolicyChunkSchema], np.ndarray]:
+    data = json.loads((index_dir / CHUNKS_JSON_NAME).read_text(encoding="utf-8"))
     chunks: List[PolicyChunkSchema] = [
         PolicyChunkSchema(
             id=item["id"],
@@ -78,14 +278,190 @@ def load_policy_index() -> Tuple[List[PolicyChunkSchema], np.ndarray]:
         for item in data
     ]
 
-    npz = np.load(EMBEDDINGS_NPZ_PATH)
-    embeddings = npz["embeddings"]
+    npz = np.load(index_dir / EMBEDDINGS_NPZ_NAME)
+    embeddings = normalize_rows(npz["embeddings"])
+    return chunks, embeddings
+
+
+def _load_mmap_index(index_dir: Path) -> Tuple[List[PolicyChunkSchema], np.ndarray]:
+    meta = json.loads((index_dir / CHUNKS_META_NAME).read_bytes())
+    if meta.get("format") != MMAP_FORMAT_VERSION:
+        raise ValueError(f"Unsupported policy index format: {meta.get('format')!r}")
+
+    blob = (index_dir / CHUNK_TEXTS_NAME).read_bytes()
+    chunks: List[PolicyChunkSchema] = [
+        PolicyChunkSchema(
+            id=chunk_id,
+            document_name=document_name,
+            section_path=section_path,
+            text=blob[start:end].decode("utf-8"),
+        )
+        for chunk_id, document_name, section_path, start, end in meta["rows"]
+    ]
+
+    # Read-only memory map: no decompression, pages are loaded on demand
+    # and shared between processes through the OS page cache.
+    embeddings = np.load(index_dir / EMBEDDINGS_NPY_NAME, mmap_mode="r")
+    if not meta.get("normalized"):
+        embeddings = normalize_rows(embeddings)  # index written before normalization
+    if embeddings.shape[0] != len(chunks):
+        raise ValueError(
+            f"Policy index is inconsistent: {len(chunks)} chunks but "
+            f"{embeddings.shape[0]} embedding rows in {index_dir}"
+        )
     return chunks, embeddings
 
 
-def build_and_save_policy_index() -> None:
-    """One-shot helper for Ex04: build chunks, embed, save index."""
-    chunks = build_policy_chunks()
+def load_policy_index(
+    index_dir: Path = INDEX_DIR,
+) -> Tuple[List[PolicyChunkSchema], np.ndarray]:
+    """
+    Load chunk metadata + embeddings from disk (current version).
+    Prefers the memory-mapped format and falls back to the npz/JSON one.
+    Embeddings are always returned L2-normalized (float32).
+    """
+    index_dir = resolve_index_dir(index_dir)
+    if (index_dir / CHUNKS_META_NAME).exists() and (index_dir / EMBEDDINGS_NPY_NAME).exists():
+        return _load_mmap_index(index_dir)
+    if (index_dir / CHUNKS_JSON_NAME).exists() and (index_dir / EMBEDDINGS_NPZ_NAME).exists():
+        return _load_npz_index(index_dir)
+    raise FileNotFoundError(
+        "Policy index not found. Run the index build (Ex04) first."
+    )
+
+
+def migrate_policy_index(index_dir: Path = INDEX_DIR) -> None:
+    """Convert an existing npz/JSON index into a memory-mapped index version."""
+    chunks, embeddings = _load_npz_index(resolve_index_dir(index_dir))
+    save_policy_index(chunks, embeddings, index_dir=index_dir, index_format="mmap")
+
+
+def _print_cache_stats() -> None:
+    if EMBEDDING_CACHE_ENABLED:
+        stats = get_embedding_cache().stats()
+        print(
+            f"Embedding cache: {stats['hits']} hits, {stats['misses']} misses, "
+            f"{stats['evictions']} evicted"
+        )
+
+
+def _assign_rows(
+    entries: Dict[str, ManifestEntry],
+    chunks: List[PolicyChunkSchema],
+) -> List[ManifestEntry]:
+    """Fill row_start/row_end from the (contiguous, file-ordered) chunk list."""
+    ordered: List[ManifestEntry] = []
+    row = 0
+    for name, entry in entries.items():
+        start = row
+        while row < len(chunks) and chunks[row].document_name == name:
+            row += 1
+        entry.row_start, entry.row_end = start, row
+        ordered.append(entry)
+    return ordered
+
+
+def update_policy_index(
+    policies_dir: Path = POLICIES_DIR,
+    index_dir: Path = INDEX_DIR,
+) -> bool:
+    """
+    Incremental rebuild driven by the manifest.
+
+    Only added or modified files are re-read, re-chunked, digested,
+    token-counted and re-embedded; rows of unchanged files (with their
+    embeddings, digests and token counts) are copied from the existing index
+    and rows of deleted files are dropped. Still rebuilt over the whole
+    corpus when the new version is written: the embedding matrix file, the
+    IVF (ANN) index, the BM25 index and the row index. Returns False if
+    there is no usable previous index (the caller should then do a full build).
+    """
+    version_dir = resolve_index_dir(index_dir)
+    manifest = load_manifest(version_dir)
+    if manifest is None:
+        return False
+    try:
+        old_chunks, old_embeddings = load_policy_index(version_dir)
+    except (FileNotFoundError, ValueError):
+        return False
+    if sum(e.row_end - e.row_start for e in manifest.values()) != len(old_chunks):
+        print("Policy manifest does not match the index, doing a full rebuild.")
+        return False
+    # Digests first: the stored digest token counts only apply to chunks with a digest
+    if not load_digests(old_chunks, version_dir):
+        build_digests(old_chunks)  # older index without (current) digests
+    load_token_counts(old_chunks, version_dir)
+
+    changes = diff_policy_files(policies_dir, manifest)
+    print(
+        f"Policy changes: {len(changes.added)} added, {len(changes.modified)} modified, "
+        f"{len(changes.deleted)} deleted, {len(changes.unchanged)} unchanged"
+    )
+    if not changes.has_changes:
+        # Contents are identical; only refresh size/mtime so the next run skips
+        # hashing. The published version's data files are untouched and the
+        # manifest is replaced atomically (save_manifest), never edited in place.
+        entries = changes.current
+        for name, entry in entries.items():
+            entry.row_start, entry.row_end = manifest[name].row_start, manifest[name].row_end
+        if entries != manifest:
+            save_manifest(list(entries.values()), version_dir)
+        print("Policy index is up to date.")
+        return True
+
+    # Re-chunk + embed only the files that changed
+    new_parts: Dict[str, Tuple[List[PolicyChunkSchema], np.ndarray]] = {}
+    for name in changes.added + changes.modified:
+        doc_chunks = _chunk_policy_file(policies_dir / name)
+        build_digests(doc_chunks)
+        new_parts[name] = (doc_chunks, embed_texts([c.text for c in doc_chunks]))
+    _print_cache_stats()
+
+    # Splice: keep file order, copy unchanged rows, insert new ones
+    dim = old_embeddings.shape[1] if old_embeddings.ndim == 2 else 0
+    chunks: List[PolicyChunkSchema] = []
+    pieces: List[np.ndarray] = []
+    for name in changes.current:
+        if name in new_parts:
+            doc_chunks, doc_embeddings = new_parts[name]
+        else:
+            old = manifest[name]
+            doc_chunks = old_chunks[old.row_start:old.row_end]
+            doc_embeddings = old_embeddings[old.row_start:old.row_end]
+        chunks.extend(doc_chunks)
+        if len(doc_chunks):
+            pieces.append(np.asarray(doc_embeddings, dtype=np.float32))
+
+    embeddings = np.concatenate(pieces) if pieces else np.zeros((0, dim), dtype=np.float32)
+    print(f"Total chunks after update: {len(chunks)}")
+    save_policy_index(
+        chunks, embeddings, index_dir=index_dir,
+        manifest=_assign_rows(changes.current, chunks), digests_built=True,
+    )
+    return True
+
+
+def build_and_save_policy_index(
+    incremental: bool = True,
+    policies_dir: Path = POLICIES_DIR,
+    index_dir: Path = INDEX_DIR,
+) -> None:
+    """
+    One-shot helper for Ex04: build chunks, embed, save index.
+    With incremental=True, only changed policy files are processed
+    when a previous index + manifest exist.
+    """
+    if incremental and update_policy_index(policies_dir, index_dir):
+        return
+
+    # Hash files before reading them, so edits made during the build are
+    # picked up by the next incremental run
+    changes = diff_policy_files(policies_dir, {})
+    chunks = build_policy_chunks(policies_dir)
     texts = [c.text for c in chunks]
     embeddings = embed_texts(texts)
-    save_policy_index(chunks, embeddings)
+    _print_cache_stats()
+    save_policy_index(
+        chunks, embeddings, index_dir=index_dir,
+        manifest=_assign_rows(changes.current, chunks),
+    )
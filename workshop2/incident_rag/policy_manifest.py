@@ -0,0 +1,124 @@
+# workshop2/incident_rag/policy_manifest.py
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, List
+
+MANIFEST_NAME = "policy_manifest.json"
+MANIFEST_VERSION = 1
+
+
+@dataclass
+class ManifestEntry:
+    """One policy file and the embedding-matrix rows [row_start, row_end) it owns."""
+    document_name: str
+    size: int
+    mtime: float
+    sha256: str
+    row_start: int
+    row_end: int
+
+
+@dataclass
+class PolicyFileChanges:
+    """Result of comparing POLICIES_DIR against the manifest."""
+    unchanged: List[str] = field(default_factory=list)
+    added: List[str] = field(default_factory=list)
+    modified: List[str] = field(default_factory=list)
+    deleted: List[str] = field(default_factory=list)
+    # Current size/mtime/hash of every file on disk (rows not assigned yet)
+    current: Dict[str, ManifestEntry] = field(default_factory=dict)
+
+    @property
+    def has_changes(self) -> bool:
+        return bool(self.added or self.modified or self.deleted)
+
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def list_policy_files(policies_dir: Path) -> List[Path]:
+    """Policy files in the order they are stored in the index."""
+    return [p for p in sorted(policies_dir.glob("*")) if p.is_file()]
+
+
+def load_manifest(index_dir: Path) -> Dict[str, ManifestEntry] | None:
+    """Return {document_name: ManifestEntry}, or None if there is no usable manifest."""
+    path = index_dir / MANIFEST_NAME
+    if not path.exists():
+        return None
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+        if data.get("version") != MANIFEST_VERSION:
+            return None
+        entries = [ManifestEntry(**item) for item in data["files"]]
+    except (ValueError, KeyError, TypeError):
+        return None
+    return {e.document_name: e for e in entries}
+
+
+def save_manifest(entries: List[ManifestEntry], index_dir: Path) -> None:
+    """
+    Atomically (re)write the manifest: readers of a published version see
+    the old or the new file, never a partial one. The temp name is unique
+    per writer, so concurrent updates cannot clobber each other's temp file.
+    """
+    path = index_dir / MANIFEST_NAME
+    data = {
+        "version": MANIFEST_VERSION,
+        "files": [asdict(e) for e in entries],
+    }
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp_path.write_text(json.dumps(data, indent=2), encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+def diff_policy_files(
+    policies_dir: Path,
+    manifest: Dict[str, ManifestEntry],
+) -> PolicyFileChanges:
+    """
+    Classify every policy file as unchanged / added / modified / deleted.
+    Files whose size and mtime match the manifest are not re-hashed;
+    a touched file with identical content still counts as unchanged.
+    """
+    changes = PolicyFileChanges()
+
+    for path in list_policy_files(policies_dir):
+        name = path.name
+        st = path.stat()
+        old = manifest.get(name)
+
+        if old is not None and old.size == st.st_size and old.mtime == st.st_mtime:
+            digest = old.sha256
+        else:
+            digest = file_sha256(path)
+
+        changes.current[name] = ManifestEntry(
+            document_name=name,
+            size=st.st_size,
+            mtime=st.st_mtime,
+            sha256=digest,
+            row_start=0,
+            row_end=0,
+        )
+        if old is None:
+            changes.added.append(name)
+        elif old.sha256 != digest:
+            changes.modified.append(name)
+        else:
+            changes.unchanged.append(name)
+
+    changes.deleted = [name for name in manifest if name not in changes.current]
+    return changes
@@ -2,57 +2,310 @@
 
 from __future__ import annotations
 
-from typing import List, Tuple
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
 
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 
 from .triage_schema import PolicyChunkSchema
-from .embedding_provider import embed_query
-from .policy_index import load_policy_index
+from .embedding_provider import embed_query, embed_queries
+from .policy_index import (
+    VERSIONS_DIR_NAME,
+    load_policy_index,
+    load_ann_index,
+    load_bm25_index,
+    load_policy_row_index,
+    read_current_version,
+    resolve_index_dir,
+)
+from .ann_index import IVFIndex
+from .policy_filters import PolicyRowIndex
+from .lexical_index import BM25Index, reciprocal_rank_fusion
+from .result_cache import RetrievalResultCache, make_result_key
+from .token_budget import load_token_counts
+from .policy_digest import load_digests
+from .retrieval_kernel import batch_top_k, normalize_rows
+from .triage_metrics import span
+from .triage_config import (
+    INDEX_DIR,
+    IVF_NPROBE,
+    INDEX_RELOAD_CHECK_SECONDS,
+    RETRIEVAL_MODE,
+    HYBRID_CANDIDATES,
+    RRF_K,
+    RESULT_CACHE_ENABLED,
+    RESULT_CACHE_MAX_ENTRIES,
+)
 
-# Simple in-memory cache
-_cached_chunks: List[PolicyChunkSchema] | None = None
-_cached_embeddings: np.ndarray | None = None
 
+@dataclass
+class LoadedPolicyIndex:
+    """One loaded index version. Never mutated: a reload swaps in a new object."""
+    version: str | None  # None = legacy unversioned index
+    chunks: List[PolicyChunkSchema]
+    embeddings: np.ndarray
+    ann: IVFIndex | None
+    row_index: PolicyRowIndex
+    bm25: BM25Index
 
-def _ensure_index_loaded() -> None:
-    global _cached_chunks, _cached_embeddings
-    if _cached_chunks is None or _cached_embeddings is None:
-        print("Loading policy index from disk...")
-        _cached_chunks, _cached_embeddings = load_policy_index()
+
+# Simple in-memory cache (the current snapshot)
+_current_index: LoadedPolicyIndex | None = None
+_load_lock = threading.Lock()
+_reload_thread: threading.Thread | None = None
+_last_version_check = 0.0
+_result_cache: RetrievalResultCache | None = None
+
+
+def _load_snapshot(version: str | None) -> LoadedPolicyIndex:
+    version_dir = INDEX_DIR / VERSIONS_DIR_NAME / version if version else INDEX_DIR
+    with span("index_load"):
+        chunks, embeddings = load_policy_index(version_dir)
+        data_dir = resolve_index_dir(version_dir)
+        load_digests(chunks, data_dir)  # before token counts: digest counts need the digest
+        load_token_counts(chunks, data_dir)
+        return LoadedPolicyIndex(
+            version,
+            chunks,
+            embeddings,
+            load_ann_index(version_dir),
+            load_policy_row_index(chunks, version_dir),
+            load_bm25_index(chunks, version_dir),
+        )
+
+
+def _warm_up(snapshot: LoadedPolicyIndex) -> None:
+    # Touch every page of the (memory-mapped) matrix so the first
+    # searches after the swap do not pay for page faults.
+    float(np.asarray(snapshot.embeddings).sum())
+
+
+def _reload_in_background(version: str) -> None:
+    global _current_index
+    try:
+        snapshot = _load_snapshot(version)
+        _warm_up(snapshot)
+    except Exception as exc:  # keep serving the old version
+        print(f"Policy index reload of version {version} failed: {exc}")
+        return
+    # Single reference assignment: in-flight searches keep using the
+    # snapshot they already hold, new searches see the new version.
+    _current_index = snapshot
+    print(f"Switched to policy index version {version}")
+
+
+def _maybe_start_reload(snapshot: LoadedPolicyIndex) -> None:
+    """Every INDEX_RELOAD_CHECK_SECONDS, check CURRENT and reload in the background."""
+    global _last_version_check, _reload_thread
+    if INDEX_RELOAD_CHECK_SECONDS <= 0:
+        return
+    now = time.monotonic()
+    if now - _last_version_check < INDEX_RELOAD_CHECK_SECONDS:
+        return
+    with _load_lock:
+        if now - _last_version_check < INDEX_RELOAD_CHECK_SECONDS:
+            return
+        _last_version_check = now
+        if _reload_thread is not None and _reload_thread.is_alive():
+            return
+        version = read_current_version(INDEX_DIR)
+        if version is None or version == snapshot.version:
+            return
+        print(f"New policy index version {version} found, loading in the background...")
+        _reload_thread = threading.Thread(
+            target=_reload_in_background,
+            args=(version,),
+            name="policy-index-reload",
+            daemon=True,
+        )
+        _reload_thread.start()
+
+
+def get_policy_index() -> LoadedPolicyIndex:
+    """
+    Return the current index snapshot. Loads it on first use; afterwards a
+    newly published version is loaded in the background and swapped in
+    without blocking searches.
+    """
+    global _current_index, _last_version_check
+    snapshot = _current_index
+    if snapshot is not None:
+        _maybe_start_reload(snapshot)
+        return snapshot
+
+    with _load_lock:
+        if _current_index is None:
+            print("Loading policy index from disk...")
+            _current_index = _load_snapshot(read_current_version(INDEX_DIR))
+            _last_version_check = time.monotonic()
+        return _current_index
+
+
+def reload_policy_index() -> LoadedPolicyIndex:
+    """Synchronously load the current version (e.g. right after a build)."""
+    global _current_index
+    snapshot = _load_snapshot(read_current_version(INDEX_DIR))
+    _current_index = snapshot
+    return snapshot
+
+
+def get_result_cache() -> RetrievalResultCache:
+    """Return the process-wide search result cache (see .stats() for hit rate)."""
+    global _result_cache
+    if _result_cache is None:
+        _result_cache = RetrievalResultCache(RESULT_CACHE_MAX_ENTRIES)
+    return _result_cache
 
 
 def search_policies(
     query: str,
     top_k: int = 3,
+    nprobe: int | None = None,
+    filters: Dict[str, Any] | None = None,
+    mode: str | None = None,
 ) -> List[Tuple[PolicyChunkSchema, float]]:
     """
     Given a free-text query (incident description), return top_k
     (PolicyChunkSchema, similarity_score) pairs.
+
+    If an IVF index was built (RETRIEVAL_BACKEND = "ivf"), only the
+    nprobe closest clusters are scanned (default IVF_NPROBE).
+
+    filters restricts the search to matching chunks, e.g.
+    {"document_name": "Alerting_and_Notification_Policy.txt"}; only the
+    matching rows are scored (see policy_filters.PolicyRowIndex).
+
+    mode="hybrid" (default RETRIEVAL_MODE) fuses the dense ranking with a
+    BM25 keyword ranking; the returned score is still cosine similarity.
+
+    Results are cached per index version (RESULT_CACHE_ENABLED).
     """
-    _ensure_index_loaded()
-    assert _cached_chunks is not None
-    assert _cached_embeddings is not None
+    index = get_policy_index()
+    key = make_result_key(query, top_k, filters, mode=mode or RETRIEVAL_MODE, nprobe=nprobe)
+    if RESULT_CACHE_ENABLED:
+        cached = get_result_cache().get(key, index.version)
+        if cached is not None:
+            return cached
 
     # Uses your embedding model (SentenceTransformer MiniLM in your setup) to encode the query into a single vector.
     q_vec = embed_query(query)  # q_vec.shape == (384,) → 1D vector.
     q_vec_2d = q_vec.reshape(1, -1)  # reshape from shape (dim,) to (1, dim)
+    hits = _search_vectors(index, q_vec_2d, top_k, nprobe, filters, mode, [query])[0]
+
+    if RESULT_CACHE_ENABLED:
+        get_result_cache().put(key, index.version, hits)
+    return hits
+
+
+def search_policies_batch(
+    queries: List[str],
+    top_k: int = 3,
+    nprobe: int | None = None,
+    filters: Dict[str, Any] | None = None,
+    mode: str | None = None,
+) -> List[List[Tuple[PolicyChunkSchema, float]]]:
+    """
+    Batch version of search_policies: one result list per query.
+    All queries are embedded in one call and scored with one matrix multiply;
+    queries found in the result cache are skipped.
+    """
+    if not queries:
+        return []
+    index = get_policy_index()
+    keys = [
+        make_result_key(q, top_k, filters, mode=mode or RETRIEVAL_MODE, nprobe=nprobe)
+        for q in queries
+    ]
+    results: List[List[Tuple[PolicyChunkSchema, float]] | None] = [None] * len(queries)
+    if RESULT_CACHE_ENABLED:
+        cache = get_result_cache()
+        results = [cache.get(key, index.version) for key in keys]
+
+    missing = [i for i, r in enumerate(results) if r is None]
+    if missing:
+        miss_queries = [queries[i] for i in missing]
+        q_vecs = embed_queries(miss_queries)  # shape (misses, 384)
+        computed = _search_vectors(index, q_vecs, top_k, nprobe, filters, mode, miss_queries)
+        for i, hits in zip(missing, computed):
+            results[i] = hits
+            if RESULT_CACHE_ENABLED:
+                get_result_cache().put(keys[i], index.version, hits)
+    return results
+
+
+def _search_vectors(
+    index: LoadedPolicyIndex,
+    q_vecs: np.ndarray,
+    top_k: int,
+    nprobe: int | None,
+    filters: Dict[str, Any] | None = None,
+    mode: str | None = None,
+    queries: List[str] | None = None,
+) -> List[List[Tuple[PolicyChunkSchema, float]]]:
     """
-    Each value is the cosine similarity between the query and one chunk:
-    1.0 → identical direction (very similar).   
-    0 → orthogonal (unrelated).    
+    The stored chunk embeddings are already L2-normalized, so after
+    normalizing the queries, cosine similarity is a plain dot product:
+    1.0 → identical direction (very similar).
+    0 → orthogonal (unrelated).
     -1 → opposite direction.
     """
-    sims = cosine_similarity(q_vec_2d, _cached_embeddings)[0]  # shape (N,)
+    mode = mode or RETRIEVAL_MODE
+    if mode not in ("dense", "hybrid"):
+        raise ValueError(f"Unknown retrieval mode: {mode!r}")
+    hybrid = mode == "hybrid" and queries is not None
+    depth = max(top_k, HYBRID_CANDIDATES) if hybrid else top_k
+
+    q_norm = normalize_rows(q_vecs)
+    selected = index.row_index.select_rows(filters) if filters else None
+
+    if selected is not None:
+        # Score only the pre-selected rows (exact search; a filtered subset
+        # is usually small, and IVF lists would mostly miss it anyway).
+        rows, scores = batch_top_k(q_norm, index.embeddings[selected], depth)
+        if isinstance(selected, slice):
+            rows = rows + (selected.start or 0)  # local → global row ids
+        else:
+            rows = selected[rows]
+        hits = list(zip(rows, scores))
+    elif index.ann is not None:
+        hits = [
+            index.ann.search(index.embeddings, q, depth, nprobe or IVF_NPROBE)
+            for q in q_norm
+        ]
+    else:
+        # (Q, N) scores in one matrix multiply, top-k per row with argpartition
+        rows, scores = batch_top_k(q_norm, index.embeddings, depth)
+        hits = list(zip(rows, scores))
+
+    if hybrid:
+        hits = [
+            _fuse_hybrid(index, q, query, dense_rows, top_k, selected)
+            for q, query, (dense_rows, _) in zip(q_norm, queries, hits)
+        ]
 
-    # Find the indices of the top-k scores
-    top_indices = np.argsort(sims)[::-1][:top_k]  # Reverses that array → descending order (largest first).
-    results: List[Tuple[PolicyChunkSchema, float]] = []
     # Map indices back to chunks.
-    for idx in top_indices:
-        chunk = _cached_chunks[int(idx)]
-        score = float(sims[int(idx)])
-        results.append((chunk, score))
+    return [
+        [(index.chunks[int(idx)], float(score)) for idx, score in zip(q_rows, q_scores)]
+        for q_rows, q_scores in hits
+    ]
 
-    return results
+
+def _fuse_hybrid(
+    index: LoadedPolicyIndex,
+    q: np.ndarray,
+    query: str,
+    dense_rows: np.ndarray,
+    top_k: int,
+    selected: slice | np.ndarray | None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Reciprocal rank fusion of the dense and BM25 rankings.
+    BM25 only reads the postings of the query terms.
+    """
+    lexical_rows, _ = index.bm25.search(query, HYBRID_CANDIDATES, selected)
+    rows, _ = reciprocal_rank_fusion([dense_rows, lexical_rows], k=RRF_K)
+    rows = rows[:top_k]
+    # Report cosine similarity so scores mean the same thing in both modes
+    return rows, index.embeddings[rows] @ q
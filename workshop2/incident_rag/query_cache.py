@@ -0,0 +1,126 @@
+# workshop2/incident_rag/query_cache.py
+
+from __future__ import annotations
+
+import atexit
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict
+
+import numpy as np
+
+
+def normalize_query(text: str) -> str:
+    """
+    Normalize a query for cache lookups: lowercase + collapse whitespace.
+    MiniLM is uncased, so this does not change the embedding.
+    """
+    return " ".join(text.lower().split())
+
+
+class QueryEmbeddingCache:
+    """
+    Bounded LRU cache: normalized query text -> embedding (1D vector).
+
+    If persist_path is given, the cache is loaded from that .npz file on
+    start-up and written back at interpreter exit (or on save()), so
+    repeated incident descriptions skip the model even after a restart.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        model_name: str,
+        persist_path: Path | None = None,
+    ) -> None:
+        self.max_entries = max(1, max_entries)
+        self.model_name = model_name
+        self.persist_path = persist_path
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._dirty = False
+
+        if persist_path is not None:
+            self.load()
+            atexit.register(self.save)
+
+    def get(self, query: str) -> np.ndarray | None:
+        key = normalize_query(query)
+        with self._lock:
+            vec = self._entries.get(key)
+            if vec is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vec
+
+    def put(self, query: str, vec: np.ndarray) -> None:
+        key = normalize_query(query)
+        vec = np.array(vec, dtype=np.float32)
+        vec.setflags(write=False)  # shared between callers
+        with self._lock:
+            self._entries[key] = vec
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._dirty = True
+
+    def load(self) -> None:
+        """Load persisted entries (ignored if missing or from another model)."""
+        if self.persist_path is None or not self.persist_path.exists():
+            return
+        try:
+            with np.load(self.persist_path, allow_pickle=False) as npz:
+                if str(npz["model_name"]) != self.model_name:
+                    return
+                queries = npz["queries"].tolist()
+                embeddings = npz["embeddings"]
+        except (OSError, ValueError, KeyError):
+            print(f"Ignoring unreadable query cache: {self.persist_path}")
+            return
+
+        with self._lock:
+            # File is stored oldest -> newest, keep the newest max_entries
+            for query, vec in list(zip(queries, embeddings))[-self.max_entries:]:
+                vec = np.array(vec, dtype=np.float32)
+                vec.setflags(write=False)
+                self._entries[query] = vec
+
+    def save(self) -> None:
+        """Write the cache to persist_path (temp file + atomic rename)."""
+        if self.persist_path is None:
+            return
+        with self._lock:
+            if not self._dirty or not self._entries:
+                return
+            queries = np.array(list(self._entries.keys()))
+            embeddings = np.stack(list(self._entries.values()))
+            self._dirty = False
+
+        self.persist_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.persist_path.with_name(f"{self.persist_path.stem}.{os.getpid()}.tmp.npz")
+        np.savez(
+            tmp_path,
+            model_name=np.array(self.model_name),
+            queries=queries,
+            embeddings=embeddings,
+        )
+        os.replace(tmp_path, self.persist_path)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            }
@@ -0,0 +1,111 @@
+# workshop2/incident_rag/reranker.py
+
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Tuple
+
+from sentence_transformers import CrossEncoder
+
+from .triage_config import (
+    EMBEDDING_MODEL_DIR,
+    RERANKER_MODEL_NAME,
+    RERANK_BATCH_SIZE,
+    RERANK_BUDGET_MS,
+)
+from .triage_schema import PolicyChunkSchema
+
+_reranker_model: CrossEncoder | None = None
+_reranker_lock = threading.Lock()
+
+
+@dataclass
+class RerankResult:
+    """
+    Outcome of the second retrieval stage.
+    - reranked=False means the budget ran out and hits are in stage-one order
+      (with stage-one cosine scores); otherwise scores are cross-encoder scores.
+    """
+    hits: List[Tuple[PolicyChunkSchema, float]]
+    reranked: bool
+    candidates: int
+    scored: int
+    elapsed_ms: float
+    batch_ms: List[float] = field(default_factory=list)
+
+    def to_log(self) -> Dict[str, Any]:
+        return {
+            "reranked": self.reranked,
+            "candidates": self.candidates,
+            "scored": self.scored,
+            "elapsed_ms": round(self.elapsed_ms, 2),
+        }
+
+
+def get_reranker_model() -> CrossEncoder:
+    """Lazy-load the local cross-encoder once per Python process."""
+    global _reranker_model
+    with _reranker_lock:
+        if _reranker_model is None:
+            print(f"Loading cross-encoder reranker: {RERANKER_MODEL_NAME}")
+            _reranker_model = CrossEncoder(
+                RERANKER_MODEL_NAME,
+                cache_folder=str(EMBEDDING_MODEL_DIR),
+            )
+    return _reranker_model
+
+
+def rerank_policies(
+    query: str,
+    candidates: List[Tuple[PolicyChunkSchema, float]],
+    top_k: int = 3,
+    budget_ms: float = RERANK_BUDGET_MS,
+    batch_size: int = RERANK_BATCH_SIZE,
+) -> RerankResult:
+    """
+    Rerank stage-one candidates with the cross-encoder, batch by batch.
+
+    Before each batch we check whether it still fits in budget_ms (using
+    the slowest batch so far as the estimate). If it does not, we stop
+    and return the stage-one order, so the stage never blows the request
+    latency by more than one batch.
+    """
+    model = get_reranker_model()  # one-time load is not charged to the request
+    start = time.perf_counter()
+    deadline = start + budget_ms / 1000.0
+    pairs = [(query, chunk.text) for chunk, _ in candidates]
+
+    scores: List[float] = []
+    batch_ms: List[float] = []
+    step = max(1, batch_size)
+    for i in range(0, len(pairs), step):
+        now = time.perf_counter()
+        expected = max(batch_ms, default=0.0) / 1000.0
+        if now + expected > deadline:
+            break
+        batch = pairs[i:i + step]
+        scores.extend(float(s) for s in model.predict(batch, batch_size=len(batch)))
+        batch_ms.append((time.perf_counter() - now) * 1000.0)
+
+    elapsed_ms = (time.perf_counter() - start) * 1000.0
+    if len(scores) < len(pairs):
+        return RerankResult(
+            hits=candidates[:top_k],
+            reranked=False,
+            candidates=len(candidates),
+            scored=len(scores),
+            elapsed_ms=elapsed_ms,
+            batch_ms=batch_ms,
+        )
+
+    order = sorted(range(len(candidates)), key=lambda j: -scores[j])[:top_k]
+    return RerankResult(
+        hits=[(candidates[j][0], scores[j]) for j in order],
+        reranked=True,
+        candidates=len(candidates),
+        scored=len(scores),
+        elapsed_ms=elapsed_ms,
+        batch_ms=batch_ms,
+    )
@@ -0,0 +1,108 @@
+# workshop2/incident_rag/result_cache.py
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Tuple
+
+from .query_cache import normalize_query
+from .triage_schema import PolicyChunkSchema
+
+SearchHits = List[Tuple[PolicyChunkSchema, float]]
+
+
+def _freeze(value: Any) -> Hashable:
+    """
+    Hashable, order-independent form of a filter/option value: a list or
+    set means "any of these", so its order must not change the key.
+    Sorted by repr, which also works for mixed types.
+    """
+    if isinstance(value, dict):
+        return (dict,) + tuple(sorted(((k, _freeze(v)) for k, v in value.items()), key=repr))
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return tuple(sorted((_freeze(v) for v in value), key=repr))
+    return value
+
+
+def make_result_key(
+    query: str,
+    top_k: int,
+    filters: Dict[str, Any] | None = None,
+    **options: Any,
+) -> Tuple[Hashable, ...]:
+    """
+    Cache key for one search: normalized query, top_k, filters and any
+    other option that changes the ranking (mode, nprobe, ...).
+    """
+    frozen_filters = tuple(sorted(
+        (k, _freeze(v)) for k, v in (filters or {}).items() if v is not None
+    ))
+    frozen_options = tuple(sorted((k, _freeze(v)) for k, v in options.items()))
+    return (normalize_query(query), top_k, frozen_filters, frozen_options)
+
+
+class RetrievalResultCache:
+    """
+    Bounded LRU cache: search key -> [(PolicyChunkSchema, score), ...].
+
+    Entries belong to one index version. The first lookup against a new
+    version (after a rebuild/hot-reload) drops everything cached for the
+    old one, so stale results are never returned.
+    """
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max(1, max_entries)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._version: str | None = None
+        self._entries: "OrderedDict[Tuple[Hashable, ...], SearchHits]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _check_version(self, version: str | None) -> None:
+        # caller holds the lock
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._version = version
+
+    def get(self, key: Tuple[Hashable, ...], version: str | None) -> SearchHits | None:
+        with self._lock:
+            self._check_version(version)
+            hits = self._entries.get(key)
+            if hits is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return list(hits)  # callers may modify their list
+
+    def put(self, key: Tuple[Hashable, ...], version: str | None, hits: SearchHits) -> None:
+        with self._lock:
+            if version != self._version:
+                return  # computed on a snapshot that has since been replaced
+            self._entries[key] = list(hits)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "version": self._version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            }
@@ -0,0 +1,71 @@
+# workshop2/incident_rag/retrieval_kernel.py
+
+from __future__ import annotations
+
+from typing import Tuple
+
+import numpy as np
+
+# Upper bound on the (queries x rows) score block held in memory at once
+MAX_SCORE_BLOCK = 1 << 25  # 32M float32 = 128 MB
+
+
+def normalize_rows(x: np.ndarray) -> np.ndarray:
+    """
+    L2-normalize vectors (1D or 2D) as float32.
+    For normalized vectors, cosine similarity is just a dot product.
+    """
+    x = np.asarray(x, dtype=np.float32)
+    norms = np.linalg.norm(x, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return x / norms
+
+
+def top_k_rows(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Indices of the k largest scores, best first.
+    argpartition is O(N); only the k winners are sorted.
+    """
+    n = scores.shape[0]
+    k = min(k, n)
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    if k < n:
+        top = np.argpartition(-scores, k - 1)[:k]
+    else:
+        top = np.arange(n)
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+def batch_top_k(
+    queries: np.ndarray,
+    corpus: np.ndarray,
+    k: int,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Score many queries at once against a corpus.
+
+    queries: (Q, D) and corpus: (N, D), both already L2-normalized.
+    Returns (indices, scores), each of shape (Q, min(k, N)), best first.
+    Queries are processed in blocks so the (Q, N) score matrix stays
+    below MAX_SCORE_BLOCK elements.
+    """
+    q_count, n = queries.shape[0], corpus.shape[0]
+    k = min(k, n)
+    indices = np.zeros((q_count, k), dtype=np.int64)
+    scores = np.zeros((q_count, k), dtype=np.float32)
+    if k <= 0 or q_count == 0:
+        return indices, scores
+
+    block = max(1, MAX_SCORE_BLOCK // max(n, 1))
+    for start in range(0, q_count, block):
+        sims = queries[start:start + block] @ corpus.T  # one matrix multiply
+        if k < n:
+            top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        else:
+            top = np.broadcast_to(np.arange(n), sims.shape).copy()
+        top_scores = np.take_along_axis(sims, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        indices[start:start + block] = np.take_along_axis(top, order, axis=1)
+        scores[start:start + block] = np.take_along_axis(top_scores, order, axis=1)
+    return indices, scores
@@ -0,0 +1,189 @@
+# workshop2/incident_rag/semantic_cache.py
+
+from __future__ import annotations
+
+import json
+import threading
+import time
+from dataclasses import dataclass, fields
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from .retrieval_kernel import normalize_rows
+from .triage_schema import TriageResultSchema
+
+SEVERITIES = ("NORMAL", "ALERT", "CRISIS")
+_REQUIRED_FIELDS = tuple(f.name for f in fields(TriageResultSchema))
+
+
+def is_cacheable_result(data: Any) -> bool:
+    """
+    True for a complete triage result: every TriageResultSchema field is
+    present and severity is a known level. The raw_content fallback of an
+    unparseable LLM reply (no severity) is never reused.
+    """
+    if not isinstance(data, dict) or "raw_content" in data:
+        return False
+    if any(name not in data for name in _REQUIRED_FIELDS):
+        return False
+    return str(data["severity"]).upper() in SEVERITIES
+
+
+@dataclass
+class SemanticCacheHit:
+    data: Dict[str, Any]      # stored LLM triage JSON
+    similarity: float         # cosine similarity to the past incident
+    age_seconds: float
+    source_timestamp: float   # when the past incident was triaged (unix time)
+
+
+class SemanticTriageCache:
+    """
+    Reuse past triage results for near-duplicate incidents.
+
+    Past incident embeddings live in a fixed-size ring buffer (the oldest
+    entry is overwritten when full). A lookup is one matrix-vector product;
+    a past result is reused only if:
+    - cosine similarity >= threshold,
+    - it is younger than ttl_seconds,
+    - the new incident retrieved exactly the same policy chunk ids,
+    - its severity is not in bypass_severities (e.g. CRISIS is always re-triaged).
+    Only complete results are stored (see is_cacheable_result).
+    """
+
+    def __init__(
+        self,
+        threshold: float,
+        ttl_seconds: float,
+        max_entries: int,
+        bypass_severities: Sequence[str] = ("CRISIS",),
+    ) -> None:
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self.bypass_severities = {s.upper() for s in bypass_severities}
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self._embeddings: np.ndarray | None = None  # allocated on first add
+        self._timestamps = np.full(self.max_entries, -np.inf)
+        self._chunk_ids: List[Tuple[str, ...] | None] = [None] * self.max_entries
+        self._data: List[Dict[str, Any] | None] = [None] * self.max_entries
+        self._next = 0
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def lookup(
+        self,
+        q_vec: np.ndarray,
+        chunk_ids: Sequence[str],
+        now: float | None = None,
+    ) -> SemanticCacheHit | None:
+        now = time.time() if now is None else now
+        q = normalize_rows(np.asarray(q_vec).reshape(-1))
+        key = tuple(chunk_ids)
+        with self._lock:
+            if self._embeddings is None or self._size == 0:
+                self.misses += 1
+                return None
+            n = self._size
+            sims = self._embeddings[:n] @ q
+            fresh = (now - self._timestamps[:n]) < self.ttl_seconds
+            candidates = np.flatnonzero((sims >= self.threshold) & fresh)
+            for slot in candidates[np.argsort(-sims[candidates])]:
+                if self._chunk_ids[slot] == key:
+                    self.hits += 1
+                    ts = float(self._timestamps[slot])
+                    return SemanticCacheHit(
+                        data=dict(self._data[slot]),
+                        similarity=float(sims[slot]),
+                        age_seconds=now - ts,
+                        source_timestamp=ts,
+                    )
+            self.misses += 1
+            return None
+
+    def add(
+        self,
+        q_vec: np.ndarray,
+        chunk_ids: Sequence[str],
+        data: Dict[str, Any] | None,
+        timestamp: float | None = None,
+    ) -> bool:
+        """Store one triage result. Returns False if it must not be reused."""
+        if not is_cacheable_result(data):
+            return False
+        if str(data.get("severity", "")).upper() in self.bypass_severities:
+            with self._lock:
+                self.bypassed += 1
+            return False
+
+        q = normalize_rows(np.asarray(q_vec).reshape(-1))
+        with self._lock:
+            if self._embeddings is None:
+                self._embeddings = np.zeros((self.max_entries, q.shape[0]), dtype=np.float32)
+            slot = self._next
+            self._embeddings[slot] = q
+            self._timestamps[slot] = time.time() if timestamp is None else timestamp
+            self._chunk_ids[slot] = tuple(chunk_ids)
+            self._data[slot] = dict(data)
+            self._next = (slot + 1) % self.max_entries
+            self._size = min(self._size + 1, self.max_entries)
+        return True
+
+    def warm_from_log(
+        self,
+        log_path: Path,
+        embed_fn: Callable[[List[str]], np.ndarray],
+        now: float | None = None,
+    ) -> int:
+        """
+        Load still-fresh records from triage_log.jsonl (one batched embed call).
+        Records that were themselves served from the cache are skipped, so a
+        result's TTL always counts from the original LLM call. Entries are
+        keyed on retrieved_ids (all retrieved chunks); older records without
+        it fall back to policy_chunks (the chunks sent to the LLM).
+        """
+        if not log_path.exists():
+            return 0
+        now = time.time() if now is None else now
+        records = []
+        with log_path.open("r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                    ts = datetime.fromisoformat(rec["timestamp"].rstrip("Z"))
+                except (ValueError, KeyError, TypeError, AttributeError):
+                    continue
+                ts = ts.replace(tzinfo=timezone.utc).timestamp()
+                if now - ts >= self.ttl_seconds or not rec.get("triage_data"):
+                    continue
+                if (rec.get("semantic_cache") or {}).get("hit"):
+                    continue
+                records.append((rec, ts))
+
+        records = records[-self.max_entries:]
+        if not records:
+            return 0
+        vecs = embed_fn([rec["incident_text"] for rec, _ in records])
+        loaded = 0
+        for (rec, ts), vec in zip(records, vecs):
+            ids = rec.get("retrieved_ids")
+            if ids is None:
+                ids = [c.get("id") for c in rec.get("policy_chunks") or []]
+            loaded += self.add(vec, ids, rec["triage_data"], timestamp=ts)
+        return loaded
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": self._size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "bypassed": self.bypassed,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            }
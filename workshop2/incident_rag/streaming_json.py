@@ -0,0 +1,127 @@
+# workshop2/incident_rag/streaming_json.py
+
+from __future__ import annotations
+
+import json
+from typing import Any, List, Tuple
+
+
+class JSONFieldStream:
+    """
+    Incremental parser for a streamed JSON object.
+
+    feed() takes text deltas as they arrive and returns the top-level
+    (key, value) pairs that became complete, e.g. ("severity", "CRISIS")
+    as soon as its closing quote arrives, long before the rest of the
+    object is generated. Each character is scanned once.
+    """
+
+    def __init__(self) -> None:
+        self._text = ""
+        self._depth = 0            # nesting depth (1 = inside the top-level object)
+        self._in_string = False
+        self._escape = False
+        self._key: str | None = None
+        self._key_start = -1
+        self._value_start = -1     # buffer index where the current value begins
+        # What the top-level object expects next: key, key_string, colon, value,
+        # string_value, nested_value, scalar_value or comma
+        self._expect = "key"
+        self._pos = 0
+        self.fields: dict = {}
+
+    def feed(self, delta: str) -> List[Tuple[str, Any]]:
+        self._text += delta
+        text = self._text
+        done: List[Tuple[str, Any]] = []
+
+        while self._pos < len(text):
+            ch = text[self._pos]
+            i = self._pos
+            self._pos += 1
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._expect == "key_string":
+                        self._key = json.loads(text[self._key_start:i + 1])
+                        self._expect = "colon"
+                    elif self._depth == 1 and self._expect == "string_value":
+                        self._finish(text[self._value_start:i + 1], done)
+                continue
+
+            if ch.isspace():
+                continue
+
+            if self._depth == 0:
+                if ch == "{":
+                    self._depth = 1
+                    self._expect = "key"
+                continue
+
+            if self._depth == 1:
+                if self._expect == "key":
+                    if ch == '"':
+                        self._in_string = True
+                        self._key_start = i
+                        self._expect = "key_string"
+                    elif ch == "}":
+                        self._depth = 0
+                    continue
+                if self._expect == "colon":
+                    if ch == ":":
+                        self._expect = "value"
+                    continue
+                if self._expect == "value":
+                    self._value_start = i
+                    if ch == '"':
+                        self._in_string = True
+                        self._expect = "string_value"
+                    elif ch in "[{":
+                        self._depth += 1
+                        self._expect = "nested_value"
+                    else:
+                        self._expect = "scalar_value"
+                    continue
+                if self._expect == "scalar_value":
+                    if ch in ",}":
+                        self._finish(text[self._value_start:i], done)
+                        self._after_value(ch)
+                    continue
+                if ch == ",":
+                    self._expect = "key"
+                elif ch == "}":
+                    self._depth = 0
+                continue
+
+            # depth >= 2: inside an array/object value
+            if ch == '"':
+                self._in_string = True
+            elif ch in "[{":
+                self._depth += 1
+            elif ch in "]}":
+                self._depth -= 1
+                if self._depth == 1:
+                    self._finish(text[self._value_start:i + 1], done)
+        return done
+
+    def _after_value(self, ch: str) -> None:
+        if ch == ",":
+            self._expect = "key"
+        else:
+            self._depth = 0
+
+    def _finish(self, raw: str, done: List[Tuple[str, Any]]) -> None:
+        try:
+            value = json.loads(raw)
+        except json.JSONDecodeError:
+            value = raw.strip()
+        if self._key is not None:
+            self.fields[self._key] = value
+            done.append((self._key, value))
+        self._key = None
+        self._expect = "comma"
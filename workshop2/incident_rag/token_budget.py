@@ -0,0 +1,154 @@
+# workshop2/incident_rag/token_budget.py
+
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+try:
+    import tiktoken
+except ImportError:  # optional: fall back to a ~4 characters per token estimate
+    tiktoken = None
+
+from .triage_config import PROMPT_CONTEXT_MODE, PROMPT_TOKENIZER_ENCODING
+from .triage_schema import PolicyChunkSchema
+
+TOKEN_COUNTS_NAME = "policy_token_counts.npy"
+
+_encoding: Any = None
+_encoding_failed = tiktoken is None
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding() -> Any:
+    """The tiktoken encoding, or None (estimate) if it is unavailable."""
+    global _encoding, _encoding_failed
+    with _encoding_lock:
+        if _encoding is None and not _encoding_failed:
+            try:
+                # May download the BPE file on first use
+                _encoding = tiktoken.get_encoding(PROMPT_TOKENIZER_ENCODING)
+            except Exception as exc:  # offline, proxy, unknown encoding...
+                _encoding_failed = True  # do not retry on every call
+                print(
+                    f"Could not load tokenizer {PROMPT_TOKENIZER_ENCODING!r} ({exc}); "
+                    "estimating ~4 characters per token"
+                )
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    encoding = _get_encoding()
+    if encoding is None:
+        return max(1, -(-len(text.encode("utf-8")) // 4))
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def format_policy_block(chunk: PolicyChunkSchema, mode: str = PROMPT_CONTEXT_MODE) -> str:
+    """
+    One chunk as it appears in {policy_context}.
+    mode="digest" sends the stored digest (falls back to the full text if
+    the index has none) and names the chunk id for policy_refs.
+    """
+    if mode == "digest" and chunk.digest:
+        return f"[{chunk.document_name} / {chunk.section_path} | ref: {chunk.id}]\n{chunk.digest}"
+    return f"[{chunk.document_name} / {chunk.section_path}]\n{chunk.text}"
+
+
+def chunk_token_count(chunk: PolicyChunkSchema, mode: str = PROMPT_CONTEXT_MODE) -> int:
+    """Tokens of the chunk's prompt block (precomputed at index time when available)."""
+    if mode == "digest" and chunk.digest:
+        if chunk.digest_token_count is None:
+            chunk.digest_token_count = count_tokens(format_policy_block(chunk, "digest"))
+        return chunk.digest_token_count
+    if chunk.token_count is None:
+        chunk.token_count = count_tokens(format_policy_block(chunk, "full"))
+    return chunk.token_count
+
+
+def save_token_counts(chunks: List[PolicyChunkSchema], index_dir: Path) -> None:
+    """Columns: full-text tokens, digest tokens."""
+    counts = np.array(
+        [[chunk_token_count(c, "full"), chunk_token_count(c, "digest")] for c in chunks],
+        dtype=np.int32,
+    ).reshape(-1, 2)
+    np.save(index_dir / TOKEN_COUNTS_NAME, counts)
+
+
+def load_token_counts(chunks: List[PolicyChunkSchema], index_dir: Path) -> None:
+    """Attach the stored token counts to the loaded chunks (counted lazily if missing)."""
+    path = index_dir / TOKEN_COUNTS_NAME
+    if not path.exists():
+        return
+    counts = np.load(path)
+    if counts.shape[0] != len(chunks):
+        return
+    if counts.ndim == 1:  # older indexes: full-text counts only
+        counts = counts[:, None]
+    for chunk, row in zip(chunks, counts.tolist()):
+        chunk.token_count = row[0]
+        if len(row) > 1 and chunk.digest:
+            chunk.digest_token_count = row[1]
+
+
+@dataclass
+class PackedContext:
+    """Chunks chosen for the prompt and what the budget saved."""
+    chunks: List[PolicyChunkSchema]
+    context_tokens: int
+    tokens_saved: int
+    dropped_ids: List[str] = field(default_factory=list)
+    mode: str = "full"
+
+    def to_usage(self) -> Dict[str, Any]:
+        return {
+            "context_mode": self.mode,
+            "context_tokens": self.context_tokens,
+            "context_tokens_saved": self.tokens_saved,
+            "context_chunks": len(self.chunks),
+            "context_chunks_dropped": len(self.dropped_ids),
+        }
+
+
+def pack_policy_context(
+    results: Sequence[Tuple[PolicyChunkSchema, float | None]],
+    token_budget: int,
+    score_gap: float | None = None,
+    mode: str = PROMPT_CONTEXT_MODE,
+) -> PackedContext:
+    """
+    Choose which retrieved chunks go into the prompt (adaptive top-k):
+    - results are (chunk, score), best first;
+    - stop at the first chunk scoring more than score_gap below the previous
+      one (None = no gap rule; only meaningful for cosine scores);
+    - add chunks in score order while they fit in token_budget (a chunk that
+      does not fit is skipped, a smaller one after it may still fit);
+    - the best chunk is always kept so the prompt stays grounded.
+    tokens_saved compares against sending every retrieved chunk in full.
+    """
+    kept: List[PolicyChunkSchema] = []
+    dropped: List[str] = []
+    used = 0
+    saved = 0
+    prev_score: float | None = None
+    gap_hit = False
+
+    for i, (chunk, score) in enumerate(results):
+        tokens = chunk_token_count(chunk, mode)
+        saved += chunk_token_count(chunk, "full") - tokens
+        if score is not None and score_gap is not None and prev_score is not None:
+            gap_hit = gap_hit or (prev_score - score) > score_gap
+        prev_score = score
+
+        if i > 0 and (gap_hit or used + tokens > token_budget):
+            dropped.append(chunk.id)
+            saved += tokens
+            continue
+        kept.append(chunk)
+        used += tokens
+
+    return PackedContext(kept, used, saved, dropped, mode)
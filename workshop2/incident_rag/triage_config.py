@@ -1,5 +1,6 @@
 # workshop2/incident_rag/triage_config.py
 
+import os
 from pathlib import Path
 
 # Root of workshop2
@@ -8,9 +9,10 @@ BASE_DIR = Path(__file__).resolve().parents[1]
 # Paths to Workshop 2 data
 DATA_DIR = BASE_DIR / "data"
 POLICIES_DIR = DATA_DIR / "policies"
-INDEX_DIR = DATA_DIR / "index"
+# Index and logs can be redirected (e.g. the benchmark runs in temp dirs)
+INDEX_DIR = Path(os.getenv("TRIAGE_INDEX_DIR", DATA_DIR / "index"))
 PROMPTS_DIR = DATA_DIR / "prompts"
-LOGS_DIR = DATA_DIR / "logs"
+LOGS_DIR = Path(os.getenv("TRIAGE_LOGS_DIR", DATA_DIR / "logs"))
 
 # Reuse MiniLM embedding model from the kids rag_demo:
 # workshop2/rag_demo/data/models/
@@ -19,10 +21,151 @@ RAG_DEMO_MODELS_DIR = BASE_DIR / "rag_demo" / "data" / "models"
 EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
 EMBEDDING_MODEL_DIR = RAG_DEMO_MODELS_DIR  # reuse same folder
 
+# Content-addressed embedding cache: index rebuilds only embed new/edited chunks
+EMBEDDING_CACHE_ENABLED = True
+EMBEDDING_CACHE_DIR = INDEX_DIR / "embedding_cache"
+EMBEDDING_CACHE_MAX_ENTRIES = 200_000  # oldest entries are evicted beyond this
+
+# Micro-batching for embed_query: concurrent queries arriving within the
+# window are encoded together in one model.encode call
+EMBEDDING_BATCHING_ENABLED = True
+EMBEDDING_BATCH_WINDOW_MS = 3.0
+EMBEDDING_BATCH_MAX_SIZE = 32
+
+# LRU cache of normalized query -> embedding in front of embed_query,
+# persisted to disk so repeated incident descriptions survive restarts
+QUERY_CACHE_ENABLED = True
+QUERY_CACHE_MAX_ENTRIES = 10_000
+QUERY_CACHE_PATH = INDEX_DIR / "query_embedding_cache.npz"  # None = memory only
+
+# On-disk policy index format written by build_and_save_policy_index:
+# - "mmap": raw float32 .npy matrix (memory-mapped on load) + compact metadata
+#           with chunk texts stored as offsets into one UTF-8 blob
+# - "npz":  original compressed .npz + pretty-printed JSON (still readable)
+POLICY_INDEX_FORMAT = "mmap"
+
+# Retrieval backend for search_policies:
+# - "exact": score every chunk (best for small indexes)
+# - "ivf":   approximate search with an IVF index built next to the embeddings;
+#            indexes smaller than ANN_MIN_ROWS still use exact search
+RETRIEVAL_BACKEND = "exact"
+ANN_MIN_ROWS = 20_000
+IVF_NLIST = 0     # number of clusters; 0 = auto (~sqrt(N))
+IVF_NPROBE = 8    # clusters scanned per query: higher = better recall, slower
+
+# Ranking used by search_policies:
+# - "dense":  cosine similarity of MiniLM embeddings only
+# - "hybrid": fuse dense and BM25 keyword rankings with reciprocal rank fusion,
+#             so exact tokens (hostnames, error codes, product names) count
+RETRIEVAL_MODE = "dense"
+HYBRID_CANDIDATES = 50   # depth of each ranking fed into the fusion
+RRF_K = 60               # RRF damping constant: score = sum 1 / (RRF_K + rank)
+
+# Optional second stage for triage_incident: retrieve RERANK_CANDIDATES chunks,
+# rerank them with a local cross-encoder in batches, keep the best top_k.
+# If the next batch would exceed RERANK_BUDGET_MS, the stage-one order is kept.
+RERANK_ENABLED = False
+RERANKER_MODEL_NAME = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+RERANK_CANDIDATES = 20
+RERANK_BATCH_SIZE = 8
+RERANK_BUDGET_MS = 150.0
+
+# Each build is written to INDEX_DIR/versions/<id>/ and published by atomically
+# replacing INDEX_DIR/CURRENT. Running retrievers poll CURRENT and hot-swap.
+INDEX_KEEP_VERSIONS = 3              # older version folders are deleted
+INDEX_RELOAD_CHECK_SECONDS = 5.0     # 0 = never reload a loaded index
+
+# LRU cache of search_policies results keyed by (normalized query, top_k,
+# filters, mode, index version); cleared automatically when a new index
+# version is loaded
+RESULT_CACHE_ENABLED = True
+RESULT_CACHE_MAX_ENTRIES = 2_000
+
+# Semantic triage cache: reuse a past LLM triage result (also warmed from
+# triage_log.jsonl) when a new incident is a near-duplicate of a recent one
+# (cosine >= threshold) AND retrieved exactly the same policy chunks.
+SEMANTIC_CACHE_ENABLED = False
+SEMANTIC_CACHE_THRESHOLD = 0.95
+SEMANTIC_CACHE_TTL_SECONDS = 15 * 60
+SEMANTIC_CACHE_MAX_ENTRIES = 5_000
+SEMANTIC_CACHE_BYPASS_SEVERITIES = ("CRISIS",)  # always re-triaged by the LLM
+
+# Prompt assembly: retrieved chunks are packed best-first into this many
+# {policy_context} tokens; a chunk scoring more than PROMPT_SCORE_GAP (cosine)
+# below the previous one ends the context. Saved tokens go to the audit usage.
+PROMPT_CONTEXT_TOKEN_BUDGET = 1_500
+PROMPT_SCORE_GAP = 0.15              # None = keep every chunk that fits
+PROMPT_TOKENIZER_ENCODING = "o200k_base"  # tiktoken encoding (estimate if not installed)
+
+# What {policy_context} contains for each chunk:
+# - "full":   the whole policy section
+# - "digest": the extracted rules / severity criteria stored at index time
+#             (header keeps the chunk id so policy_refs still resolve)
+PROMPT_CONTEXT_MODE = "full"
+DIGEST_MAX_CHARS = 600
+
+# triage_incidents_async: max concurrent triage requests per event loop
+ASYNC_MAX_IN_FLIGHT = 32
+
+# bulk_triage: incidents embedded + retrieved per batch, LLM calls in flight
+BULK_BATCH_SIZE = 64
+BULK_CONCURRENCY = 16
+
+# Per-stage timing spans (see triage_metrics.py). Histograms are kept
+# in-process (a few microseconds per span); exporting is opt-in.
+METRICS_ENABLED = True
+METRICS_SPANS_JSONL = False                         # one JSON line of spans per request
+METRICS_SPANS_PATH = LOGS_DIR / "triage_spans.jsonl"
+METRICS_HTTP_HOST = "127.0.0.1"                     # start_metrics_server(): /metrics
+METRICS_HTTP_PORT = 9108
+
+# Audit log writer (see audit_writer.py): records are queued and appended
+# in batches by a background thread, off the request path
+AUDIT_BUFFERED = True
+AUDIT_FLUSH_INTERVAL_SECONDS = 0.2        # longest a record waits in the queue
+AUDIT_MAX_BATCH = 512                     # lines per write()
+AUDIT_QUEUE_MAX = 10_000                  # requests block if the writer is this far behind
+AUDIT_FSYNC = "batch"                     # "batch", "interval" or "never"
+AUDIT_FSYNC_INTERVAL_SECONDS = 1.0        # for AUDIT_FSYNC = "interval"
+AUDIT_ROTATE_MAX_BYTES = 64 * 1024 * 1024  # rotate at this size (0 = never)
+AUDIT_ROTATE_DAILY = True                 # ...and when the UTC day changes
+AUDIT_COMPRESS_ROTATED = True             # gzip rotated segments (triage_log-<time>.jsonl.gz)
+
 # LLM configuration (adjust to your environment)
 # For Azure OpenAI, this is typically your deployment name
 TRIAGE_LLM_MODEL = "gpt-4.1-mini"  # placeholder; replace with your deployment name
 
+# LLM backend: "azure" (default) or "stub", the local stand-in server for offline
+# load/latency tests (python -m workshop2.incident_rag.llm_stub_server)
+LLM_BACKEND = os.getenv("TRIAGE_LLM_BACKEND", "azure")
+LLM_STUB_HOST = "127.0.0.1"
+LLM_STUB_PORT = 8089
+LLM_STUB_URL = os.getenv("TRIAGE_LLM_STUB_URL", f"http://{LLM_STUB_HOST}:{LLM_STUB_PORT}")
+LLM_STUB_API_VERSION = "2024-06-01"
+LLM_STUB_LATENCY_MS = 800.0    # median stub response time
+LLM_STUB_LATENCY_SIGMA = 0.4   # log-normal spread (p95 is about 1.9x the median)
+LLM_STUB_ERROR_RATE = 0.0      # fraction of injected 429/500/503 responses
+
+# Shared HTTP connection pool for the LLM clients (see llm_client.py)
+LLM_POOL_MAX_CONNECTIONS = 64
+LLM_POOL_MAX_KEEPALIVE = 32
+LLM_KEEPALIVE_EXPIRY_SECONDS = 60.0
+LLM_CONNECT_TIMEOUT_SECONDS = 5.0
+LLM_TIMEOUT_SECONDS = 60.0
+
+# Retries, hedging and circuit breaker around the triage call (see llm_resilience.py)
+LLM_ATTEMPT_TIMEOUT_SECONDS = 30.0     # deadline for each attempt (retries/hedges get their own)
+LLM_MAX_RETRIES = 2                    # extra attempts after a timeout / 429 / 5xx
+LLM_RETRY_BACKOFF_SECONDS = 0.5        # jittered exponential backoff: base...
+LLM_RETRY_BACKOFF_MAX_SECONDS = 8.0    # ...and cap
+LLM_HEDGE_ENABLED = False              # duplicate slow requests (cuts tail latency, costs tokens)
+LLM_HEDGE_QUANTILE = 0.95              # hedge after this quantile of recent call latencies
+LLM_HEDGE_DEFAULT_DELAY_SECONDS = 5.0  # used until LLM_HEDGE_MIN_SAMPLES calls have been seen
+LLM_HEDGE_MIN_DELAY_SECONDS = 0.5
+LLM_HEDGE_MIN_SAMPLES = 20
+LLM_BREAKER_FAILURE_THRESHOLD = 5      # consecutive failures that open the circuit
+LLM_BREAKER_RESET_SECONDS = 30.0       # fail fast this long before probing again
+
 # Ensure core directories exist
 for d in [POLICIES_DIR, INDEX_DIR, PROMPTS_DIR, LOGS_DIR]:
     d.mkdir(parents=True, exist_ok=True)
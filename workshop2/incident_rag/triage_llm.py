@@ -2,49 +2,246 @@
 
 from __future__ import annotations
 
+import asyncio
+import inspect
 import json
 import os
-from typing import Any, Dict, List
-from openai import AzureOpenAI
-from common.bc_config import get_api_credentials, get_model_deployment_name
-from .triage_config import TRIAGE_LLM_MODEL
+import time
+from typing import Any, AsyncIterator, Callable, Dict, List
+from openai import AsyncAzureOpenAI, AzureOpenAI
+from common.bc_config import get_model_deployment_name
+from .triage_config import LLM_BACKEND, TRIAGE_LLM_MODEL
+from .llm_client import get_llm_client, get_async_llm_client
+from .llm_resilience import get_llm_caller
+from .streaming_json import JSONFieldStream
+
+# on_field(name, value): called once per top-level field of the JSON answer
+FieldCallback = Callable[[str, Any], Any]
 
 
 def _get_azure_client() -> AzureOpenAI:
-    """Create and return an AzureOpenAI client using credentials from config."""
-    creds = get_api_credentials()   
+    """Return the shared AzureOpenAI client (pooled keep-alive connections)."""
+    return get_llm_client()
+
+
+def _get_async_azure_client() -> AsyncAzureOpenAI:
+    """Same as _get_azure_client, for use with await."""
+    return get_async_llm_client()
+
 
-    return AzureOpenAI(**creds)
+def _request_kwargs(
+    messages: List[Dict[str, Any]],
+    temperature: float,
+    max_tokens: int,
+) -> Dict[str, Any]:
+    return {
+        # Azure deployment name (the stub server accepts any)
+        "model": TRIAGE_LLM_MODEL if LLM_BACKEND == "stub" else get_model_deployment_name(),
+        "messages": messages,
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        "response_format": {"type": "json_object"},
+    }
 
 
 def call_triage_llm(
     messages: List[Dict[str, Any]],
     temperature: float = 0.2,
     max_tokens: int = 512,
+    hedge: bool | None = None,
 ) -> Dict[str, Any]:
     """
     Call the LLM with JSON-only output to get a structured triage result.
 
+    Each attempt has its own deadline; timeouts, 429s and 5xx are retried
+    with jittered backoff, and hedge (default LLM_HEDGE_ENABLED) sends a
+    duplicate request when the first is slower than the recent p95.
+    Raises CircuitOpenError without calling the LLM while it is failing.
+
     Returns:
         {
           "data": <parsed JSON object from the model>,
           "usage": {
              "prompt_tokens": ...,
              "completion_tokens": ...,
-             "total_tokens": ...
+             "total_tokens": ...,
+             "resilience": {"attempts": ..., "retries": ..., "hedges": ..., "hedge_wins": ...}
           }
         }
     """
     client = _get_azure_client()
+    kwargs = _request_kwargs(messages, temperature, max_tokens)
+
+    response, stats = get_llm_caller().call(
+        lambda timeout: client.chat.completions.create(**kwargs, timeout=timeout),
+        hedge=hedge,
+    )
+    result = _parse_response(response)
+    result["usage"]["resilience"] = stats
+    return result
+
+
+async def call_triage_llm_async(
+    messages: List[Dict[str, Any]],
+    temperature: float = 0.2,
+    max_tokens: int = 512,
+    hedge: bool | None = None,
+) -> Dict[str, Any]:
+    """
+    Async version of call_triage_llm (same arguments and result).
+    Many calls can be in flight at once from one event loop.
+    """
+    client = _get_async_azure_client()
+    kwargs = _request_kwargs(messages, temperature, max_tokens)
+
+    response, stats = await get_llm_caller().call_async(
+        lambda timeout: client.chat.completions.create(**kwargs, timeout=timeout),
+        hedge=hedge,
+    )
+    result = _parse_response(response)
+    result["usage"]["resilience"] = stats
+    return result
+
+
+def call_triage_llm_stream(
+    messages: List[Dict[str, Any]],
+    on_field: FieldCallback | None = None,
+    temperature: float = 0.2,
+    max_tokens: int = 512,
+) -> Dict[str, Any]:
+    """
+    Streaming version of call_triage_llm (same result).
+
+    The JSON answer is parsed while it is generated and on_field(name, value)
+    fires as soon as each top-level field is complete, e.g. "severity" can
+    page someone before "next_steps" has been written. usage also records
+    when each field arrived ("field_ms", milliseconds since the request).
+
+    Failures are retried like call_triage_llm only until the first field
+    has been delivered (no hedging: fields must not fire twice).
+    """
+    client = _get_azure_client()
+    kwargs = _request_kwargs(messages, temperature, max_tokens)
+    start = time.perf_counter()
+    emitted: List[str] = []
+
+    def attempt(timeout: float) -> Dict[str, Any]:
+        stream = client.chat.completions.create(
+            **kwargs, stream=True, stream_options={"include_usage": True}, timeout=timeout
+        )
+        state = _StreamState(start)
+        for chunk in stream:
+            for name, value in state.feed(chunk):
+                emitted.append(name)
+                if on_field is not None:
+                    on_field(name, value)
+        return state.result()
+
+    result, stats = get_llm_caller().call(attempt, hedge=False, retry_if=lambda exc: not emitted)
+    result["usage"]["resilience"] = stats
+    return result
+
+
+async def call_triage_llm_stream_async(
+    messages: List[Dict[str, Any]],
+    on_field: FieldCallback | None = None,
+    temperature: float = 0.2,
+    max_tokens: int = 512,
+) -> Dict[str, Any]:
+    """
+    Async version of call_triage_llm_stream. on_field may be a plain
+    function or a coroutine function (awaited before reading on).
+    As in the sync version, the attempt timeout covers the request up to
+    the first chunk; after that only the client's read timeout applies, so
+    long generations and slow callbacks are not cut off.
+    """
+    client = _get_async_azure_client()
+    kwargs = _request_kwargs(messages, temperature, max_tokens)
+    start = time.perf_counter()
+    emitted: List[str] = []
 
-    response = client.chat.completions.create(
-        model=get_model_deployment_name(),  # Azure deployment name
-        messages=messages,
-        temperature=temperature,
-        max_tokens=max_tokens,
-        response_format={"type": "json_object"},
+    async def attempt(timeout: float) -> Dict[str, Any]:
+        deadline = time.perf_counter() + timeout
+        stream = await asyncio.wait_for(
+            client.chat.completions.create(
+                **kwargs, stream=True, stream_options={"include_usage": True}, timeout=timeout
+            ),
+            timeout,
+        )
+        state = _StreamState(start)
+        async for chunk in _first_chunk_within(stream, deadline - time.perf_counter()):
+            for name, value in state.feed(chunk):
+                emitted.append(name)
+                if on_field is not None:
+                    ret = on_field(name, value)
+                    if inspect.isawaitable(ret):
+                        await ret
+        return state.result()
+
+    result, stats = await get_llm_caller().call_async(
+        attempt, hedge=False, retry_if=lambda exc: not emitted, bound_attempt=False
     )
+    result["usage"]["resilience"] = stats
+    return result
+
+
+async def _first_chunk_within(stream: Any, timeout: float) -> AsyncIterator[Any]:
+    """Yield the stream's chunks; only the first one has to arrive within timeout."""
+    chunks = stream.__aiter__()
+    try:
+        chunk = await asyncio.wait_for(chunks.__anext__(), max(0.0, timeout))
+    except StopAsyncIteration:
+        return
+    yield chunk
+    async for chunk in chunks:
+        yield chunk
+
+
+class _StreamState:
+    """Accumulates streamed chunks into the call_triage_llm result."""
+
+    def __init__(self, start: float) -> None:
+        self.start = start
+        self.parser = JSONFieldStream()
+        self.parts: List[str] = []
+        self.usage: Any = None
+        self.first_token_ms: float | None = None
+        self.field_ms: Dict[str, float] = {}
+
+    def feed(self, chunk: Any) -> List[Any]:
+        if getattr(chunk, "usage", None) is not None:
+            self.usage = chunk.usage  # final chunk (include_usage), no choices
+        if not chunk.choices:
+            return []
+        delta = chunk.choices[0].delta.content
+        if not delta:
+            return []
+        elapsed_ms = round((time.perf_counter() - self.start) * 1000, 1)
+        if self.first_token_ms is None:
+            self.first_token_ms = elapsed_ms
+        self.parts.append(delta)
+        fields = self.parser.feed(delta)
+        for name, _ in fields:
+            self.field_ms[name] = elapsed_ms
+        return fields
+
+    def result(self) -> Dict[str, Any]:
+        content = "".join(self.parts) or "{}"
+        try:
+            data = json.loads(content)
+        except json.JSONDecodeError:
+            data = {"raw_content": content}
+        usage = {
+            "prompt_tokens": getattr(self.usage, "prompt_tokens", None),
+            "completion_tokens": getattr(self.usage, "completion_tokens", None),
+            "total_tokens": getattr(self.usage, "total_tokens", None),
+            "first_token_ms": self.first_token_ms,
+            "field_ms": self.field_ms,
+        }
+        return {"data": data, "usage": usage}
+
 
+def _parse_response(response: Any) -> Dict[str, Any]:
     choice = response.choices[0]
     content = choice.message.content or "{}"
     try:
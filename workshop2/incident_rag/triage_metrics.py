@@ -0,0 +1,265 @@
+# workshop2/incident_rag/triage_metrics.py
+
+from __future__ import annotations
+
+import bisect
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from .audit_writer import get_jsonl_writer
+from .triage_config import (
+    METRICS_ENABLED,
+    METRICS_SPANS_JSONL,
+    METRICS_SPANS_PATH,
+    METRICS_HTTP_HOST,
+    METRICS_HTTP_PORT,
+)
+
+# Histogram bucket upper bounds in seconds (50 µs ... 60 s, roughly x2.5 steps)
+BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+
+class _Histogram:
+    __slots__ = ("counts", "total", "count", "errors")
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(BUCKETS) + 1)  # last slot = +Inf
+        self.total = 0.0
+        self.count = 0
+        self.errors = 0
+
+
+class MetricsRegistry:
+    """In-process per-stage latency histograms (cumulative since start/reset)."""
+
+    def __init__(self) -> None:
+        self._histograms: Dict[str, _Histogram] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float, error: bool = False) -> None:
+        i = bisect.bisect_left(BUCKETS, seconds)
+        with self._lock:
+            h = self._histograms.get(stage)
+            if h is None:
+                h = self._histograms[stage] = _Histogram()
+            h.counts[i] += 1
+            h.total += seconds
+            h.count += 1
+            if error:
+                h.errors += 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Per stage: count, errors, mean_ms and approximate p50/p90/p99 (bucket bounds)."""
+        with self._lock:
+            items = [(k, list(h.counts), h.total, h.count, h.errors) for k, h in self._histograms.items()]
+        out: Dict[str, Dict[str, Any]] = {}
+        for stage, counts, total, count, errors in sorted(items):
+            out[stage] = {
+                "count": count,
+                "errors": errors,
+                "mean_ms": round(total / count * 1000, 3) if count else None,
+                **{f"p{q}_ms": _quantile_ms(counts, count, q / 100) for q in (50, 90, 99)},
+            }
+        return out
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            items = [(k, list(h.counts), h.total, h.count, h.errors) for k, h in self._histograms.items()]
+        lines = [
+            "# HELP triage_stage_duration_seconds Time spent in each triage stage.",
+            "# TYPE triage_stage_duration_seconds histogram",
+        ]
+        for stage, counts, total, count, _ in sorted(items):
+            cumulative = 0
+            for bound, n in zip(BUCKETS + (float("inf"),), counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'triage_stage_duration_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+            lines.append(f'triage_stage_duration_seconds_sum{{stage="{stage}"}} {total}')
+            lines.append(f'triage_stage_duration_seconds_count{{stage="{stage}"}} {count}')
+        lines += [
+            "# HELP triage_stage_errors_total Stages that ended with an exception.",
+            "# TYPE triage_stage_errors_total counter",
+        ]
+        for stage, _, _, _, errors in sorted(items):
+            lines.append(f'triage_stage_errors_total{{stage="{stage}"}} {errors}')
+        return "\n".join(lines) + "\n"
+
+
+def _quantile_ms(counts: List[int], count: int, q: float) -> float | None:
+    if not count:
+        return None
+    target = q * count
+    seen = 0
+    for bound, n in zip(BUCKETS, counts):
+        seen += n
+        if seen >= target:
+            return bound * 1000
+    return None  # beyond the last bucket
+
+
+_registry = MetricsRegistry()
+
+
+def get_metrics_registry() -> MetricsRegistry:
+    return _registry
+
+
+class Trace:
+    """Spans of one request; the trace_id is also written to the audit record."""
+    __slots__ = ("trace_id", "start", "spans")
+
+    def __init__(self) -> None:
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.start = time.perf_counter()
+        self.spans: List[Tuple[str, float, float]] = []  # (stage, start_ms, duration_ms)
+
+    def timings_ms(self) -> Dict[str, float]:
+        """Total duration per stage (a stage may run more than once)."""
+        out: Dict[str, float] = {}
+        for stage, _, duration in self.spans:
+            out[stage] = round(out.get(stage, 0.0) + duration, 3)
+        return out
+
+
+_current_trace: contextvars.ContextVar[Trace | None] = contextvars.ContextVar(
+    "triage_trace", default=None
+)
+
+
+class _Span:
+    __slots__ = ("stage", "t0")
+
+    def __init__(self, stage: str) -> None:
+        self.stage = stage
+
+    def __enter__(self) -> "_Span":
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        t1 = time.perf_counter()
+        _registry.observe(self.stage, t1 - self.t0, error=exc_type is not None)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.spans.append(
+                (self.stage, round((self.t0 - trace.start) * 1000, 3), round((t1 - self.t0) * 1000, 3))
+            )
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        return None
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def span(stage: str) -> Any:
+    """
+    Time a block:  with span("llm"): ...
+    Observed into the stage histogram and attached to the current trace.
+    A shared no-op when METRICS_ENABLED is False.
+    """
+    return _Span(stage) if METRICS_ENABLED else _NOOP_SPAN
+
+
+class start_trace:
+    """
+    with start_trace() as trace: ...
+    Spans inside (also in asyncio tasks and asyncio.to_thread calls started
+    from here) are recorded on trace. Nested use joins the outer trace.
+    With METRICS_SPANS_JSONL the finished trace is appended to
+    METRICS_SPANS_PATH as one JSON line.
+    """
+
+    def __init__(self) -> None:
+        self._token: contextvars.Token | None = None
+        self.trace: Trace | None = None
+
+    def __enter__(self) -> Trace:
+        outer = _current_trace.get()
+        if outer is not None:
+            self.trace = outer
+            return outer
+        self.trace = Trace()
+        self._token = _current_trace.set(self.trace)
+        return self.trace
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        if self._token is None:
+            return
+        _current_trace.reset(self._token)
+        if METRICS_SPANS_JSONL and self.trace is not None:
+            _write_trace(self.trace, error=exc_type is not None)
+
+
+def current_trace_id() -> str | None:
+    trace = _current_trace.get()
+    return trace.trace_id if trace is not None else None
+
+
+def _write_trace(trace: Trace, error: bool) -> None:
+    record = {
+        "trace_id": trace.trace_id,
+        "error": error,
+        "spans": [{"stage": s, "start_ms": st, "duration_ms": d} for s, st, d in trace.spans],
+    }
+    get_jsonl_writer(METRICS_SPANS_PATH).write(json.dumps(record) + "\n")
+
+
+def write_prometheus_textfile(path: Path) -> None:
+    """Atomically write the metrics for node_exporter's textfile collector."""
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_text(_registry.render_prometheus(), encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        path = self.path.split("?", 1)[0]
+        if path == "/metrics":
+            body, ctype = _registry.render_prometheus(), "text/plain; version=0.0.4"
+        elif path == "/metrics.json":
+            body, ctype = json.dumps(_registry.snapshot()), "application/json"
+        else:
+            self.send_error(404)
+            return
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start_metrics_server(host: str = METRICS_HTTP_HOST, port: int = METRICS_HTTP_PORT) -> ThreadingHTTPServer:
+    """Serve /metrics (Prometheus) and /metrics.json from a background thread."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="triage-metrics", daemon=True).start()
+    print(f"Serving triage metrics on http://{host}:{server.server_port}/metrics")
+    return server
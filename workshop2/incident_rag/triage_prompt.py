@@ -5,8 +5,9 @@ from __future__ import annotations
 from pathlib import Path
 from typing import List, Dict, Any
 
-from .triage_config import PROMPTS_DIR
+from .triage_config import PROMPTS_DIR, PROMPT_CONTEXT_MODE
 from .triage_schema import PolicyChunkSchema
+from .token_budget import format_policy_block
 
 _SYSTEM_PROMPT_NAME = "triage_system_prompt_template.txt"
 _USER_PROMPT_NAME = "triage_user_prompt_template.txt"
@@ -39,15 +40,15 @@ def get_user_prompt_template() -> str:
     return _cached_user
 
 
-def build_policy_context(chunks: List[PolicyChunkSchema]) -> str:
+def build_policy_context(
+    chunks: List[PolicyChunkSchema],
+    mode: str = PROMPT_CONTEXT_MODE,
+) -> str:
     """
     Convert top policy chunks into a plain-text context block.
+    mode="digest" sends each chunk's precomputed digest instead of the full section.
     """
-    parts: List[str] = []
-    for c in chunks:
-        header = f"[{c.document_name} / {c.section_path}]"
-        parts.append(f"{header}\n{c.text}")
-    return "\n\n".join(parts)
+    return "\n\n".join(format_policy_block(c, mode) for c in chunks)
 
 
 def build_triage_messages(
@@ -1,7 +1,7 @@
 # workshop2/incident_rag/triage_schema.py
 
 from dataclasses import dataclass
-from typing import List
+from typing import List, Optional
 
 
 @dataclass
@@ -11,6 +11,9 @@ class PolicyChunkSchema:
     document_name: str
     section_path: str
     text: str
+    token_count: Optional[int] = None  # prompt tokens of this chunk, precomputed at index time
+    digest: Optional[str] = None  # compressed rules/criteria (policy_digest), built at index time
+    digest_token_count: Optional[int] = None
 
 
 @dataclass
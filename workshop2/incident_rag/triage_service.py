@@ -2,18 +2,142 @@
 
 from __future__ import annotations
 
-from typing import List
+import asyncio
+import inspect
+from dataclasses import dataclass
+from typing import Any, Dict, List
 
 from .triage_schema import PolicyChunkSchema, TriageResultSchema
 from .policy_retriever import search_policies
 from .triage_prompt import build_triage_messages
-from .triage_llm import call_triage_llm
-from .audit_log import append_triage_record
+from .triage_llm import (
+    FieldCallback,
+    call_triage_llm,
+    call_triage_llm_async,
+    call_triage_llm_stream,
+    call_triage_llm_stream_async,
+)
+from .audit_log import LOG_PATH, append_triage_record, append_triage_record_async
+from .reranker import rerank_policies
+from .embedding_provider import embed_query, embed_queries
+from .semantic_cache import SemanticCacheHit, SemanticTriageCache
+from .token_budget import PackedContext, pack_policy_context
+from .triage_metrics import Trace, span, start_trace
+from .triage_config import (
+    RETRIEVAL_MODE,
+    RERANK_ENABLED,
+    RERANK_CANDIDATES,
+    SEMANTIC_CACHE_ENABLED,
+    SEMANTIC_CACHE_THRESHOLD,
+    SEMANTIC_CACHE_TTL_SECONDS,
+    SEMANTIC_CACHE_MAX_ENTRIES,
+    SEMANTIC_CACHE_BYPASS_SEVERITIES,
+    ASYNC_MAX_IN_FLIGHT,
+    PROMPT_CONTEXT_TOKEN_BUDGET,
+    PROMPT_SCORE_GAP,
+)
+
+_semantic_cache: SemanticTriageCache | None = None
+
+
+def get_semantic_cache() -> SemanticTriageCache:
+    """Return the process-wide semantic triage cache, warmed from the audit log."""
+    global _semantic_cache
+    if _semantic_cache is None:
+        cache = SemanticTriageCache(
+            SEMANTIC_CACHE_THRESHOLD,
+            SEMANTIC_CACHE_TTL_SECONDS,
+            SEMANTIC_CACHE_MAX_ENTRIES,
+            SEMANTIC_CACHE_BYPASS_SEVERITIES,
+        )
+        loaded = cache.warm_from_log(LOG_PATH, embed_queries)
+        if loaded:
+            print(f"Semantic triage cache: loaded {loaded} recent results from {LOG_PATH}")
+        _semantic_cache = cache
+    return _semantic_cache
+
+
+@dataclass
+class _TriagePlan:
+    """Everything decided before the LLM call (retrieval + semantic cache)."""
+    policy_chunks: List[PolicyChunkSchema]   # retrieved
+    context: PackedContext                   # what fits in the prompt budget
+    retrieval_info: Dict[str, Any] | None
+    cache: SemanticTriageCache | None
+    q_vec: Any = None
+    hit: SemanticCacheHit | None = None
+
+    def retrieved_ids(self) -> List[str]:
+        """Semantic cache key: every retrieved chunk, including ones packing dropped."""
+        return [c.id for c in self.policy_chunks]
+
+
+def _prepare_triage(
+    incident_text: str,
+    top_k: int,
+    rerank: bool | None,
+    use_cache: bool | None,
+) -> _TriagePlan:
+    # 1) Retrieve policies
+    retrieval_info: Dict[str, Any] | None = None
+    # The gap rule needs results in descending cosine order; hybrid search
+    # returns them in RRF order (a BM25-promoted chunk may score lower)
+    score_gap = PROMPT_SCORE_GAP if RETRIEVAL_MODE != "hybrid" else None
+    if RERANK_ENABLED if rerank is None else rerank:
+        with span("retrieve"):
+            candidates = search_policies(incident_text, top_k=max(top_k, RERANK_CANDIDATES))
+        with span("rerank"):
+            reranked = rerank_policies(incident_text, candidates, top_k=top_k)
+        policy_results = reranked.hits
+        retrieval_info = {"rerank": reranked.to_log()}
+        if reranked.reranked:
+            score_gap = None  # cross-encoder scores are not cosine similarities
+    else:
+        with span("retrieve"):
+            policy_results = search_policies(incident_text, top_k=top_k)
+    policy_chunks: List[PolicyChunkSchema] = [pr[0] for pr in policy_results]
+
+    # 2) Fit the best chunks into the prompt token budget (adaptive top-k)
+    with span("pack_context"):
+        context = pack_policy_context(policy_results, PROMPT_CONTEXT_TOKEN_BUDGET, score_gap)
+    plan = _TriagePlan(policy_chunks, context, retrieval_info, None)
+
+    if use_cache is None:
+        use_cache = SEMANTIC_CACHE_ENABLED
+    if use_cache:
+        with span("semantic_cache"):
+            plan.cache = get_semantic_cache()
+            plan.q_vec = embed_query(incident_text)  # usually a query-cache hit after retrieval
+            plan.hit = plan.cache.lookup(plan.q_vec, plan.retrieved_ids())
+    return plan
+
+
+def _with_context_usage(llm_result: Dict[str, Any], context: PackedContext) -> Dict[str, Any]:
+    """Add prompt-budget numbers (incl. tokens saved) to the audit usage."""
+    usage = dict(llm_result.get("usage") or {})
+    usage.update(context.to_usage())
+    return {**llm_result, "usage": usage}
+
+
+def _trace_log(trace: Trace) -> Dict[str, Any]:
+    """audit_log kwargs for the request's trace."""
+    return {"trace_id": trace.trace_id, "timings_ms": trace.timings_ms()}
+
+
+def _cache_hit_log(hit: SemanticCacheHit) -> Dict[str, Any]:
+    return {
+        "hit": True,
+        "similarity": round(hit.similarity, 4),
+        "age_seconds": round(hit.age_seconds, 1),
+    }
 
 
 def triage_incident(
     incident_text: str,
     top_k: int = 3,
+    rerank: bool | None = None,
+    use_cache: bool | None = None,
+    on_field: FieldCallback | None = None,
 ) -> TriageResultSchema:
     """
     High-level API:
@@ -22,22 +146,145 @@ def triage_incident(
     - call LLM for structured JSON
     - log the decision
     - return TriageResultSchema
+
+    rerank (default RERANK_ENABLED) adds a cross-encoder second stage over
+    RERANK_CANDIDATES stage-one hits, bounded by RERANK_BUDGET_MS.
+
+    use_cache (default SEMANTIC_CACHE_ENABLED) returns a recent triage result
+    without calling the LLM if the incident is a near-duplicate of a past one
+    with the same retrieved policy chunks (see semantic_cache).
+
+    on_field(name, value) streams the LLM answer and is called as soon as
+    each field is complete ("summary" and "severity" come first), so
+    escalation can start before the rest is generated. On a cache hit it
+    is called for each cached field right away.
+
+    Each stage is timed (see triage_metrics); the trace id and stage
+    timings are written to the audit record.
     """
-    # 1) Retrieve policies
-    policy_results = search_policies(incident_text, top_k=top_k)
-    policy_chunks: List[PolicyChunkSchema] = [pr[0] for pr in policy_results]
+    with start_trace() as trace, span("triage"):
+        plan = _prepare_triage(incident_text, top_k, rerank, use_cache)
+        if plan.hit is not None:
+            if on_field is not None:
+                for name, value in plan.hit.data.items():
+                    on_field(name, value)
+            with span("audit_log"):
+                append_triage_record(
+                    incident_text,
+                    plan.context.chunks,
+                    {"data": plan.hit.data, "usage": None},
+                    retrieval=plan.retrieval_info,
+                    retrieved_ids=plan.retrieved_ids(),
+                    semantic_cache=_cache_hit_log(plan.hit),
+                    **_trace_log(trace),
+                )
+            return _to_triage_result(plan.hit.data)
+
+        # 3) Build messages
+        with span("build_prompt"):
+            messages = build_triage_messages(incident_text, plan.context.chunks)
+
+        # 4) Call LLM
+        with span("llm"):
+            if on_field is not None:
+                llm_result = call_triage_llm_stream(messages, on_field)
+            else:
+                llm_result = call_triage_llm(messages)
+        if plan.cache is not None:
+            plan.cache.add(plan.q_vec, plan.retrieved_ids(), llm_result.get("data"))
+
+        # 5) Log
+        with span("audit_log"):
+            append_triage_record(
+                incident_text,
+                plan.context.chunks,
+                _with_context_usage(llm_result, plan.context),
+                retrieval=plan.retrieval_info,
+                retrieved_ids=plan.retrieved_ids(),
+                **_trace_log(trace),
+            )
+
+        # 6) Map to TriageResultSchema
+        return _to_triage_result(llm_result.get("data") or {})
+
+
+async def triage_incident_async(
+    incident_text: str,
+    top_k: int = 3,
+    rerank: bool | None = None,
+    use_cache: bool | None = None,
+    on_field: FieldCallback | None = None,
+) -> TriageResultSchema:
+    """
+    Async version of triage_incident (same arguments and result;
+    on_field may also be a coroutine function).
+
+    Embedding + search run in a worker thread, the LLM call uses the async
+    client and the audit write is offloaded, so the event loop is free
+    while the model is thinking.
+    """
+    with start_trace() as trace, span("triage"):
+        # to_thread copies the context, so the worker's spans join this trace
+        plan = await asyncio.to_thread(_prepare_triage, incident_text, top_k, rerank, use_cache)
+        if plan.hit is not None:
+            if on_field is not None:
+                for name, value in plan.hit.data.items():
+                    ret = on_field(name, value)
+                    if inspect.isawaitable(ret):
+                        await ret
+            with span("audit_log"):
+                await append_triage_record_async(
+                    incident_text,
+                    plan.context.chunks,
+                    {"data": plan.hit.data, "usage": None},
+                    retrieval=plan.retrieval_info,
+                    retrieved_ids=plan.retrieved_ids(),
+                    semantic_cache=_cache_hit_log(plan.hit),
+                    **_trace_log(trace),
+                )
+            return _to_triage_result(plan.hit.data)
+
+        with span("build_prompt"):
+            messages = build_triage_messages(incident_text, plan.context.chunks)
+        with span("llm"):
+            if on_field is not None:
+                llm_result = await call_triage_llm_stream_async(messages, on_field)
+            else:
+                llm_result = await call_triage_llm_async(messages)
+        if plan.cache is not None:
+            plan.cache.add(plan.q_vec, plan.retrieved_ids(), llm_result.get("data"))
+
+        with span("audit_log"):
+            await append_triage_record_async(
+                incident_text,
+                plan.context.chunks,
+                _with_context_usage(llm_result, plan.context),
+                retrieval=plan.retrieval_info,
+                retrieved_ids=plan.retrieved_ids(),
+                **_trace_log(trace),
+            )
+        return _to_triage_result(llm_result.get("data") or {})
+
+
+async def triage_incidents_async(
+    incident_texts: List[str],
+    max_in_flight: int = ASYNC_MAX_IN_FLIGHT,
+    **kwargs: Any,
+) -> List[TriageResultSchema]:
+    """
+    Triage many incidents concurrently from one event loop, keeping at most
+    max_in_flight requests open at a time. Results are in input order.
+    """
+    semaphore = asyncio.Semaphore(max(1, max_in_flight))
 
-    # 2) Build messages
-    messages = build_triage_messages(incident_text, policy_chunks)
+    async def _one(text: str) -> TriageResultSchema:
+        async with semaphore:
+            return await triage_incident_async(text, **kwargs)
 
-    # 3) Call LLM
-    llm_result = call_triage_llm(messages)
+    return list(await asyncio.gather(*(_one(t) for t in incident_texts)))
 
-    # 4) Log
-    append_triage_record(incident_text, policy_chunks, llm_result)
 
-    # 5) Map to TriageResultSchema
-    data = llm_result.get("data") or {}
+def _to_triage_result(data: Dict[str, Any]) -> TriageResultSchema:
     triage = TriageResultSchema(
         summary=data.get("summary", ""),
         severity=data.get("severity", ""),
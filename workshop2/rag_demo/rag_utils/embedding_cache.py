@@ -0,0 +1,113 @@
+"""
+embedding_cache.py
+
+A small "memory box" for embeddings.
+
+For kids:
+- "Turning a card into its secret number code takes time."
+- "So we write every code we make into a box on disk."
+- "Next time we see the exact same card, we just read the code from the box!"
+
+How it works:
+- Each card text gets a fingerprint: sha256(model name + text).
+- The embedding is saved as <fingerprint>.npy inside EMBEDDING_CACHE_DIR.
+- If the box gets too full, the codes we have not used for the longest
+  time are thrown away first.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+
+class EmbeddingCache:
+    """Content-addressed on-disk cache: (model name, text) → embedding."""
+
+    def __init__(self, cache_dir: Path, model_name: str, max_entries: int) -> None:
+        self.model_name = model_name
+        self.cache_dir = Path(cache_dir) / model_name.replace("/", "--")
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _path(self, text: str) -> Path:
+        fingerprint = hashlib.sha256(f"{self.model_name}\n{text}".encode("utf-8")).hexdigest()
+        return self.cache_dir / fingerprint[:2] / f"{fingerprint}.npy"
+
+    def get(self, text: str) -> np.ndarray | None:
+        path = self._path(text)
+        try:
+            vec = np.load(path)
+        except (OSError, ValueError):
+            return None
+        os.utime(path)  # "used just now" → evicted last
+        return vec
+
+    def put(self, text: str, vec: np.ndarray) -> None:
+        path = self._path(text)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Own temp file per process/thread, so two writers of the same card never mix
+        tmp_path = path.with_name(f"{path.stem}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with tmp_path.open("wb") as f:
+            np.save(f, np.asarray(vec, dtype=np.float32))
+        os.replace(tmp_path, path)
+
+    def embed(
+        self,
+        texts: List[str],
+        encode_fn: Callable[[List[str]], np.ndarray],
+    ) -> np.ndarray:
+        """
+        Return one embedding per text.
+        Only the texts missing from the cache are sent to encode_fn.
+        """
+        if not texts:
+            return encode_fn(texts)
+
+        found: Dict[str, np.ndarray] = {}
+        missing: List[str] = []
+        for text in dict.fromkeys(texts):  # each unique text once
+            vec = self.get(text)
+            if vec is None:
+                missing.append(text)
+            else:
+                found[text] = vec
+        self.hits += len(found)
+        self.misses += len(missing)
+
+        if missing:
+            new_vecs = np.asarray(encode_fn(missing), dtype=np.float32)
+            for text, vec in zip(missing, new_vecs):
+                self.put(text, vec)
+                found[text] = vec
+            self.prune()
+
+        return np.stack([found[t] for t in texts]).astype(np.float32, copy=False)
+
+    def prune(self) -> int:
+        """Throw away the least recently used codes beyond max_entries."""
+        files = sorted(self.cache_dir.glob("*/*.npy"), key=lambda p: p.stat().st_mtime)
+        excess = len(files) - self.max_entries
+        removed = 0
+        for path in files[:max(excess, 0)]:
+            try:
+                path.unlink()
+                removed += 1
+            except OSError:
+                pass
+        self.evictions += removed
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
@@ -7,12 +7,15 @@ Pipeline:
 1) Read PDF pages.
 2) Build knowledge cards (chunks).
 3) Compute embeddings for each card.
-4) Save everything to knowledge_library.json.
+4) Save the cards to knowledge_library.json and all embeddings,
+   as one binary matrix, to knowledge_library.npy (one row per card).
 """
 
 from __future__ import annotations
 import json
 import os
+from dataclasses import dataclass
+from pathlib import Path
 from typing import Any, Dict, List
 import numpy as np
 from sentence_transformers import SentenceTransformer
@@ -21,12 +24,16 @@ from .rag_config import (
     MODEL_DIR, PDF_PATH,
     KNOWLEDGE_LIBRARY_PATH,
     EMBEDDING_MODEL_NAME,
+    EMBEDDING_CACHE_DIR,
+    EMBEDDING_CACHE_MAX_ENTRIES,
 )
 from .pdf_utils import extract_pages_from_pdf, build_knowledge_cards
+from .embedding_cache import EmbeddingCache
 
 # Simple embedding model cache so we only load MiniLM once per process
 #_embedding_model: SentenceTransformer | None = None
 _embedding_model = None
+_embedding_cache: EmbeddingCache | None = None
 
 def get_embedding_model() -> SentenceTransformer:
     global _embedding_model
@@ -41,13 +48,63 @@ def get_embedding_model() -> SentenceTransformer:
     return _embedding_model
 
 
+def get_embedding_cache() -> EmbeddingCache:
+    global _embedding_cache
+    if _embedding_cache is None:
+        _embedding_cache = EmbeddingCache(
+            EMBEDDING_CACHE_DIR,
+            EMBEDDING_MODEL_NAME,
+            EMBEDDING_CACHE_MAX_ENTRIES,
+        )
+    return _embedding_cache
+
+
+def _encode(texts: List[str]) -> np.ndarray:
+    model = get_embedding_model()
+    return model.encode(texts, convert_to_numpy=True, show_progress_bar=True)
+
+
 def embed_texts(texts: List[str]) -> np.ndarray:
     """
     Turn a list of texts into a matrix of embeddings.
+    Cards we already embedded before are read from the embedding cache,
+    so only new cards are sent to MiniLM.
     """
-    model = get_embedding_model()
-    embeddings = model.encode(texts, convert_to_numpy=True, show_progress_bar=True)
-    return embeddings
+    return get_embedding_cache().embed(texts, _encode)
+
+
+@dataclass
+class KnowledgeLibrary:
+    """
+    The AI Knowledge Library, loaded once and reused for every question.
+
+    - cards:      list of {id, page, text}
+    - embeddings: matrix with one row per card (normalized), ready for similarity search
+    """
+    pdf_path: str
+    embedding_model: str
+    cards: List[Dict[str, Any]]
+    embeddings: np.ndarray
+
+    def __getitem__(self, key: str) -> Any:
+        # Lets older code keep using library["cards"]
+        return getattr(self, key)
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """
+    Scale every row to length 1 (L2 normalization).
+    Then "how similar are two codes?" (cosine similarity) is just a dot product.
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def embeddings_path_for(library_path) -> Path:
+    """knowledge_library.json → knowledge_library.npy (same folder)."""
+    return Path(library_path).with_suffix(".npy")
 
 
 def build_and_save_knowledge_library(
@@ -60,7 +117,7 @@ def build_and_save_knowledge_library(
     - Read PDF pages
     - Build knowledge cards
     - Add embeddings
-    - Save as one JSON file (AI Knowledge Library)
+    - Save cards as JSON + embeddings as a binary .npy matrix (AI Knowledge Library)
     """
     os.makedirs(os.path.dirname(str(output_path)), exist_ok=True)
 
@@ -75,17 +132,23 @@ def build_and_save_knowledge_library(
     print("Step 3: Embedding cards with MiniLM...")
     texts = [card["text"] for card in cards]
     embeddings = embed_texts(texts)
+    stats = get_embedding_cache().stats()
+    print(f"  Embedding cache: {stats['hits']} reused, {stats['misses']} newly embedded.")
 
-    for card, emb in zip(cards, embeddings):
-        card["embedding"] = emb.tolist()
+    # The numbers go into a binary file: much smaller and faster than JSON lists.
+    # We store them already normalized, so searching needs no extra work.
+    matrix_path = embeddings_path_for(output_path)
+    np.save(matrix_path, normalize_rows(embeddings))
 
     library: Dict[str, Any] = {
         "pdf_path": str(pdf_path),
         "embedding_model": EMBEDDING_MODEL_NAME,
+        "embeddings_file": matrix_path.name,
+        "embeddings_normalized": True,
         "cards": cards,
     }
 
-    print(f"Saving AI Knowledge Library to {output_path}...")
+    print(f"Saving AI Knowledge Library to {output_path} (+ {matrix_path.name})...")
     with open(output_path, "w", encoding="utf-8") as f:
         json.dump(library, f, ensure_ascii=False, indent=2)
 
@@ -94,11 +157,30 @@ def build_and_save_knowledge_library(
 
 def load_knowledge_library(
     path=KNOWLEDGE_LIBRARY_PATH,
-) -> Dict[str, Any]:
+) -> KnowledgeLibrary:
     """
-    Load the AI Knowledge Library from JSON.
+    Load the AI Knowledge Library: cards from JSON, embeddings from the
+    .npy matrix (memory-mapped, so only the pages we need are read).
+
+    Older libraries that stored each embedding inside the JSON are still
+    supported: the lists are turned into one matrix here, once.
     """
     with open(path, "r", encoding="utf-8") as f:
-        library: Dict[str, Any] = json.load(f)
-    return library
+        data: Dict[str, Any] = json.load(f)
+
+    cards: List[Dict[str, Any]] = data["cards"]
+    if "embeddings_file" in data:
+        matrix_path = Path(path).parent / data["embeddings_file"]
+        embeddings = np.load(matrix_path, mmap_mode="r")
+        if not data.get("embeddings_normalized"):
+            embeddings = normalize_rows(embeddings)
+    else:
+        embeddings = normalize_rows([c.pop("embedding") for c in cards])
+
+    return KnowledgeLibrary(
+        pdf_path=data.get("pdf_path", ""),
+        embedding_model=data.get("embedding_model", EMBEDDING_MODEL_NAME),
+        cards=cards,
+        embeddings=embeddings,
+    )
 
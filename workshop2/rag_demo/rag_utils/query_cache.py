@@ -0,0 +1,93 @@
+"""
+query_cache.py
+
+A short "I have seen this question before" memory.
+
+For kids:
+- "If someone asks the same question again, we don't need MiniLM."
+- "We look up the question's number code in our little notebook."
+- "The notebook only has room for MAX entries: when it is full, the
+   question we asked least recently gets erased." (LRU = Least Recently Used)
+
+The notebook can also be saved to disk, so it is still there the next
+time you run rag_main.py.
+"""
+
+from __future__ import annotations
+
+import atexit
+import os
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict
+
+import numpy as np
+
+
+def normalize_question(question: str) -> str:
+    """'  What is  RAG? ' and 'what is rag?' count as the same question."""
+    return " ".join(question.lower().split())
+
+
+class QueryCache:
+    """Bounded LRU cache: normalized question → embedding, optionally saved to disk."""
+
+    def __init__(self, max_entries: int, persist_path: Path | None = None) -> None:
+        self.max_entries = max(1, max_entries)
+        self.persist_path = persist_path
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+
+        if persist_path is not None:
+            self.load()
+            atexit.register(self.save)
+
+    def get(self, question: str) -> np.ndarray | None:
+        key = normalize_question(question)
+        vec = self._entries.get(key)
+        if vec is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)  # "used just now"
+        self.hits += 1
+        return vec
+
+    def put(self, question: str, vec: np.ndarray) -> None:
+        key = normalize_question(question)
+        self._entries[key] = np.asarray(vec, dtype=np.float32)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)  # erase the oldest question
+            self.evictions += 1
+
+    def load(self) -> None:
+        if self.persist_path is None or not self.persist_path.exists():
+            return
+        try:
+            with np.load(self.persist_path) as npz:
+                for question, vec in zip(npz["questions"].tolist(), npz["embeddings"]):
+                    self._entries[question] = vec
+        except (OSError, ValueError, KeyError):
+            print(f"Could not read the question cache at {self.persist_path}, starting empty.")
+
+    def save(self) -> None:
+        if self.persist_path is None or not self._entries:
+            return
+        self.persist_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.persist_path.with_name(self.persist_path.stem + ".tmp.npz")
+        np.savez(
+            tmp_path,
+            questions=np.array(list(self._entries.keys())),
+            embeddings=np.stack(list(self._entries.values())),
+        )
+        os.replace(tmp_path, self.persist_path)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
@@ -5,6 +5,7 @@ Shared configuration for the RAG demo.
 Keeps all paths and constants in one place.
 """
 
+import os
 from pathlib import Path
 
 # Base directories
@@ -23,9 +24,35 @@ KNOWLEDGE_LIBRARY_PATH = KNOWLEDGE_LIBRARY_DIR / "knowledge_library.json"
 # Embedding model (local, free)
 EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
 
+# Embedding cache: remembers the number code of every card we already embedded,
+# so rebuilding the library only embeds new or changed cards.
+EMBEDDING_CACHE_DIR = KNOWLEDGE_LIBRARY_DIR / "embedding_cache"
+EMBEDDING_CACHE_MAX_ENTRIES = 50_000
+
 # RAG settings
 TOP_K = 3  # how many knowledge cards to retrieve
 
+# Question cache: remembers the number code of recent questions (saved to disk)
+QUERY_CACHE_MAX_ENTRIES = 1_000
+QUERY_CACHE_PATH = KNOWLEDGE_LIBRARY_DIR / "query_cache.npz"
+
+# Azure OpenAI client: one shared client keeps its HTTPS connections open
+# between questions (no new handshake per call)
+LLM_MAX_CONNECTIONS = 16
+LLM_CONNECT_TIMEOUT_SECONDS = 5.0
+LLM_TIMEOUT_SECONDS = 60.0
+
+# Practice mode: RAG_LLM_BACKEND=stub talks to a pretend model on this computer
+# (python -m workshop2.incident_rag.llm_stub_server) instead of Azure
+LLM_BACKEND = os.getenv("RAG_LLM_BACKEND", "azure")
+LLM_STUB_URL = os.getenv("RAG_LLM_STUB_URL", "http://127.0.0.1:8089")
+
+# If the model is slow or busy, wait a little (a random bit, so many users
+# don't all come back at once) and ask again
+LLM_ATTEMPT_TIMEOUT_SECONDS = 30.0
+LLM_MAX_RETRIES = 2
+LLM_RETRY_BACKOFF_SECONDS = 0.5
+
 # Prompt templates (stored as plain text files)
 SYSTEM_PROMPT_PATH = PROMPT_DIR / "system_prompt.txt"
 USER_PROMPT_PATH = PROMPT_DIR / "user_prompt.txt"
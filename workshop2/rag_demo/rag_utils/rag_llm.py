@@ -6,7 +6,7 @@ Minimal LLM caller for the RAG demo.
 Responsibility:
 - Take an already-built list of messages (augmented prompt)
 - Call Azure OpenAI chat completions
-- Return:
+- Return (call_llm_json, or `await call_llm_json_async(...)`):
     {
         "data":  <JSON parsed from model>,
         "usage": {
@@ -24,9 +24,26 @@ All provider/model/client details are handled here, NOT in main().
 """
 
 from typing import Any, Dict, List, Optional
+import asyncio
 import json
-
-from openai import AzureOpenAI
+import random
+import threading
+import time
+import weakref
+
+import httpx
+from openai import APIConnectionError, APIStatusError, APITimeoutError, AsyncAzureOpenAI, AzureOpenAI
+
+from .rag_config import (
+    LLM_MAX_CONNECTIONS,
+    LLM_CONNECT_TIMEOUT_SECONDS,
+    LLM_TIMEOUT_SECONDS,
+    LLM_ATTEMPT_TIMEOUT_SECONDS,
+    LLM_MAX_RETRIES,
+    LLM_RETRY_BACKOFF_SECONDS,
+    LLM_BACKEND,
+    LLM_STUB_URL,
+)
 
 try:
     # Shared helper that returns a configured AzureOpenAI client.
@@ -38,6 +55,61 @@ except ImportError as e:
     ) from e
 
 
+# Shared clients: one for normal calls, one per asyncio event loop.
+_client: Optional[AzureOpenAI] = None
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncAzureOpenAI]" = (
+    weakref.WeakKeyDictionary()
+)
+_client_lock = threading.Lock()
+
+# Timeouts, throttling and server errors are worth another attempt
+_RETRYABLE_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+
+def _http_settings() -> Dict[str, Any]:
+    return {
+        "limits": httpx.Limits(
+            max_connections=LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_MAX_CONNECTIONS,
+        ),
+        "timeout": httpx.Timeout(LLM_TIMEOUT_SECONDS, connect=LLM_CONNECT_TIMEOUT_SECONDS),
+    }
+
+
+def _credentials() -> Dict[str, Any]:
+    if LLM_BACKEND == "stub":
+        return {"azure_endpoint": LLM_STUB_URL, "api_key": "stub", "api_version": "2024-06-01"}
+    return get_api_credentials()
+
+
+def get_client() -> AzureOpenAI:
+    """Create the AzureOpenAI client once and reuse it (and its connections)."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = AzureOpenAI(
+                **_credentials(),
+                max_retries=0,  # we retry ourselves (see call_llm_json)
+                http_client=httpx.Client(**_http_settings()),
+            )
+    return _client
+
+
+def get_async_client() -> AsyncAzureOpenAI:
+    """The AsyncAzureOpenAI client for the running event loop."""
+    loop = asyncio.get_running_loop()
+    with _client_lock:
+        client = _async_clients.get(loop)
+        if client is None:
+            client = AsyncAzureOpenAI(
+                **_credentials(),
+                max_retries=0,
+                http_client=httpx.AsyncClient(**_http_settings()),
+            )
+            _async_clients[loop] = client
+    return client
+
+
 def call_llm_json(
     messages: List[Dict[str, str]],
     temperature: float = 0.2,
@@ -67,8 +139,69 @@ def call_llm_json(
             }
         }
     """
-    # CREATE THE CLIENT (with credentials)
-    client = AzureOpenAI(**get_api_credentials())
+    # GET THE SHARED CLIENT (created with credentials on first use)
+    client = get_client()
+    kwargs = _request_kwargs(messages, temperature, max_tokens)
+
+    # Each attempt has its own deadline; retry transient errors with jittered backoff
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        try:
+            response = client.chat.completions.create(**kwargs, timeout=LLM_ATTEMPT_TIMEOUT_SECONDS)
+            break
+        except Exception as exc:
+            if attempt == LLM_MAX_RETRIES or not _is_retryable(exc):
+                raise
+            time.sleep(_backoff_seconds(attempt))
+
+    result = _parse_response(response)
+    result["usage"]["retries"] = attempt
+    return result
+
+
+async def call_llm_json_async(
+    messages: List[Dict[str, str]],
+    temperature: float = 0.2,
+    max_tokens: Optional[int] = 500,
+) -> Dict[str, Any]:
+    """
+    Same as call_llm_json, but does not block the event loop while waiting
+    for the model, so many questions can be in flight at once.
+    """
+    client = get_async_client()
+    kwargs = _request_kwargs(messages, temperature, max_tokens)
+
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        try:
+            response = await client.chat.completions.create(
+                **kwargs, timeout=LLM_ATTEMPT_TIMEOUT_SECONDS
+            )
+            break
+        except Exception as exc:
+            if attempt == LLM_MAX_RETRIES or not _is_retryable(exc):
+                raise
+            await asyncio.sleep(_backoff_seconds(attempt))
+
+    result = _parse_response(response)
+    result["usage"]["retries"] = attempt
+    return result
+
+
+def _is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, (APITimeoutError, APIConnectionError)):
+        return True
+    return isinstance(exc, APIStatusError) and exc.status_code in _RETRYABLE_STATUSES
+
+
+def _backoff_seconds(attempt: int) -> float:
+    # Random wait between 0 and 0.5s, 1s, 2s, ... ("full jitter")
+    return random.uniform(0, LLM_RETRY_BACKOFF_SECONDS * 2 ** attempt)
+
+
+def _request_kwargs(
+    messages: List[Dict[str, str]],
+    temperature: float,
+    max_tokens: Optional[int],
+) -> Dict[str, Any]:
     deployment_name = get_model_deployment_name()
 
     kwargs: Dict[str, Any] = {
@@ -79,9 +212,10 @@ def call_llm_json(
     }
     if max_tokens is not None:
         kwargs["max_tokens"] = max_tokens
+    return kwargs
 
-    response = client.chat.completions.create(**kwargs)
 
+def _parse_response(response: Any) -> Dict[str, Any]:
     # JSON content from the model (string → dict)
     content = response.choices[0].message.content
     data: Dict[str, Any] = json.loads(content)
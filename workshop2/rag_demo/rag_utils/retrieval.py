@@ -12,46 +12,80 @@ For kids:
 from typing import Any, Dict, List
 
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 from sentence_transformers import SentenceTransformer
 
-from .rag_config import TOP_K, EMBEDDING_MODEL_NAME
-from .knowledge_library import load_knowledge_library, get_embedding_model
+from .rag_config import TOP_K, EMBEDDING_MODEL_NAME, QUERY_CACHE_MAX_ENTRIES, QUERY_CACHE_PATH
+from .knowledge_library import (
+    KnowledgeLibrary,
+    load_knowledge_library,
+    get_embedding_model,
+    normalize_rows,
+)
+from .query_cache import QueryCache, normalize_question
+
+_query_cache: QueryCache | None = None
+_default_library: KnowledgeLibrary | None = None
+
+
+def get_query_cache() -> QueryCache:
+    global _query_cache
+    if _query_cache is None:
+        _query_cache = QueryCache(QUERY_CACHE_MAX_ENTRIES, persist_path=QUERY_CACHE_PATH)
+    return _query_cache
 
 
 def encode_query(question: str) -> np.ndarray:
     """
     Turn the question into an embedding using the same model
     as the knowledge cards.
+
+    If we have seen the same question before, its number code comes
+    straight from the question cache and MiniLM is not needed.
     """
+    cache = get_query_cache()
+    cached = cache.get(question)
+    if cached is not None:
+        return cached.reshape(1, -1)  # shape: (1, dim)
+
     model: SentenceTransformer = get_embedding_model()
-    vec = model.encode([question], convert_to_numpy=True)
+    vec = model.encode([normalize_question(question)], convert_to_numpy=True)
+    cache.put(question, vec[0])
     return vec  # shape: (1, dim)
 
 
 def retrieve_top_k_cards(
     question: str,
-    library: Dict[str, Any] | None = None,
+    library: KnowledgeLibrary | None = None,
     top_k: int = TOP_K,
 ) -> List[Dict[str, Any]]:
     """
     Find the top-k most similar knowledge cards for a question.
 
-    If 'library' is not provided, it will be loaded from disk.
+    If 'library' is not provided, it is loaded from disk once and
+    reused for the next questions.
     """
+    global _default_library
     if library is None:
-        library = load_knowledge_library()
-
-    cards = library["cards"]
-    card_embeddings = np.array([c["embedding"] for c in cards])
-
-    question_vec = encode_query(question)
-
-    # Cosine similarity: higher score = more similar
-    sims = cosine_similarity(question_vec, card_embeddings)[0]
-    indices = np.argsort(sims)[::-1]  # sort high → low
-
-    top_indices = indices[:top_k]
+        if _default_library is None:
+            _default_library = load_knowledge_library()
+        library = _default_library
+
+    cards = library.cards
+    card_embeddings = library.embeddings  # ready-made normalized matrix, one row per card
+
+    question_vec = normalize_rows(encode_query(question))
+
+    # Cosine similarity: higher score = more similar.
+    # All codes have length 1, so one matrix multiply gives every score.
+    sims = (card_embeddings @ question_vec[0]).astype(np.float32)
+
+    # Pick the top-k without sorting ALL the cards:
+    # argpartition finds the k best, then we only sort those k.
+    k = min(top_k, len(sims))
+    if k <= 0:
+        return []
+    best = np.argpartition(-sims, k - 1)[:k]
+    top_indices = best[np.argsort(-sims[best])]  # sort high → low
     top_cards: List[Dict[str, Any]] = []
 
     for idx in top_indices:
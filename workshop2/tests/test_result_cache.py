@@ -0,0 +1,24 @@
+# workshop2/tests/test_result_cache.py
+
+from workshop2.incident_rag.result_cache import make_result_key
+
+DOCS = ["Alerting_and_Notification_Policy.txt", "Incident_Triage_Service_Policy.txt", "Escalation.txt"]
+
+
+def test_set_and_list_filters_give_order_independent_keys():
+    keys = {
+        make_result_key("vpn down", 3, {"document_name": set(DOCS)}),
+        make_result_key("vpn down", 3, {"document_name": set(reversed(DOCS))}),
+        make_result_key("vpn down", 3, {"document_name": DOCS}),
+        make_result_key("vpn down", 3, {"document_name": list(reversed(DOCS))}),
+    }
+    assert len(keys) == 1
+    assert make_result_key("vpn down", 3, {"document_name": DOCS[:2]}) not in keys
+
+
+def test_dict_filter_values_are_hashable_and_order_independent():
+    a = make_result_key("vpn down", 3, {"meta": {"team": "net", "tags": ["b", "a"]}}, mode="hybrid")
+    b = make_result_key("vpn down", 3, {"meta": {"tags": ["a", "b"], "team": "net"}}, mode="hybrid")
+    assert hash(a) == hash(b)
+    assert a == b
+    assert a != make_result_key("vpn down", 3, {"meta": {"team": "ops", "tags": ["a", "b"]}}, mode="hybrid")
@@ -0,0 +1,65 @@
+# workshop2/tests/test_semantic_cache.py
+
+import json
+
+import numpy as np
+import pytest
+
+# triage_service needs the LLM/embedding dependencies (openai, sentence-transformers, common)
+ts = pytest.importorskip("workshop2.incident_rag.triage_service")
+from workshop2.incident_rag import audit_log
+from workshop2.incident_rag.triage_schema import PolicyChunkSchema
+
+ANSWER = {
+    "summary": "VPN gateway down for all remote staff.",
+    "severity": "ALERT",
+    "actions_now": ["Fail over to the secondary gateway"],
+    "next_steps": ["Review gateway capacity"],
+    "requires_policy_update": False,
+    "policy_refs": ["network.txt#0"],
+}
+
+
+def _chunk(i: int) -> PolicyChunkSchema:
+    return PolicyChunkSchema(
+        id=f"network.txt#{i}",
+        document_name="network.txt",
+        section_path=f"Section {i}",
+        text="VPN outage handling. " * 20,
+        token_count=100,
+    )
+
+
+def test_warmed_entry_hits_when_packing_dropped_a_chunk(tmp_path, monkeypatch):
+    chunks = [_chunk(i) for i in range(3)]
+    log_path = tmp_path / "triage_log.jsonl"
+    monkeypatch.setattr(audit_log, "AUDIT_BUFFERED", False)
+    monkeypatch.setattr(audit_log, "LOGS_DIR", tmp_path)
+    monkeypatch.setattr(audit_log, "LOG_PATH", log_path)
+    monkeypatch.setattr(ts, "LOG_PATH", log_path)
+    monkeypatch.setattr(ts, "search_policies", lambda text, top_k: list(zip(chunks, [0.9, 0.88, 0.86])))
+    monkeypatch.setattr(ts, "PROMPT_CONTEXT_TOKEN_BUDGET", 250)  # room for two of the three chunks
+    monkeypatch.setattr(ts, "embed_query", lambda text: np.ones(8, dtype=np.float32))
+    monkeypatch.setattr(ts, "embed_queries", lambda texts: np.ones((len(texts), 8), dtype=np.float32))
+    monkeypatch.setattr(ts, "build_triage_messages", lambda text, chunks: [])
+    llm_calls = []
+
+    def fake_llm(messages):
+        llm_calls.append(messages)
+        return {"data": dict(ANSWER), "usage": {}}
+
+    monkeypatch.setattr(ts, "call_triage_llm", fake_llm)
+
+    monkeypatch.setattr(ts, "_semantic_cache", None)
+    ts.triage_incident("VPN down for everyone", rerank=False, use_cache=True)
+    record = json.loads(log_path.read_text(encoding="utf-8").splitlines()[-1])
+    assert len(record["policy_chunks"]) == 2  # packing dropped one chunk
+    assert record["retrieved_ids"] == [c.id for c in chunks]
+
+    # "Restart": a fresh cache warmed from the audit log
+    monkeypatch.setattr(ts, "_semantic_cache", None)
+    result = ts.triage_incident("VPN down for everyone", rerank=False, use_cache=True)
+
+    assert len(llm_calls) == 1
+    assert ts.get_semantic_cache().stats()["hits"] == 1
+    assert result.severity == "ALERT"